@@ -0,0 +1,213 @@
+"""Benchmarks for airspeed velocity (asv). Every benchmark runs on synthetic data of 10^4 up to 10^7 positions, so that
+scaling problems show up. The time_ benchmarks measure time, the peakmem_ benchmarks the peak memory of the process and
+the track_ benchmarks the peak memory as reported by tracemalloc.
+
+The generated .aut files are cached in the directory given by the NAPARI_ORGANOIDTRACKER_BENCHMARK_DIR environment
+variable, or in the temp directory if that variable is not set. Generating the largest files takes a few minutes."""
+
+import os
+import tempfile
+import tracemalloc
+from functools import partial
+from typing import Any, Dict
+
+from napari_organoidtracker import _json_backend
+from napari_organoidtracker._aut_parser import _parse_organoidtracker_data, _read_organoidtracker_file
+from napari_organoidtracker._basics import TimePoint
+from napari_organoidtracker._binary_format import _binary_file_to_napari, convert_to_binary
+from napari_organoidtracker._experiment import Experiment, _experiment_to_napari
+from napari_organoidtracker._links import Links
+from napari_organoidtracker._position_data import PositionData
+from napari_organoidtracker._synthetic import generate_synthetic_data, write_synthetic_aut_file
+
+POSITION_COUNTS = [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+_TIME_POINT_COUNT = 100
+_METADATA = {"volume_um3": float, "intensity": int, "is_dividing": bool, "cell_type": str}
+
+
+def _settings(position_count: int) -> Dict[str, Any]:
+    """Gets the settings for the synthetic data generator. Divisions and disappearances are in balance, so the total
+    number of positions stays close to position_count."""
+    return {"time_point_count": _TIME_POINT_COUNT, "cell_count": max(1, position_count // _TIME_POINT_COUNT),
+            "division_rate": 0.01, "disappearance_rate": 0.01, "metadata": _METADATA, "seed": 1}
+
+
+def _get_synthetic_file(position_count: int, version: str) -> str:
+    folder = os.environ.get("NAPARI_ORGANOIDTRACKER_BENCHMARK_DIR",
+                            os.path.join(tempfile.gettempdir(), "napari-organoidtracker-benchmarks"))
+    os.makedirs(folder, exist_ok=True)
+    file_path = os.path.join(folder, f"synthetic-{version}-{position_count}.aut")
+    if not os.path.exists(file_path):
+        write_synthetic_aut_file(file_path + ".tmp", version=version, **_settings(position_count))
+        os.replace(file_path + ".tmp", file_path)
+    return file_path
+
+
+def _get_synthetic_binary_file(position_count: int) -> str:
+    aut_file_path = _get_synthetic_file(position_count, "v2")
+    file_path = aut_file_path[:-len(".aut")] + ".autb"
+    if not os.path.exists(file_path):
+        convert_to_binary(aut_file_path, file_path + ".tmp")
+        os.replace(file_path + ".tmp", file_path)
+    return file_path
+
+
+def _get_synthetic_experiment(position_count: int) -> Experiment:
+    return _parse_organoidtracker_data(generate_synthetic_data(version="v2", **_settings(position_count)))
+
+
+def _tracemalloc_peak(function, *args) -> int:
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class ReadFileSuite:
+    params = (POSITION_COUNTS, ["v1", "v2"], list(_json_backend.BACKEND_NAMES))
+    param_names = ["position_count", "version", "json_backend"]
+    number = 1
+    timeout = 3600
+
+    def setup(self, position_count: int, version: str, json_backend: str):
+        if not _json_backend.is_backend_available(json_backend):
+            raise NotImplementedError(f"{json_backend} is not installed")  # Makes asv skip the benchmark
+        self.file_path = _get_synthetic_file(position_count, version)
+
+    def time_read_organoidtracker_file(self, position_count: int, version: str, json_backend: str):
+        _read_organoidtracker_file(self.file_path, json_backend=json_backend)
+
+    def peakmem_read_organoidtracker_file(self, position_count: int, version: str, json_backend: str):
+        _read_organoidtracker_file(self.file_path, json_backend=json_backend)
+
+    def track_read_organoidtracker_file_tracemalloc_peak(self, position_count: int, version: str,
+                                                         json_backend: str) -> int:
+        return _tracemalloc_peak(partial(_read_organoidtracker_file, self.file_path, json_backend=json_backend))
+
+    track_read_organoidtracker_file_tracemalloc_peak.unit = "bytes"
+
+
+class JsonDecodeSuite:
+    """Only the JSON decoding step of reading a file, to compare the backends."""
+    params = (POSITION_COUNTS, ["v1", "v2"], list(_json_backend.BACKEND_NAMES))
+    param_names = ["position_count", "version", "json_backend"]
+    number = 1
+    timeout = 3600
+
+    def setup(self, position_count: int, version: str, json_backend: str):
+        if not _json_backend.is_backend_available(json_backend):
+            raise NotImplementedError(f"{json_backend} is not installed")
+        with open(_get_synthetic_file(position_count, version), "rb") as handle:
+            self.data = handle.read()
+        self.backend = _json_backend.get_backend(json_backend)
+
+    def time_decode(self, position_count: int, version: str, json_backend: str):
+        self.backend.decode(self.data)
+
+    def peakmem_decode(self, position_count: int, version: str, json_backend: str):
+        self.backend.decode(self.data)
+
+
+class BinaryFileSuite:
+    params = POSITION_COUNTS
+    param_names = ["position_count"]
+    number = 1
+    timeout = 3600
+
+    def setup(self, position_count: int):
+        self.file_path = _get_synthetic_binary_file(position_count)
+
+    def time_binary_file_to_napari(self, position_count: int):
+        _binary_file_to_napari(self.file_path)
+
+    def peakmem_binary_file_to_napari(self, position_count: int):
+        _binary_file_to_napari(self.file_path)
+
+
+class ExperimentToNapariSuite:
+    params = POSITION_COUNTS
+    param_names = ["position_count"]
+    number = 1
+    timeout = 3600
+
+    def setup(self, position_count: int):
+        self.experiment = _get_synthetic_experiment(position_count)
+
+    def time_experiment_to_napari(self, position_count: int):
+        _experiment_to_napari(self.experiment)
+
+    def peakmem_experiment_to_napari(self, position_count: int):
+        _experiment_to_napari(self.experiment)
+
+    def track_experiment_to_napari_tracemalloc_peak(self, position_count: int) -> int:
+        return _tracemalloc_peak(_experiment_to_napari, self.experiment)
+
+    track_experiment_to_napari_tracemalloc_peak.unit = "bytes"
+
+
+class LinksSuite:
+    params = POSITION_COUNTS
+    param_names = ["position_count"]
+    number = 1
+    timeout = 3600
+
+    def setup(self, position_count: int):
+        self.links = _get_synthetic_experiment(position_count).links
+        self.all_links = list(self.links.find_all_links())
+
+    def time_add_link(self, position_count: int):
+        links = Links()
+        for position1, position2 in self.all_links:
+            links.add_link(position1, position2)
+
+    def time_copy(self, position_count: int):
+        self.links.copy()
+
+    def peakmem_copy(self, position_count: int):
+        self.links.copy()
+
+    def track_copy_tracemalloc_peak(self, position_count: int) -> int:
+        return _tracemalloc_peak(self.links.copy)
+
+    track_copy_tracemalloc_peak.unit = "bytes"
+
+
+class PositionDataSuite:
+    params = POSITION_COUNTS
+    param_names = ["position_count"]
+    number = 1
+    timeout = 3600
+
+    def setup(self, position_count: int):
+        experiment = _get_synthetic_experiment(position_count)
+        self.position_data = experiment.position_data
+        self.positions_by_time_point = dict()
+        self.time_point_dicts = dict()
+        for time_point_number in range(experiment.positions.first_time_point_number(),
+                                       experiment.positions.last_time_point_number() + 1):
+            time_point = TimePoint(time_point_number)
+            positions = list(experiment.positions.of_time_point(time_point))
+            self.positions_by_time_point[time_point_number] = positions
+            self.time_point_dicts[time_point_number] = self.position_data.create_time_point_dict(time_point, positions)
+        self.volumes = dict(self.position_data.find_all_positions_with_data("volume_um3"))
+
+    def time_add_positions_data(self, position_count: int):
+        PositionData().add_positions_data("volume_um3", self.volumes)
+
+    def time_add_data_from_time_point_dict(self, position_count: int):
+        position_data = PositionData()
+        for time_point_number, positions in self.positions_by_time_point.items():
+            position_data.add_data_from_time_point_dict(TimePoint(time_point_number), positions,
+                                                        self.time_point_dicts[time_point_number])
+
+    def time_copy(self, position_count: int):
+        self.position_data.copy()
+
+    def time_find_all_positions_with_data(self, position_count: int):
+        for _ in self.position_data.find_all_positions_with_data("volume_um3"):
+            pass
+
+    def peakmem_copy(self, position_count: int):
+        self.position_data.copy()
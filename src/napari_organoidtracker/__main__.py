@@ -0,0 +1,284 @@
+"""Command line interface, for working with tracking files without starting napari. Run
+
+    python -m napari_organoidtracker inspect FILE...
+    python -m napari_organoidtracker convert FILE... --to npz
+
+inspect prints the version, the number of time points, positions, links, tracks and divisions, and the metadata of
+every file. convert writes every file in another format:
+
+* npz: the napari layer data as NumPy arrays, see _save_layers_as_npz.
+* autb: the binary format, see the _binary_format module.
+* aut, aut.gz, aut.bz2, aut.xz, aut.zst: the JSON format, optionally compressed, see _writer.write_experiment.
+
+Converting between the aut and autb formats is lossless, metadata values keep their type (so ints stay ints).
+
+Files are processed in parallel, using one worker process per CPU by default (set using --workers). Progress is
+printed to stderr, followed by a summary. The exit code is 1 if any of the files failed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from napari_organoidtracker._compression import AUT_EXTENSION
+from napari_organoidtracker._probe import BINARY_EXTENSION
+
+OUTPUT_FORMATS = ("npz", "autb", "aut", "aut.gz", "aut.bz2", "aut.xz", "aut.zst")
+
+
+def _read_experiment(file_path: str):
+    """Reads a JSON or binary tracking file as an Experiment."""
+    if file_path.endswith(BINARY_EXTENSION):
+        from napari_organoidtracker._binary_format import read_binary_file
+        return read_binary_file(file_path)
+    from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+    return _read_organoidtracker_file(file_path)
+
+
+def inspect_file(file_path: str) -> Dict[str, Any]:
+    """Gets the summary of a single file that is printed by the inspect command, as a JSON-compatible dictionary."""
+    from napari_organoidtracker._probe import probe_aut_file
+
+    if file_path.endswith(BINARY_EXTENSION):
+        version = "binary"
+    else:
+        summary = probe_aut_file(file_path)
+        version = summary.get_version() if summary is not None else None
+    experiment = _read_experiment(file_path)
+    links = experiment.links
+
+    lineage_data_names = set()
+    for track in links.find_starting_tracks():
+        lineage_data_names.update(data_name for data_name, _ in links.find_all_data_of_lineage(track))
+    return {
+        "file": file_path,
+        "file_size": os.path.getsize(file_path),
+        "version": version,
+        "first_time_point_number": experiment.positions.first_time_point_number(),
+        "last_time_point_number": experiment.positions.last_time_point_number(),
+        "position_count": len(experiment.positions),
+        "link_count": len(links),
+        "track_count": links.get_highest_track_id() + 1,
+        "division_count": sum(1 for track in links.find_all_tracks() if track.will_divide()),
+        "position_metadata": {data_name: data_type.__name__ for data_name, data_type
+                              in experiment.position_data.get_data_names_and_types().items()},
+        "lineage_metadata": sorted(lineage_data_names),
+    }
+
+
+def _strip_extension(file_name: str) -> str:
+    """Removes .autb, .aut or .aut.gz (and other compression extensions) from the file name."""
+    if file_name.endswith(BINARY_EXTENSION):
+        return file_name[:-len(BINARY_EXTENSION)]
+    index = file_name.rfind(AUT_EXTENSION)
+    if index > 0:
+        return file_name[:index]
+    return file_name
+
+
+def get_output_path(file_path: str, output_format: str, output_directory: Optional[str]) -> str:
+    """Gets the file that convert writes to. By default, this is next to the input file."""
+    if output_directory is None:
+        output_directory = os.path.dirname(file_path)
+    return os.path.join(output_directory, _strip_extension(os.path.basename(file_path)) + "." + output_format)
+
+
+def convert_file(file_path: str, output_format: str, output_directory: Optional[str] = None, *,
+                 event_layers: bool = False) -> Dict[str, Any]:
+    """Converts a single file. Returns a JSON-compatible dictionary with the input and output file."""
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    output_path = get_output_path(file_path, output_format, output_directory)
+    if os.path.abspath(output_path) == os.path.abspath(file_path):
+        raise ValueError(f"Output file would overwrite the input file: {output_path}")
+
+    experiment = _read_experiment(file_path)
+    if output_format == "npz":
+        from napari_organoidtracker._experiment import _experiment_to_napari
+        layers = _experiment_to_napari(experiment, event_layers=event_layers)
+        _save_layers_as_npz(layers, output_path, _collect_string_features(experiment))
+    elif output_format == "autb":
+        from napari_organoidtracker._binary_format import write_binary_file
+        write_binary_file(experiment, output_path)
+    else:
+        from napari_organoidtracker._writer import write_experiment
+        write_experiment(output_path, experiment)
+    return {"file": file_path, "output_file": output_path}
+
+
+def _collect_string_features(experiment) -> Dict[str, Tuple[Any, Any]]:
+    """Gets the string metadata of every row of the tracks layer, as (codes, categories) per metadata key. The value of
+    row i is categories[codes[i]], or missing if codes[i] is -1. The napari layers only contain a number for every
+    string, which is not the same from run to run."""
+    import numpy
+    from napari_organoidtracker._track_table import TrackTable
+
+    data_names = [data_name for data_name, data_type in experiment.position_data.get_data_names_and_types().items()
+                  if data_type == str]
+    if len(data_names) == 0:
+        return dict()
+    positions = TrackTable.from_links(experiment.links).positions
+    string_features = dict()
+    for data_name in data_names:
+        values = [experiment.position_data.get_position_data(position, data_name) for position in positions]
+        categories = sorted({value for value in values if isinstance(value, str)})
+        category_codes = {category: code for code, category in enumerate(categories)}
+        codes = numpy.fromiter((category_codes.get(value, -1) if isinstance(value, str) else -1 for value in values),
+                               dtype=numpy.int64, count=len(values))
+        string_features[data_name] = (codes, numpy.array(categories, dtype=str))
+    return string_features
+
+
+def _save_layers_as_npz(layers: List[Tuple[Any, Dict[str, Any], str]], output_path: str,
+                        string_features: Optional[Dict[str, Tuple[Any, Any]]] = None):
+    """Saves the napari layers as a .npz file, with one array per column:
+
+    * tracks: the data of the tracks layer, so [track_id, t, (z), y, x] for every row.
+    * graph_track_ids, graph_parent_track_ids: the track graph of the tracks layer, one pair per link between tracks.
+    * features/<name>: one feature of the tracks layer, one value per row.
+    * categories/<name>: for string features, the strings. The feature then contains for every row the index in this
+      array, or -1 if the value is missing. See _collect_string_features.
+    * first_time_point_number: the original time point number of t=0.
+    * points/<layer name>: the data of the event layers, if requested.
+    """
+    import numpy
+
+    if string_features is None:
+        string_features = dict()
+    arrays = dict()
+    for data, layer_kwargs, layer_type in layers:
+        if layer_type == "tracks":
+            arrays["tracks"] = numpy.asarray(data)
+            graph_pairs = [(track_id, parent_track_id) for track_id, parent_track_ids in layer_kwargs["graph"].items()
+                           for parent_track_id in parent_track_ids]
+            arrays["graph_track_ids"] = numpy.array([pair[0] for pair in graph_pairs], dtype=numpy.int64)
+            arrays["graph_parent_track_ids"] = numpy.array([pair[1] for pair in graph_pairs], dtype=numpy.int64)
+            for feature_name, values in layer_kwargs["features"].items():
+                if feature_name in string_features:
+                    values, categories = string_features[feature_name]
+                    arrays["categories/" + feature_name] = categories
+                arrays["features/" + feature_name] = numpy.asarray(values)
+            arrays["first_time_point_number"] = numpy.array(layer_kwargs["metadata"]["first_time_point_number"])
+        elif layer_type == "points":
+            arrays["points/" + layer_kwargs["name"]] = numpy.asarray(data)
+    with open(output_path, "wb") as handle:
+        numpy.savez(handle, **arrays)
+
+
+def _run_for_all_files(function: Callable[..., Dict[str, Any]], file_paths: Sequence[str], *,
+                       max_workers: Optional[int], **kwargs) -> Tuple[List[Dict[str, Any]], List[Tuple[str, str]]]:
+    """Calls function(file_path, **kwargs) for every file, in max_workers processes (by default, one per CPU). With
+    max_workers=1, everything runs in the current process. Prints the progress to stderr. Returns the results (in the
+    order of the files) and the (file, error message) of every failed file."""
+    results = dict()
+    errors = dict()
+    start_time = time.perf_counter()
+
+    def report(file_path: str, error: Optional[BaseException]):
+        done_count = len(results) + len(errors)
+        status = "ok" if error is None else f"FAILED: {type(error).__name__}: {error}"
+        print(f"[{done_count}/{len(file_paths)}] {file_path}: {status} (after {time.perf_counter() - start_time:.1f} s)",
+              file=sys.stderr, flush=True)
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            try:
+                results[file_path] = function(file_path, **kwargs)
+                error = None
+            except Exception as e:
+                errors[file_path] = f"{type(e).__name__}: {e}"
+                error = e
+            report(file_path, error)
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(file_paths))) as pool:
+            futures = {pool.submit(function, file_path, **kwargs): file_path for file_path in file_paths}
+            for future in as_completed(futures):
+                file_path = futures[future]
+                error = future.exception()
+                if error is None:
+                    results[file_path] = future.result()
+                else:
+                    errors[file_path] = f"{type(error).__name__}: {error}"
+                report(file_path, error)
+
+    return ([results[file_path] for file_path in file_paths if file_path in results],
+            [(file_path, errors[file_path]) for file_path in file_paths if file_path in errors])
+
+
+def _print_summary(verb: str, file_count: int, errors: List[Tuple[str, str]], start_time: float):
+    print(f"{verb} {file_count - len(errors)} of {file_count} files in {time.perf_counter() - start_time:.1f} s"
+          + (f", {len(errors)} failed:" if len(errors) > 0 else "."), file=sys.stderr)
+    for file_path, error in errors:
+        print(f"  {file_path}: {error}", file=sys.stderr)
+
+
+def _print_inspection(result: Dict[str, Any]):
+    print(result["file"])
+    print(f"  version:      {result['version']}")
+    print(f"  file size:    {result['file_size']} bytes")
+    print(f"  time points:  {result['first_time_point_number']} to {result['last_time_point_number']}")
+    print(f"  positions:    {result['position_count']}")
+    print(f"  links:        {result['link_count']}")
+    print(f"  tracks:       {result['track_count']} ({result['division_count']} divisions)")
+    position_metadata = ", ".join(f"{data_name} ({type_name})"
+                                  for data_name, type_name in result["position_metadata"].items())
+    print(f"  position metadata: {position_metadata or '-'}")
+    print(f"  lineage metadata:  {', '.join(result['lineage_metadata']) or '-'}")
+
+
+def _create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m napari_organoidtracker",
+                                     description="Inspects and converts OrganoidTracker files, without napari.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common_arguments(subparser: argparse.ArgumentParser):
+        subparser.add_argument("files", nargs="+", help="the .aut (optionally compressed) or .autb files")
+        subparser.add_argument("--workers", type=int, default=None,
+                               help="number of worker processes, by default one per CPU")
+
+    inspect_parser = subparsers.add_parser("inspect", help="print a summary of every file")
+    add_common_arguments(inspect_parser)
+    inspect_parser.add_argument("--json", action="store_true", help="print the summaries as JSON")
+
+    convert_parser = subparsers.add_parser("convert", help="convert every file to another format")
+    add_common_arguments(convert_parser)
+    convert_parser.add_argument("--to", required=True, choices=OUTPUT_FORMATS, dest="output_format",
+                                help="the output format")
+    convert_parser.add_argument("--output-dir", default=None, dest="output_directory",
+                                help="directory for the output files, by default next to the input files")
+    convert_parser.add_argument("--event-layers", action="store_true",
+                                help="for npz: also store the cell divisions, track starts and track ends")
+    return parser
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Runs the command line interface. Returns the exit code."""
+    args = _create_parser().parse_args(argv)
+    start_time = time.perf_counter()
+
+    if args.command == "inspect":
+        results, errors = _run_for_all_files(inspect_file, args.files, max_workers=args.workers)
+        if args.json:
+            print(json.dumps(results, indent=2))
+        else:
+            for result in results:
+                _print_inspection(result)
+        _print_summary("Inspected", len(args.files), errors, start_time)
+    else:
+        if args.output_directory is not None:
+            os.makedirs(args.output_directory, exist_ok=True)
+        _, errors = _run_for_all_files(convert_file, args.files, max_workers=args.workers,
+                                       output_format=args.output_format, output_directory=args.output_directory,
+                                       event_layers=args.event_layers)
+        _print_summary("Converted", len(args.files), errors, start_time)
+    return 1 if len(errors) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
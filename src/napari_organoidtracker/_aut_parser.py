@@ -0,0 +1,254 @@
+"""Parser for the .aut files written by OrganoidTracker. This module is only imported once a file is actually read,
+so that napari can check whether we support a file without importing all of our data classes and NumPy."""
+
+from itertools import repeat
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy
+
+from napari_organoidtracker import _json_backend, _probe, _profiling
+from napari_organoidtracker._compression import open_aut_file
+from napari_organoidtracker._basics import TimePoint
+from napari_organoidtracker._experiment import Experiment
+from napari_organoidtracker._links import Links, LinkingTrack
+from napari_organoidtracker._position import Position, _restore_position
+from napari_organoidtracker._position_data import PositionData
+from napari_organoidtracker._selection import DataSelection, EVERYTHING
+
+
+def _read_organoidtracker_file(filepath, *, json_backend: Optional[str] = None,
+                               time_range: Optional[Tuple[int, int]] = None,
+                               metadata_keys: Optional[Iterable[str]] = None) -> Experiment:
+    """Read a .aut file and return the data as a parsed Experiment object. Unsupported files are rejected before the
+    (slow) parsing starts. Compressed files are decompressed while reading, see the _compression module. See the
+    _json_backend module for the available JSON backends; by default, the fastest one that is installed is used.
+
+    If time_range (first and last time point number, both inclusive) is given, only those time points are loaded, and
+    tracks are cut at the edges. If metadata_keys is given, only that position metadata is loaded. See the _selection
+    module.
+    """
+    selection = DataSelection(time_range=time_range, metadata_keys=metadata_keys)
+    with _profiling.stage("probe"):
+        _probe.check_supported(filepath)
+    backend = _json_backend.get_backend(json_backend)
+    with _profiling.stage("json_decode"), open_aut_file(filepath) as handle:
+        data = backend.decode(handle.read(), selection)
+
+    return _parse_organoidtracker_data(data, selection)
+
+
+def _parse_organoidtracker_data(data: Dict[str, Any], selection: DataSelection = EVERYTHING, *,
+                                dangling_links: Optional[List[Tuple[Position, Position]]] = None) -> Experiment:
+    """Parses the decoded JSON contents of a .aut file. Only the selected part of the data is parsed.
+
+    If dangling_links is given, links to previous positions that are not in the file are added to that list, instead
+    of raising an error. This is used for files that contain only a part of the time points, see the _shards module.
+    Only the v2 format stores such links."""
+    experiment = Experiment()
+
+    if "version" not in data and "family_scores" not in data:
+        # We don't have a general data file, but a specialized one
+        raise ValueError(
+            "Unknown file format",
+            "This plugin is not able to load this AUT file: it is missing the version tag.",
+        )
+
+    version = data.get("version", "v1")
+    if version == "v1":
+        if "shapes" in data:
+            # Deprecated, nowadays stored in "positions"
+            _parse_simple_position_format(experiment, data["shapes"], selection)
+        elif "positions" in data:
+            _parse_simple_position_format(experiment, data["positions"], selection)
+
+        if "links" in data:
+            _parse_d3_links_format(experiment, data["links"], selection)
+        elif "links_scratch" in data:  # Deprecated, was used back when experiments could hold multiple linking sets
+            _parse_d3_links_format(experiment, data["links_scratch"], selection)
+        elif "links_baseline" in data:  # Deprecated, was used back when experiments could hold multiple linking sets
+            _parse_d3_links_format(experiment, data["links_baseline"], selection)
+    elif version == "v2":
+        if "positions" in data:
+            _parse_positions_and_meta_format(experiment, data["positions"], selection)
+        with _profiling.stage("parse_tracks"):
+            _parse_tracks_and_meta_format(experiment, data["tracks"], selection, dangling_links=dangling_links)
+    else:
+        raise ValueError(
+            "Unknown data version",
+            "This plugin is not able to load data of version " + str(data["version"]) + ".",
+        )
+
+    return experiment
+
+
+def _parse_d3_links_format(experiment: Experiment, links_json: Dict[str, Any], selection: DataSelection = EVERYTHING):
+    """Parses a node_link_graph and adds all links and positions to the experiment."""
+    links = Links()
+    position_data = PositionData()
+    _add_d3_data(position_data, links, links_json, selection)
+    with _profiling.stage("parse_links"):
+        links.sort_tracks_by_x()
+    experiment.position_data = position_data
+    experiment.links = links
+
+
+def _add_d3_data(position_data: PositionData, links: Links, links_json: Dict, selection: DataSelection = EVERYTHING):
+    """Adds data in the D3.js node-link format. Used for deserialization. Links to positions outside the selected
+    time range are left out."""
+
+    # Add position data
+    with _profiling.stage("parse_position_metadata"):
+        for node in links_json["nodes"]:
+            if len(node.keys()) == 1:
+                # No extra data found
+                continue
+            position = _parse_position(node["id"])
+            if not _is_selected(position, selection):
+                continue
+            for data_key, data_value in node.items():
+                if data_key == "id" or not selection.contains_metadata_key(data_key):
+                    continue
+                position_data.set_position_data(position, data_key, data_value)
+
+    # Add links
+    with _profiling.stage("parse_links"):
+        for link in links_json["links"]:
+            source = _parse_position(link["source"])
+            target = _parse_position(link["target"])
+            if not _is_selected(source, selection) or not _is_selected(target, selection):
+                continue
+            links.add_link(source, target)
+
+            # Now that we have a link, we can add link and lineage data
+            for data_key, data_value in link.items():
+                if data_key.startswith("__lineage_"):
+                    # Lineage metadata, store it
+                    links.set_lineage_data(links.get_track(source), data_key[len("__lineage_"):], data_value)
+
+
+def _parse_position(json_structure: Dict[str, Any]) -> Position:
+    if "_time_point_number" in json_structure:
+        return Position(
+            json_structure["x"],
+            json_structure["y"],
+            json_structure["z"],
+            time_point_number=json_structure["_time_point_number"],
+        )
+    return Position(json_structure["x"], json_structure["y"], json_structure["z"])
+
+
+def _is_selected(position: Position, selection: DataSelection) -> bool:
+    """Checks whether the position is in the selected time range. Positions without a time point are always
+    selected."""
+    time_point_number = position.time_point_number()
+    return time_point_number is None or selection.contains_time_point(time_point_number)
+
+
+def _create_positions(coords: Union[List[List[float]], numpy.ndarray], time_point_numbers: Iterable[int]
+                      ) -> List[Position]:
+    """Creates a position for every [x, y, z] in coords. The simdjson backend decodes lists of coordinates directly into
+    float64 arrays of shape (n, 3). The values in those are already floats, so the positions are then created without
+    converting every value again in Position.__init__."""
+    if isinstance(coords, numpy.ndarray):
+        return [_restore_position(x, y, z, time_point_number)
+                for (x, y, z), time_point_number in zip(coords.tolist(), time_point_numbers)]
+    return [Position(*raw_position, time_point_number=time_point_number)
+            for raw_position, time_point_number in zip(coords, time_point_numbers)]
+
+
+def _parse_simple_position_format(experiment: Experiment, json_structure: Dict[str, List],
+                                  selection: DataSelection = EVERYTHING):
+    positions = experiment.positions
+
+    with _profiling.stage("parse_positions"):
+        for time_point_number, raw_positions in json_structure.items():
+            time_point_number = int(time_point_number)  # str -> int
+            if not selection.contains_time_point(time_point_number):
+                continue
+
+            if not isinstance(raw_positions, numpy.ndarray):
+                raw_positions = [raw_position[0:3] for raw_position in raw_positions]
+            for position in _create_positions(raw_positions, repeat(time_point_number)):
+                positions.add(position)
+
+
+def _parse_positions_and_meta_format(experiment: Experiment, positions_json: List[Dict],
+                                     selection: DataSelection = EVERYTHING):
+    positions = experiment.positions
+
+    # First add all positions, and keep the positions of time points with metadata
+    time_points_with_meta = list()
+    with _profiling.stage("parse_positions"):
+        for time_point_json in positions_json:
+            time_point_number = time_point_json["time_point"]
+            if not selection.contains_time_point(time_point_number):
+                continue
+
+            has_meta = "position_meta" in time_point_json
+            positions_of_time_point = list() if has_meta else None
+            for position in _create_positions(time_point_json["coords_xyz_px"], repeat(time_point_number)):
+                positions.add(position)
+                if positions_of_time_point is not None:
+                    positions_of_time_point.append(position)
+
+            if has_meta:
+                position_meta = time_point_json["position_meta"]
+                if selection.metadata_keys is not None:
+                    position_meta = {metadata_key: values for metadata_key, values in position_meta.items()
+                                     if metadata_key in selection.metadata_keys}
+                time_points_with_meta.append((time_point_number, positions_of_time_point, position_meta))
+
+    # Then add the metadata
+    with _profiling.stage("parse_position_metadata"):
+        for time_point_number, positions_of_time_point, position_meta in time_points_with_meta:
+            experiment.position_data.add_data_from_time_point_dict(TimePoint(time_point_number),
+                                                                   positions_of_time_point, position_meta)
+
+
+def _parse_tracks_and_meta_format(experiment: Experiment, tracks_json: List[Dict],
+                                  selection: DataSelection = EVERYTHING, *,
+                                  dangling_links: Optional[List[Tuple[Position, Position]]] = None):
+    links = experiment.links
+
+    # Iterate a first time to add the tracks. Tracks are cut to the selected time range
+    tracks_with_links = list()
+    for track_json in tracks_json:
+        time_point_number_start = track_json["time_point_start"]
+        coords_xyz_px = track_json["coords_xyz_px"]
+        time_point_number_end = time_point_number_start + len(coords_xyz_px) - 1
+        if not selection.overlaps_time_points(time_point_number_start, time_point_number_end):
+            continue
+
+        min_index = 0
+        max_index = len(coords_xyz_px) - 1
+        if selection.time_range is not None:
+            min_index = max(min_index, selection.time_range[0] - time_point_number_start)
+            max_index = min(max_index, selection.time_range[1] - time_point_number_start)
+        positions_of_track = _create_positions(coords_xyz_px[min_index:max_index + 1],
+                                               range(time_point_number_start + min_index,
+                                                     time_point_number_start + max_index + 1))
+        track = LinkingTrack(positions_of_track)
+        links.add_track(track)
+
+        # Handle lineage metadata
+        if "lineage_meta" in track_json:
+            for metadata_key, metadata_value in track_json["lineage_meta"].items():
+                links.set_lineage_data(track, metadata_key, metadata_value)
+
+        # The previous positions are only loaded if the start of the track was not cut off, and if they are in the
+        # selected time range as well
+        if "coords_xyz_px_before" in track_json and min_index == 0 \
+                and selection.contains_time_point(time_point_number_start - 1):
+            tracks_with_links.append((positions_of_track[0], track_json["coords_xyz_px_before"]))
+
+    # Iterate again to add connections to previous tracks
+    for position_first, coords_xyz_px_before in tracks_with_links:
+        time_point_number_start = position_first.time_point_number()
+        for position_previous_track in _create_positions(coords_xyz_px_before, repeat(time_point_number_start - 1)):
+            # Connect the tracks
+            previous_track = links.get_track(position_previous_track)
+            if previous_track is None and dangling_links is not None:
+                dangling_links.append((position_previous_track, position_first))
+                continue
+            current_track = links.get_track(position_first)
+            links.connect_tracks(previous=previous_track, next=current_track)
@@ -0,0 +1,299 @@
+"""A binary file format (.autb) for the same data as an .aut file, made for fast loading of large experiments.
+
+The file starts with an eight-byte magic string and the length of a small JSON header (as an unsigned 64-bit little
+endian integer). After the header, all arrays follow, each starting at a multiple of 64 bytes. The header lists the
+dtype, shape and offset of every array. Because the arrays are stored as-is, they are memory-mapped when reading,
+instead of being parsed.
+
+Every position gets one row. First, there are the rows of all positions in tracks, in the same order as in TrackTable
+(so by track and then by time). After that, the positions without links follow. The following arrays are stored:
+
+* track_offsets, track_first_time_point_numbers, previous_offsets, previous_track_ids and next_counts: the tracks, see
+  TrackTable.
+* coords_xyz and time_point_numbers: the positions, one row for every position.
+* napari_tracks: the data of the napari tracks layer, so [track_id, t, (z), y, x]. This one is stored too so that it
+  can be used by napari without any copying.
+* For every position metadata key, values_<index> and (for float, int and bool values) present_<index>. Float values
+  are stored as float64 and int values as int64, both with 0 for missing values. Bool values are stored as uint8. Other
+  values (like strings, or a mix of ints and floats) are stored in a table in the header, and values_<index> contains
+  the index in that table (or -1 for missing values). So every value comes back with the same type.
+
+Lineage metadata is small (one value per track), so that is stored in the header."""
+
+import json
+import mmap
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy
+
+from napari_organoidtracker import _profiling
+from napari_organoidtracker._experiment import Experiment, _create_positions_table, _to_napari_feature, \
+    _track_table_to_napari
+from napari_organoidtracker._links import LinkingTrack
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._probe import BINARY_MAGIC
+from napari_organoidtracker._track_table import TrackTable
+
+_FORMAT_VERSION = 2
+_READABLE_FORMAT_VERSIONS = (1, 2)  # Version 1 didn't have int columns, ints were stored as floats
+_ALIGNMENT = 64
+
+# Data types of PositionData, and their names in the header
+_DATA_TYPE_NAMES = {float: "float", bool: "bool", str: "str", list: "list", object: "object"}
+_DATA_TYPES_BY_NAME = {name: data_type for data_type, name in _DATA_TYPE_NAMES.items()}
+
+_INT64_MIN = int(numpy.iinfo(numpy.int64).min)
+_INT64_MAX = int(numpy.iinfo(numpy.int64).max)
+
+
+def _encode_metadata_column(values: List[Any]) -> Tuple[Dict[str, Any], Dict[str, numpy.ndarray]]:
+    """Encodes the metadata values of all rows. Returns the header entry and the arrays."""
+    present_values = [value for value in values if value is not None]
+    present = numpy.fromiter((value is not None for value in values), dtype=numpy.uint8, count=len(values))
+    if all(type(value) is bool for value in present_values):
+        column = numpy.fromiter((value is True for value in values), dtype=numpy.uint8, count=len(values))
+        return {"kind": "bool"}, {"values": column, "present": present}
+    if all(type(value) is int for value in present_values) \
+            and all(_INT64_MIN <= value <= _INT64_MAX for value in present_values):
+        column = numpy.fromiter((0 if value is None else value for value in values), dtype=numpy.int64,
+                                count=len(values))
+        return {"kind": "int"}, {"values": column, "present": present}
+    if all(type(value) is float for value in present_values):
+        column = numpy.fromiter((0 if value is None else value for value in values), dtype=numpy.float64,
+                                count=len(values))
+        return {"kind": "float"}, {"values": column, "present": present}
+
+    # Store all distinct values in a table
+    table = list()
+    table_indices = dict()
+    codes = numpy.empty(len(values), dtype=numpy.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+            continue
+        key = json.dumps(value, sort_keys=True)
+        code = table_indices.get(key)
+        if code is None:
+            code = len(table)
+            table_indices[key] = code
+            table.append(value)
+        codes[i] = code
+    return {"kind": "table", "table": table}, {"values": codes}
+
+
+def write_binary_file(experiment: Experiment, file_path: str):
+    """Writes the experiment to a binary file."""
+    track_table = TrackTable.from_links(experiment.links)
+    links = experiment.links
+    untracked_positions = [position for position in experiment.positions
+                           if not links.contains_position(position)]
+    positions = track_table.positions + untracked_positions
+
+    arrays = {
+        "track_offsets": track_table.track_offsets,
+        "track_first_time_point_numbers": track_table.track_first_time_point_numbers,
+        "previous_offsets": track_table.previous_offsets,
+        "previous_track_ids": track_table.previous_track_ids,
+        "next_counts": track_table.next_counts,
+        "coords_xyz": numpy.array([(position.x, position.y, position.z) for position in positions],
+                                  dtype=numpy.float64).reshape(-1, 3),
+        "time_point_numbers": numpy.array([position.time_point_number() for position in positions],
+                                          dtype=numpy.int64),
+        "napari_tracks": _create_positions_table(track_table, numpy.arange(len(track_table)))
+        if track_table.track_count() > 0 else numpy.empty((0, 5), dtype=numpy.float32)
+    }
+
+    position_metadata = dict()
+    position_data = experiment.position_data
+    for index, (data_name, data_type) in enumerate(position_data.get_data_names_and_types().items()):
+        values = [position_data.get_position_data(position, data_name) for position in positions]
+        column_header, column_arrays = _encode_metadata_column(values)
+        column_header["index"] = index
+        column_header["type"] = _DATA_TYPE_NAMES.get(data_type, "object")
+        position_metadata[data_name] = column_header
+        for array_name, array in column_arrays.items():
+            arrays[f"{array_name}_{index}"] = array
+
+    lineage_metadata = dict()
+    for track_id, track in enumerate(links._tracks):
+        for data_name, value in links.find_all_data_of_lineage(track):
+            if data_name not in lineage_metadata:
+                lineage_metadata[data_name] = [None] * track_table.track_count()
+            lineage_metadata[data_name][track_id] = value
+
+    # Calculate where every array will be stored
+    header = {"format_version": _FORMAT_VERSION, "tracked_position_count": len(track_table),
+              "position_metadata": position_metadata, "lineage_metadata": lineage_metadata, "arrays": dict()}
+    arrays = {name: numpy.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<")) for name, array in
+              arrays.items()}
+    header_bytes = _encode_header(header, arrays)
+
+    with open(file_path, "wb") as handle:
+        handle.write(BINARY_MAGIC)
+        handle.write(struct.pack("<Q", len(header_bytes)))
+        handle.write(header_bytes)
+        for name, array in arrays.items():
+            handle.write(b"\0" * (header["arrays"][name]["offset"] - handle.tell()))
+            handle.write(array.data)
+
+
+def _encode_header(header: Dict[str, Any], arrays: Dict[str, numpy.ndarray]) -> bytes:
+    """Fills in the array offsets in the header, and encodes the header. The offsets depend on the length of the header
+    itself, so we keep trying until the header length doesn't change anymore."""
+    header_length = 0
+    while True:
+        offset = _align(len(BINARY_MAGIC) + 8 + header_length)
+        for name, array in arrays.items():
+            header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset = _align(offset + array.nbytes)
+        header_bytes = json.dumps(header).encode("utf-8")
+        if len(header_bytes) <= header_length:
+            return header_bytes + b" " * (header_length - len(header_bytes))
+        header_length = len(header_bytes) + 64  # Leave some room, as the offsets may become longer
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+class BinaryFile:
+    """A memory-mapped binary file. The arrays are read-only views of the file, so nothing is loaded into memory until
+    it is actually used."""
+
+    header: Dict[str, Any]
+    _buffer: mmap.mmap
+
+    def __init__(self, file_path: str):
+        with open(file_path, "rb") as handle:
+            self._buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._buffer[:len(BINARY_MAGIC)] != BINARY_MAGIC:
+            raise ValueError("Unknown file format", "This is not a binary OrganoidTracker file.")
+        header_length, = struct.unpack_from("<Q", self._buffer, len(BINARY_MAGIC))
+        header_start = len(BINARY_MAGIC) + 8
+        self.header = json.loads(self._buffer[header_start:header_start + header_length])
+        if self.header["format_version"] not in _READABLE_FORMAT_VERSIONS:
+            raise ValueError("Unknown data version", "This plugin is not able to load binary files of version "
+                             + str(self.header["format_version"]) + ".")
+
+    def get_array(self, name: str) -> numpy.ndarray:
+        """Gets a read-only, memory-mapped array."""
+        array_header = self.header["arrays"][name]
+        dtype = numpy.dtype(array_header["dtype"])
+        shape = tuple(array_header["shape"])
+        count = int(numpy.prod(shape))
+        if count == 0:
+            return numpy.empty(shape, dtype=dtype)  # The offset of an empty array may point past the end of the file
+        return numpy.frombuffer(self._buffer, dtype=dtype, count=count, offset=array_header["offset"]).reshape(shape)
+
+    def tracked_position_count(self) -> int:
+        return self.header["tracked_position_count"]
+
+    def to_track_table(self) -> TrackTable:
+        """Gets the track table. Its positions attribute is None, as the positions are not loaded."""
+        return TrackTable(
+            track_offsets=self.get_array("track_offsets"),
+            track_first_time_point_numbers=self.get_array("track_first_time_point_numbers"),
+            previous_offsets=self.get_array("previous_offsets"),
+            previous_track_ids=self.get_array("previous_track_ids"),
+            next_counts=self.get_array("next_counts"),
+            coords_xyz=self.get_array("coords_xyz")[:self.tracked_position_count()],
+            positions=None)
+
+    def collect_napari_features(self, rows: numpy.ndarray) -> Dict[str, numpy.ndarray]:
+        """Gets the metadata of the given rows in the format of the napari tracks layer. Like in
+        _experiment_to_napari, strings are converted to numbers, and missing values become 0."""
+        all_rows = len(rows) == self.tracked_position_count()  # Then we can avoid copying
+        features = dict()
+        for data_name, column_header in self.header["position_metadata"].items():
+            if column_header["type"] not in ("float", "bool", "str"):
+                continue
+            values = self.get_array(f"values_{column_header['index']}")
+            if column_header["kind"] == "bool":
+                values = values.view(numpy.bool_)
+            elif column_header["kind"] == "table":
+                lookup_table = [_to_napari_feature(value) for value in column_header["table"]] + [0]  # -1 becomes 0
+                values = numpy.array(lookup_table)[values[:self.tracked_position_count()]]
+            features[data_name] = values[:self.tracked_position_count()] if all_rows else values[rows]
+        return features
+
+    def to_experiment(self) -> Experiment:
+        """Loads all data as an Experiment. This is a lot slower than using the arrays directly, as a Position object
+        needs to be created for every position."""
+        experiment = Experiment()
+        time_point_numbers = self.get_array("time_point_numbers").tolist()
+        positions = [Position(x, y, z, time_point_number=time_point_number) for (x, y, z), time_point_number
+                     in zip(self.get_array("coords_xyz").tolist(), time_point_numbers)]
+        for position in positions:
+            experiment.positions.add(position)
+
+        # Add the tracks
+        links = experiment.links
+        track_offsets = self.get_array("track_offsets").tolist()
+        previous_offsets = self.get_array("previous_offsets").tolist()
+        previous_track_ids = self.get_array("previous_track_ids").tolist()
+        tracks = [LinkingTrack(positions[track_offsets[i]:track_offsets[i + 1]])
+                  for i in range(len(track_offsets) - 1)]
+        for track in tracks:
+            links.add_track(track)
+        for track_id, track in enumerate(tracks):
+            for previous_track_id in previous_track_ids[previous_offsets[track_id]:previous_offsets[track_id + 1]]:
+                links.connect_tracks(previous=tracks[previous_track_id], next=track)
+        for data_name, values in self.header["lineage_metadata"].items():
+            for track, value in zip(tracks, values):
+                if value is not None:
+                    links.set_lineage_data(track, data_name, value)
+
+        # Add the position metadata
+        position_data = experiment.position_data
+        for data_name, column_header in self.header["position_metadata"].items():
+            values = self._decode_metadata_column(column_header)
+            data_set = {position: value for position, value in zip(positions, values) if value is not None}
+            if len(data_set) > 0:
+                position_data.add_positions_data(data_name, data_set)
+                position_data._data_names_and_types[data_name] = _DATA_TYPES_BY_NAME[column_header["type"]]
+        return experiment
+
+    def _decode_metadata_column(self, column_header: Dict[str, Any]) -> List[Optional[Any]]:
+        values = self.get_array(f"values_{column_header['index']}")
+        if column_header["kind"] == "table":
+            table = column_header["table"]
+            return [None if code == -1 else table[code] for code in values.tolist()]
+        present = self.get_array(f"present_{column_header['index']}").tolist()
+        if column_header["kind"] == "bool":
+            return [bool(value) if is_present else None for value, is_present in zip(values.tolist(), present)]
+        return [value if is_present else None for value, is_present in zip(values.tolist(), present)]
+
+
+def read_binary_file(file_path: str) -> Experiment:
+    """Reads a binary file as an Experiment."""
+    return BinaryFile(file_path).to_experiment()
+
+
+def _binary_file_to_napari(file_path: str, *, event_layers: bool = False, overview_step: Optional[int] = None,
+                           motion_features: bool = False) -> List[Tuple[numpy.ndarray, Dict, str]]:
+    """Creates the napari layers directly from the memory-mapped arrays, without loading an Experiment. The data of the
+    tracks layer is a view of the file. See _experiment._experiment_to_napari for the parameters."""
+    with _profiling.stage("open_binary_file"):
+        binary_file = BinaryFile(file_path)
+        track_table = binary_file.to_track_table()
+
+    def load_full_resolution() -> List[Tuple[numpy.ndarray, Dict, str]]:
+        return _binary_file_to_napari(file_path, motion_features=motion_features)
+
+    lineage_metadata = dict()
+    for data_name, values in binary_file.header["lineage_metadata"].items():
+        for track_id, value in enumerate(values):
+            if value is not None:
+                lineage_metadata.setdefault(track_id, dict())[data_name] = value
+
+    return _track_table_to_napari(track_table, binary_file.collect_napari_features, event_layers=event_layers,
+                                  overview_step=overview_step, load_full_resolution=load_full_resolution,
+                                  positions_table=binary_file.get_array("napari_tracks"),
+                                  lineage_metadata=lineage_metadata, motion_features=motion_features)
+
+
+def convert_to_binary(aut_file_path: str, binary_file_path: str, *, json_backend: Optional[str] = None):
+    """Converts an .aut file (optionally compressed) to a binary file."""
+    from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+    write_binary_file(_read_organoidtracker_file(aut_file_path, json_backend=json_backend), binary_file_path)
@@ -0,0 +1,210 @@
+"""In-memory cache of parsed files, so that opening the same file again in the same napari session is instant.
+
+Both the parsed Experiment and the napari layers created from it are cached, keyed by the (resolved) path, the
+modification time and the size of the file, so a file that changes on disk is parsed again. The reader options are part
+of the key as well: a file opened with a different time range is a different entry, while opening it with or without
+event layers reuses the same Experiment.
+
+The cache is bounded by an estimate of the memory it uses. If it grows too large, the least recently used files are
+evicted. The limit can be set using the NAPARI_ORGANOIDTRACKER_CACHE_MB environment variable (0 disables the cache) or
+using set_cache_limit.
+
+Every call returns a copy of the cached layers: the layer data, features, graph and layer metadata are all copied.
+So the returned layers can be edited like the layers of an uncached file, without affecting the cache or the layers
+returned by other calls. Copying is still a lot faster than parsing the file again."""
+
+import copy
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy
+
+from napari_organoidtracker._experiment import Experiment
+
+_ENVIRONMENT_VARIABLE = "NAPARI_ORGANOIDTRACKER_CACHE_MB"
+_DEFAULT_LIMIT_BYTES = 1024 * 1024 * 1024
+
+# Rough memory use of a parsed position, and of every metadata value. Measured on synthetic data using tracemalloc.
+_ESTIMATED_BYTES_PER_POSITION = 500
+_ESTIMATED_BYTES_PER_METADATA_VALUE = 100
+
+LayerData = Tuple[numpy.ndarray, Dict[str, Any], str]
+
+
+def get_file_key(file_path: str) -> Tuple[str, int, int]:
+    """Gets the part of the cache key that identifies the file: the resolved path, modification time and size. Cache
+    keys must be tuples starting with this."""
+    stat = os.stat(file_path)
+    return os.path.realpath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+class _CacheEntry:
+    """The cached data of one file (with one set of reader options)."""
+
+    experiment: Experiment
+    layers: Dict[Hashable, List[LayerData]]  # By the options used for creating the layers
+    size_bytes: int
+
+    def __init__(self, experiment: Experiment):
+        self.experiment = experiment
+        self.layers = dict()
+        self.size_bytes = _estimate_experiment_size(experiment)
+
+
+class ExperimentCache:
+    """LRU cache of parsed experiments and their napari layers. Thread-safe."""
+
+    limit_bytes: int
+    hits: int
+    misses: int
+
+    _entries: "OrderedDict[Hashable, _CacheEntry]"
+    _size_bytes: int
+    _lock: threading.RLock
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.RLock()
+
+    def get_layers(self, key: Hashable, layer_options: Hashable, read_experiment: Callable[[], Experiment],
+                   create_layers: Callable[[Experiment], List[LayerData]]) -> List[LayerData]:
+        """Gets the layers of a file. If the file is not in the cache, read_experiment is called. If the layers with
+        the given options were not created before, create_layers is called."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                layers = entry.layers.get(layer_options)
+                if layers is not None:
+                    self.hits += 1
+                    return _copy_layers(layers)
+            self.misses += 1
+
+        # Parse outside the lock, so that other files can be read in the meantime
+        if entry is None:
+            entry = _CacheEntry(read_experiment())
+        layers = create_layers(entry.experiment)
+        for layer_data in layers:
+            layer_data[0].flags.writeable = False  # Only ever handed out as copies
+
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                self._remove(key)
+                self._entries[key] = entry
+                self._size_bytes += entry.size_bytes
+            if layer_options not in entry.layers:
+                entry.layers[layer_options] = layers
+                layers_size_bytes = _estimate_layers_size(layers)
+                entry.size_bytes += layers_size_bytes
+                self._size_bytes += layers_size_bytes
+            self._evict()
+        return _copy_layers(layers)
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size_bytes -= entry.size_bytes
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits in its limit."""
+        while self._size_bytes > self.limit_bytes and len(self._entries) > 0:
+            self._remove(next(iter(self._entries)))
+
+    def is_enabled(self) -> bool:
+        return self.limit_bytes > 0
+
+    def set_limit(self, limit_bytes: int):
+        with self._lock:
+            self.limit_bytes = limit_bytes
+            self._evict()
+
+    def clear(self):
+        """Removes all entries, and resets the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self._size_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> Dict[str, Any]:
+        """Gets the statistics of this cache, and the files in it (least recently used first)."""
+        with self._lock:
+            return {"entries": len(self._entries), "size_bytes": self._size_bytes, "limit_bytes": self.limit_bytes,
+                    "hits": self.hits, "misses": self.misses,
+                    "files": [key[0][0] for key in self._entries.keys()]}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _estimate_experiment_size(experiment: Experiment) -> int:
+    position_count = len(experiment.positions)
+    metadata_value_count = sum(sum(metadata_at_time_point._metadata_counts.values())
+                               for metadata_at_time_point in experiment.position_data._all_positions.values())
+    return position_count * _ESTIMATED_BYTES_PER_POSITION + metadata_value_count * _ESTIMATED_BYTES_PER_METADATA_VALUE
+
+
+def _estimate_layers_size(layers: List[LayerData]) -> int:
+    size_bytes = 0
+    for data, layer_kwargs, _ in layers:
+        size_bytes += data.nbytes
+        for values in layer_kwargs.get("features", dict()).values():
+            size_bytes += values.nbytes if isinstance(values, numpy.ndarray) else len(values) * 8
+    return size_bytes
+
+
+def _copy_layers(layers: List[LayerData]) -> List[LayerData]:
+    """Copies the layers, so that nothing is shared with the cache. The returned layer data is writable."""
+    copied_layers = list()
+    for data, layer_kwargs, layer_type in layers:
+        layer_kwargs = dict(layer_kwargs)
+        if "features" in layer_kwargs:
+            layer_kwargs["features"] = {name: values.copy() if isinstance(values, numpy.ndarray) else list(values)
+                                        for name, values in layer_kwargs["features"].items()}
+        if "graph" in layer_kwargs:
+            layer_kwargs["graph"] = {track_id: list(parent_ids) for track_id, parent_ids
+                                     in layer_kwargs["graph"].items()}
+        if "metadata" in layer_kwargs:
+            # Functions (like load_full_resolution) are shared, copying them would copy the Experiment they use
+            layer_kwargs["metadata"] = {key: value if callable(value) else copy.deepcopy(value)
+                                        for key, value in layer_kwargs["metadata"].items()}
+        copied_layers.append((data.copy(), layer_kwargs, layer_type))
+    return copied_layers
+
+
+def _get_limit_from_environment() -> int:
+    limit_mb = os.environ.get(_ENVIRONMENT_VARIABLE)
+    if not limit_mb:
+        return _DEFAULT_LIMIT_BYTES
+    return int(float(limit_mb) * 1024 * 1024)
+
+
+_cache = ExperimentCache(_get_limit_from_environment())
+
+
+def get_cache() -> ExperimentCache:
+    """Gets the cache used by the reader."""
+    return _cache
+
+
+def cache_info() -> Dict[str, Any]:
+    """Gets the number of cached files, their estimated memory use, the number of hits and misses and the paths of the
+    cached files."""
+    return _cache.info()
+
+
+def clear_cache():
+    """Removes all cached files."""
+    _cache.clear()
+
+
+def set_cache_limit(limit_bytes: Optional[int]):
+    """Sets the maximum estimated memory use of the cache. Use 0 to disable the cache, or None to reset the limit to the
+    default."""
+    _cache.set_limit(_get_limit_from_environment() if limit_bytes is None else limit_bytes)
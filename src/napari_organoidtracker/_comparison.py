@@ -0,0 +1,437 @@
+"""Comparison of automatic tracking results with ground truth (for example manual annotations).
+
+First, the positions of both experiments are matched, one time point at a time: candidate pairs are positions at most
+max_distance apart (found using the grid of the _neighbours module), and of those the pairs are picked that match as
+many positions as possible, with the lowest total distance. Most positions have only one candidate, so only the
+clusters of positions that compete for the same partners are solved using the Hungarian algorithm.
+
+Then, using the matches, every link and every division in one experiment is looked up in the other one, using array
+operations on the track tables of both experiments. A link is correct if both of its positions are matched to
+positions that are linked in the ground truth. A division is correct if the dividing position is matched to a dividing
+position in the ground truth.
+"""
+
+import itertools
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy
+
+from napari_organoidtracker._experiment import Experiment
+from napari_organoidtracker._neighbours import _find_close_pairs
+from napari_organoidtracker._parallel import map_in_batches
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._track_table import TrackTable
+
+# Clusters of competing points up to this size are solved by trying all assignments, larger ones using the Hungarian
+# algorithm
+_MAX_BRUTE_FORCE_SIZE = 4
+
+
+class Score:
+    """Counts of correct and incorrect predictions, for calculating the precision and recall."""
+
+    true_positives: int
+    false_positives: int
+    false_negatives: int
+
+    def __init__(self, *, true_positives: int, false_positives: int, false_negatives: int):
+        self.true_positives = true_positives
+        self.false_positives = false_positives
+        self.false_negatives = false_negatives
+
+    def precision(self) -> float:
+        """Fraction of the predictions that are correct. Returns 1 if nothing was predicted."""
+        predicted = self.true_positives + self.false_positives
+        return self.true_positives / predicted if predicted > 0 else 1.0
+
+    def recall(self) -> float:
+        """Fraction of the ground truth that was predicted. Returns 1 if there is no ground truth."""
+        expected = self.true_positives + self.false_negatives
+        return self.true_positives / expected if expected > 0 else 1.0
+
+    def f1_score(self) -> float:
+        precision = self.precision()
+        recall = self.recall()
+        return 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return f"Score(true_positives={self.true_positives}, false_positives={self.false_positives}," \
+               f" false_negatives={self.false_negatives})"
+
+
+class TrackErrors:
+    """The errors in a single track. For a ground truth track, these are the positions, links and division that were
+    missed by the automatic tracking. For an automatic track, these are the ones that are not in the ground truth."""
+
+    track_id: int  # As in Links.find_all_tracks_and_ids()
+    first_position: Position
+    position_errors: int
+    link_errors: int
+    division_error: bool
+
+    def __init__(self, *, track_id: int, first_position: Position, position_errors: int, link_errors: int,
+                 division_error: bool):
+        self.track_id = track_id
+        self.first_position = first_position
+        self.position_errors = position_errors
+        self.link_errors = link_errors
+        self.division_error = division_error
+
+    def __repr__(self) -> str:
+        return f"TrackErrors(track_id={self.track_id}, first_position={self.first_position!r}," \
+               f" position_errors={self.position_errors}, link_errors={self.link_errors}," \
+               f" division_error={self.division_error})"
+
+
+class _ExperimentArrays:
+    """All positions of an experiment as arrays. The rows are the rows of the track table, followed by the positions
+    that are not in any track."""
+
+    track_table: TrackTable
+    positions: List[Position]
+    coords_xyz: numpy.ndarray
+    time_point_numbers: numpy.ndarray
+    track_ids: numpy.ndarray  # Track id of every row, or -1 for positions that are not in a track
+    link_sources: numpy.ndarray  # Row of the earlier position of every link
+    link_targets: numpy.ndarray  # Row of the later position of every link
+    is_division: numpy.ndarray  # For every row, whether the position has multiple next positions
+
+    def __init__(self, experiment: Experiment):
+        track_table = TrackTable.from_links(experiment.links)
+        self.track_table = track_table
+        self.positions, self.coords_xyz, self.time_point_numbers, self.track_ids = \
+            track_table.with_untracked_positions(experiment.positions)
+
+        # Links within tracks, and links from the last position of a track to the first positions of the next tracks
+        row_track_ids = self.track_ids[:len(track_table)]
+        within_track_sources = numpy.flatnonzero(row_track_ids[:-1] == row_track_ids[1:])
+        between_track_targets = numpy.repeat(track_table.first_rows(), track_table.previous_counts())
+        between_track_sources = track_table.last_rows()[track_table.previous_track_ids]
+        self.link_sources = numpy.concatenate([within_track_sources, between_track_sources])
+        self.link_targets = numpy.concatenate([within_track_sources + 1, between_track_targets])
+        self.is_division = numpy.zeros(len(self.positions), dtype=bool)
+        self.is_division[track_table.division_rows()] = True
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+
+class ComparisonResult:
+    """The result of comparing automatic tracking with the ground truth."""
+
+    positions: Score
+    links: Score
+    divisions: Score
+
+    _automatic: _ExperimentArrays
+    _ground_truth: _ExperimentArrays
+    _automatic_matches: numpy.ndarray  # For every automatic row, the matching ground truth row, or -1
+    _ground_truth_matches: numpy.ndarray  # For every ground truth row, the matching automatic row, or -1
+    _is_automatic_link_correct: numpy.ndarray
+    _is_ground_truth_link_found: numpy.ndarray
+
+    def __init__(self, automatic: _ExperimentArrays, ground_truth: _ExperimentArrays,
+                 automatic_matches: numpy.ndarray, ground_truth_matches: numpy.ndarray):
+        self._automatic = automatic
+        self._ground_truth = ground_truth
+        self._automatic_matches = automatic_matches
+        self._ground_truth_matches = ground_truth_matches
+
+        matched_count = int(numpy.count_nonzero(automatic_matches >= 0))
+        self.positions = Score(true_positives=matched_count, false_positives=len(automatic) - matched_count,
+                               false_negatives=len(ground_truth) - matched_count)
+
+        self._is_automatic_link_correct = _find_links(automatic, automatic_matches, ground_truth)
+        self._is_ground_truth_link_found = _find_links(ground_truth, ground_truth_matches, automatic)
+        correct_link_count = int(numpy.count_nonzero(self._is_automatic_link_correct))
+        self.links = Score(true_positives=correct_link_count,
+                           false_positives=len(self._is_automatic_link_correct) - correct_link_count,
+                           false_negatives=len(self._is_ground_truth_link_found) - correct_link_count)
+
+        correct_division_count = int(numpy.count_nonzero(self._is_correct_division(automatic, automatic_matches,
+                                                                                   ground_truth)))
+        self.divisions = Score(
+            true_positives=correct_division_count,
+            false_positives=int(numpy.count_nonzero(automatic.is_division)) - correct_division_count,
+            false_negatives=int(numpy.count_nonzero(ground_truth.is_division)) - correct_division_count)
+
+    @staticmethod
+    def _is_correct_division(experiment: _ExperimentArrays, matches: numpy.ndarray, other: _ExperimentArrays
+                             ) -> numpy.ndarray:
+        """Gets for every row whether it is a division that is also a division in the other experiment."""
+        is_correct = numpy.zeros(len(experiment), dtype=bool)
+        is_matched = matches >= 0
+        is_correct[is_matched] = experiment.is_division[is_matched] & other.is_division[matches[is_matched]]
+        return is_correct
+
+    def get_matches(self) -> Dict[Position, Position]:
+        """Gets all matches, as automatic position to ground truth position."""
+        rows = numpy.flatnonzero(self._automatic_matches >= 0)
+        return {self._automatic.positions[row]: self._ground_truth.positions[match]
+                for row, match in zip(rows.tolist(), self._automatic_matches[rows].tolist())}
+
+    def ground_truth_track_errors(self) -> List[TrackErrors]:
+        """Gets the errors of every ground truth track that was not completely found by the automatic tracking."""
+        return _find_track_errors(self._ground_truth, self._ground_truth_matches, self._is_ground_truth_link_found,
+                                  self._is_correct_division(self._ground_truth, self._ground_truth_matches,
+                                                            self._automatic))
+
+    def automatic_track_errors(self) -> List[TrackErrors]:
+        """Gets the errors of every automatic track that is not completely in the ground truth."""
+        return _find_track_errors(self._automatic, self._automatic_matches, self._is_automatic_link_correct,
+                                  self._is_correct_division(self._automatic, self._automatic_matches,
+                                                            self._ground_truth))
+
+    def __repr__(self) -> str:
+        return f"ComparisonResult(positions={self.positions!r}, links={self.links!r}, divisions={self.divisions!r})"
+
+
+def compare_experiments(automatic: Experiment, ground_truth: Experiment, *, max_distance: float,
+                        scale_xyz: Sequence[float] = (1, 1, 1), max_workers: Optional[int] = None
+                        ) -> ComparisonResult:
+    """Compares the automatic tracking with the ground truth. Positions are matched if they are in the same time point
+    and at most max_distance apart (in pixels, or in the unit of scale_xyz if that is given). The time points are
+    divided over max_workers processes (by default, one per CPU). With max_workers=1, everything runs in the current
+    process."""
+    from napari_organoidtracker import _profiling
+
+    if not max_distance > 0:
+        raise ValueError(f"max_distance must be positive, but was {max_distance}")
+    scale_xyz = numpy.asarray(scale_xyz, dtype=numpy.float64)
+    with _profiling.stage("build_comparison_arrays"):
+        automatic_arrays = _ExperimentArrays(automatic)
+        ground_truth_arrays = _ExperimentArrays(ground_truth)
+
+    with _profiling.stage("match_positions"):
+        automatic_matches, ground_truth_matches = _match_positions(automatic_arrays, ground_truth_arrays,
+                                                                   max_distance, scale_xyz, max_workers)
+
+    with _profiling.stage("compare_links"):
+        return ComparisonResult(automatic_arrays, ground_truth_arrays, automatic_matches, ground_truth_matches)
+
+
+def _rows_by_time_point(arrays: _ExperimentArrays) -> Dict[int, numpy.ndarray]:
+    order = numpy.argsort(arrays.time_point_numbers, kind="stable")
+    time_point_numbers, starts = numpy.unique(arrays.time_point_numbers[order], return_index=True)
+    return dict(zip(time_point_numbers.tolist(), numpy.split(order, starts[1:])))
+
+
+def _match_positions(automatic: _ExperimentArrays, ground_truth: _ExperimentArrays, max_distance: float,
+                     scale_xyz: numpy.ndarray, max_workers: Optional[int]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Matches the positions of both experiments. Returns for every automatic row the matching ground truth row, and
+    the other way round, or -1 if there's no match."""
+    automatic_rows = _rows_by_time_point(automatic)
+    ground_truth_rows = _rows_by_time_point(ground_truth)
+    time_point_numbers = sorted(automatic_rows.keys() & ground_truth_rows.keys())
+    row_pairs = [(automatic_rows[time_point_number], ground_truth_rows[time_point_number])
+                 for time_point_number in time_point_numbers]
+    tasks = [(automatic.coords_xyz[rows] * scale_xyz, ground_truth.coords_xyz[other_rows] * scale_xyz)
+             for rows, other_rows in row_pairs]
+
+    results = map_in_batches(_match_time_points, tasks, max_distance, max_workers=max_workers)
+
+    automatic_matches = numpy.full(len(automatic), -1, dtype=numpy.int64)
+    ground_truth_matches = numpy.full(len(ground_truth), -1, dtype=numpy.int64)
+    for (rows, other_rows), (matched, other_matched) in zip(row_pairs, results):
+        automatic_matches[rows[matched]] = other_rows[other_matched]
+        ground_truth_matches[other_rows[other_matched]] = rows[matched]
+    return automatic_matches, ground_truth_matches
+
+
+def _match_time_points(tasks: List[Tuple[numpy.ndarray, numpy.ndarray]], max_distance: float
+                       ) -> List[Tuple[numpy.ndarray, numpy.ndarray]]:
+    """Matches the points of multiple time points. Runs in a worker process, so everything must be picklable."""
+    return [_match_points(coords_xyz, other_coords_xyz, max_distance) for coords_xyz, other_coords_xyz in tasks]
+
+
+def _match_points(coords_xyz: numpy.ndarray, other_coords_xyz: numpy.ndarray, max_distance: float
+                  ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Matches as many points as possible to a point in the other set, at most max_distance away, with the lowest
+    total distance. Returns the indices of the matched points in both sets."""
+    sources, targets, distances = _find_close_pairs(coords_xyz, other_coords_xyz, max_distance)
+
+    # Pairs of points that have no other candidates can be matched right away
+    source_counts = numpy.bincount(sources, minlength=len(coords_xyz))
+    target_counts = numpy.bincount(targets, minlength=len(other_coords_xyz))
+    is_unique = (source_counts[sources] == 1) & (target_counts[targets] == 1)
+    matched_sources = [sources[is_unique]]
+    matched_targets = [targets[is_unique]]
+
+    # The other pairs form clusters of points competing for the same partners
+    sources, targets, distances = sources[~is_unique], targets[~is_unique], distances[~is_unique]
+    components = _find_connected_components(sources, targets + len(coords_xyz), len(coords_xyz)
+                                            + len(other_coords_xyz))[sources]
+    order = numpy.lexsort((distances, components))
+    sources, targets, distances, components = sources[order], targets[order], distances[order], components[order]
+    starts = numpy.flatnonzero(numpy.diff(components, prepend=-1))
+    ends = numpy.append(starts[1:], len(components))
+    cluster_ids = numpy.repeat(numpy.arange(len(starts)), ends - starts)
+    local_sources, source_counts = _number_within_clusters(cluster_ids, sources, len(starts))
+    local_targets, target_counts = _number_within_clusters(cluster_ids, targets, len(starts))
+    sizes = numpy.maximum(source_counts, target_counts)
+
+    # If a cluster has only one point in either set, only one pair can be matched: the nearest one, which is the first
+    # pair of the cluster
+    is_star = (source_counts == 1) | (target_counts == 1)
+    matched_sources.append(sources[starts[is_star]])
+    matched_targets.append(targets[starts[is_star]])
+
+    # Matching two points must always be cheaper than any sum of distances, so that the number of matches comes first
+    impossible_costs = numpy.bincount(cluster_ids, distances, minlength=len(starts)) + 1
+    for size in numpy.unique(sizes[~is_star]).tolist():
+        clusters = numpy.flatnonzero(~is_star & (sizes == size))
+        if size <= _MAX_BRUTE_FORCE_SIZE:
+            cluster_sources, cluster_targets = _solve_clusters_by_brute_force(
+                clusters, size, cluster_ids, local_sources, local_targets, sources, targets, distances,
+                impossible_costs)
+            matched_sources.append(cluster_sources)
+            matched_targets.append(cluster_targets)
+            continue
+        for cluster in clusters.tolist():
+            cluster_slice = slice(starts[cluster], ends[cluster])
+            costs = numpy.full((size, size), impossible_costs[cluster], dtype=numpy.float64)
+            costs[local_sources[cluster_slice], local_targets[cluster_slice]] = distances[cluster_slice]
+            source_map = numpy.full(size, -1, dtype=numpy.int64)
+            source_map[local_sources[cluster_slice]] = sources[cluster_slice]
+            target_map = numpy.full(size, -1, dtype=numpy.int64)
+            target_map[local_targets[cluster_slice]] = targets[cluster_slice]
+
+            assigned_columns = _linear_sum_assignment(costs)
+            is_possible = costs[numpy.arange(size), assigned_columns] < impossible_costs[cluster]
+            matched_sources.append(source_map[is_possible])
+            matched_targets.append(target_map[assigned_columns[is_possible]])
+    return numpy.concatenate(matched_sources), numpy.concatenate(matched_targets)
+
+
+def _number_within_clusters(cluster_ids: numpy.ndarray, values: numpy.ndarray, cluster_count: int
+                            ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Numbers the distinct values within every cluster as 0, 1, 2, etc. Returns the number of every value, and the
+    number of distinct values of every cluster."""
+    order = numpy.lexsort((values, cluster_ids))
+    sorted_cluster_ids = cluster_ids[order]
+    sorted_values = values[order]
+    is_new = numpy.ones(len(order), dtype=bool)
+    is_new[1:] = (sorted_cluster_ids[1:] != sorted_cluster_ids[:-1]) | (sorted_values[1:] != sorted_values[:-1])
+    numbers = numpy.cumsum(is_new) - 1
+    cluster_starts = numpy.searchsorted(sorted_cluster_ids, numpy.arange(cluster_count))
+    local_numbers = numpy.empty(len(order), dtype=numpy.int64)
+    local_numbers[order] = numbers - numbers[cluster_starts[sorted_cluster_ids]]
+    return local_numbers, numpy.bincount(sorted_cluster_ids[is_new], minlength=cluster_count)
+
+
+def _solve_clusters_by_brute_force(clusters: numpy.ndarray, size: int, cluster_ids: numpy.ndarray,
+                                   local_sources: numpy.ndarray, local_targets: numpy.ndarray, sources: numpy.ndarray,
+                                   targets: numpy.ndarray, distances: numpy.ndarray, impossible_costs: numpy.ndarray
+                                   ) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Solves many small clusters of the same size at once, by trying all possible assignments. Returns the matched
+    sources and targets."""
+    batch_indices = numpy.full(len(impossible_costs), -1, dtype=numpy.int64)
+    batch_indices[clusters] = numpy.arange(len(clusters))
+    edge_batch_indices = batch_indices[cluster_ids]
+    in_batch = edge_batch_indices >= 0
+    edge_batch_indices = edge_batch_indices[in_batch]
+
+    cluster_impossible_costs = impossible_costs[clusters]
+    costs = numpy.repeat(cluster_impossible_costs, size * size).reshape(len(clusters), size, size)
+    costs[edge_batch_indices, local_sources[in_batch], local_targets[in_batch]] = distances[in_batch]
+    source_map = numpy.full((len(clusters), size), -1, dtype=numpy.int64)
+    source_map[edge_batch_indices, local_sources[in_batch]] = sources[in_batch]
+    target_map = numpy.full((len(clusters), size), -1, dtype=numpy.int64)
+    target_map[edge_batch_indices, local_targets[in_batch]] = targets[in_batch]
+
+    permutations = numpy.array(list(itertools.permutations(range(size))), dtype=numpy.int64)
+    total_costs = costs[:, numpy.arange(size)[numpy.newaxis, :], permutations].sum(axis=2)
+    assigned_columns = permutations[numpy.argmin(total_costs, axis=1)]
+    assigned_costs = numpy.take_along_axis(costs, assigned_columns[:, :, numpy.newaxis], axis=2)[:, :, 0]
+    is_possible = assigned_costs < cluster_impossible_costs[:, numpy.newaxis]
+    return source_map[is_possible], numpy.take_along_axis(target_map, assigned_columns, axis=1)[is_possible]
+
+
+def _find_connected_components(sources: numpy.ndarray, targets: numpy.ndarray, node_count: int) -> numpy.ndarray:
+    """Gets for every node the lowest node number in its connected component, by repeatedly spreading the lowest label
+    over the edges."""
+    labels = numpy.arange(node_count, dtype=numpy.int64)
+    while True:
+        new_labels = labels.copy()
+        edge_labels = numpy.minimum(labels[sources], labels[targets])
+        numpy.minimum.at(new_labels, sources, edge_labels)
+        numpy.minimum.at(new_labels, targets, edge_labels)
+        new_labels = new_labels[new_labels]  # Jump to the label of the label, to spread faster
+        if numpy.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def _linear_sum_assignment(costs: numpy.ndarray) -> numpy.ndarray:
+    """Solves the assignment problem for a square cost matrix using the Hungarian algorithm (in the shortest augmenting
+    path formulation, O(n^3)). Returns for every row the assigned column."""
+    size = len(costs)
+    # Potentials and assignments use 1-based indices, with 0 as a virtual starting column
+    row_potentials = numpy.zeros(size + 1, dtype=numpy.float64)
+    column_potentials = numpy.zeros(size + 1, dtype=numpy.float64)
+    column_rows = numpy.zeros(size + 1, dtype=numpy.int64)  # Row assigned to every column, or 0
+    previous_columns = numpy.zeros(size + 1, dtype=numpy.int64)
+    for row in range(1, size + 1):
+        column_rows[0] = row
+        column = 0
+        min_reduced_costs = numpy.full(size + 1, numpy.inf)
+        is_used = numpy.zeros(size + 1, dtype=bool)
+        while True:
+            is_used[column] = True
+            current_row = column_rows[column]
+            reduced_costs = costs[current_row - 1] - row_potentials[current_row] - column_potentials[1:]
+            is_improved = ~is_used[1:] & (reduced_costs < min_reduced_costs[1:])
+            min_reduced_costs[1:][is_improved] = reduced_costs[is_improved]
+            previous_columns[1:][is_improved] = column
+            candidates = numpy.where(is_used[1:], numpy.inf, min_reduced_costs[1:])
+            next_column = int(numpy.argmin(candidates)) + 1
+            delta = candidates[next_column - 1]
+            row_potentials[column_rows[is_used]] += delta
+            column_potentials[is_used] -= delta
+            min_reduced_costs[~is_used] -= delta
+            column = next_column
+            if column_rows[column] == 0:
+                break
+        while column != 0:  # Flip the augmenting path
+            previous_column = previous_columns[column]
+            column_rows[column] = column_rows[previous_column]
+            column = previous_column
+
+    assigned_columns = numpy.empty(size, dtype=numpy.int64)
+    assigned_columns[column_rows[1:] - 1] = numpy.arange(size)
+    return assigned_columns
+
+
+def _find_links(experiment: _ExperimentArrays, matches: numpy.ndarray, other: _ExperimentArrays) -> numpy.ndarray:
+    """Gets for every link of the experiment whether both positions are matched to positions that are linked in the
+    other experiment."""
+    matched_sources = matches[experiment.link_sources]
+    matched_targets = matches[experiment.link_targets]
+    is_matched = (matched_sources >= 0) & (matched_targets >= 0)
+    other_link_keys = numpy.sort(other.link_sources * len(other) + other.link_targets)
+    is_found = numpy.zeros(len(experiment.link_sources), dtype=bool)
+    is_found[is_matched] = numpy.isin(matched_sources[is_matched] * len(other) + matched_targets[is_matched],
+                                      other_link_keys, assume_unique=True)
+    return is_found
+
+
+def _find_track_errors(experiment: _ExperimentArrays, matches: numpy.ndarray, is_link_found: numpy.ndarray,
+                       is_correct_division: numpy.ndarray) -> List[TrackErrors]:
+    """Counts the errors of every track. Links between tracks count for the earlier track."""
+    track_count = experiment.track_table.track_count()
+    in_track = experiment.track_ids >= 0
+    position_errors = numpy.bincount(experiment.track_ids[in_track & (matches < 0)], minlength=track_count)
+    link_errors = numpy.bincount(experiment.track_ids[experiment.link_sources[~is_link_found]],
+                                 minlength=track_count)
+    division_rows = numpy.flatnonzero(experiment.is_division & ~is_correct_division)
+    division_errors = numpy.zeros(track_count, dtype=bool)
+    division_errors[experiment.track_ids[division_rows]] = True
+
+    first_rows = experiment.track_table.first_rows()
+    errors = list()
+    for track_id in numpy.flatnonzero((position_errors > 0) | (link_errors > 0) | division_errors).tolist():
+        errors.append(TrackErrors(track_id=track_id, first_position=experiment.positions[first_rows[track_id]],
+                                  position_errors=int(position_errors[track_id]),
+                                  link_errors=int(link_errors[track_id]),
+                                  division_error=bool(division_errors[track_id])))
+    return errors
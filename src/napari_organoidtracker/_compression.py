@@ -0,0 +1,72 @@
+"""Support for compressed .aut files: .aut.gz, .aut.bz2, .aut.xz and .aut.zst. The first three are supported by the
+standard library, the last one needs the zstandard package. Files are decompressed while they are being read, so the
+compressed file is never loaded into memory as a whole.
+
+The compression libraries are only imported once a file is opened, so that napari_get_reader stays fast."""
+
+from typing import BinaryIO, Callable, Dict
+
+AUT_EXTENSION = ".aut"
+
+
+def _open_gzip(file_path: str, mode: str) -> BinaryIO:
+    import gzip
+    return gzip.open(file_path, mode)
+
+
+def _open_bz2(file_path: str, mode: str) -> BinaryIO:
+    import bz2
+    return bz2.open(file_path, mode)
+
+
+def _open_xz(file_path: str, mode: str) -> BinaryIO:
+    import lzma
+    return lzma.open(file_path, mode)
+
+
+def _open_zstd(file_path: str, mode: str) -> BinaryIO:
+    import zstandard
+    return zstandard.open(file_path, mode)
+
+
+def _open_uncompressed(file_path: str, mode: str) -> BinaryIO:
+    return open(file_path, mode)
+
+
+# Compression extension to function that opens such a file
+_OPENERS: Dict[str, Callable[[str, str], BinaryIO]] = {
+    ".gz": _open_gzip,
+    ".bz2": _open_bz2,
+    ".xz": _open_xz,
+    ".zst": _open_zstd,
+}
+
+
+def _get_opener(file_path: str) -> Callable[[str, str], BinaryIO]:
+    """Gets the function to open the given file. Files without a compression extension are opened as normal files."""
+    for extension, opener in _OPENERS.items():
+        if file_path.endswith(AUT_EXTENSION + extension):
+            return opener
+    return _open_uncompressed
+
+
+def is_aut_file_name(file_path: str) -> bool:
+    """Checks whether the file name is that of an .aut file, optionally compressed. Returns False for zstd-compressed
+    files if the zstandard package is not installed."""
+    if file_path.endswith(AUT_EXTENSION):
+        return True
+    opener = _get_opener(file_path)
+    if opener is _open_zstd:
+        from importlib.util import find_spec
+        return find_spec("zstandard") is not None
+    return opener is not _open_uncompressed
+
+
+def is_compressed(file_path: str) -> bool:
+    return _get_opener(file_path) is not _open_uncompressed
+
+
+def open_aut_file(file_path: str, mode: str = "rb") -> BinaryIO:
+    """Opens an .aut file in binary mode ("rb" or "wb"), decompressing or compressing it on the fly if the file name ends
+    with one of the compression extensions."""
+    return _get_opener(file_path)(file_path, mode)
@@ -0,0 +1,158 @@
+"""Exchange of tracks with the Cell Tracking Challenge (CTC) format. In that format, the tracks are stored in a text file
+(res_track.txt or man_track.txt) with one line per track: "L B E P", so the label of the track, the first and last time
+point (both inclusive) and the label of the parent track, or 0 if the track has no parent. The positions themselves are
+stored as labels in the mask images, which are not read here.
+
+When exporting, track i (as in Links.find_all_tracks_and_ids()) gets label i + 1, as label 0 is the background in CTC.
+Tracks that have multiple previous tracks (after two tracks were merged) only get the first one as their parent, as
+CTC doesn't support that. Time point numbers are written as-is.
+
+For importing, the position of every label at every time point must be given, for example the centroids of the masks.
+The result is an Experiment, with new track ids. Both exporting and importing work on all tracks at once, using array
+operations.
+"""
+
+import warnings
+
+import numpy
+
+from napari_organoidtracker._experiment import Experiment
+from napari_organoidtracker._links import Links, LinkingTrack
+from napari_organoidtracker._position import _positions_from_arrays
+from napari_organoidtracker._position_collection import PositionCollection
+from napari_organoidtracker._track_table import TrackTable
+
+
+def links_to_ctc_tracks(links: Links) -> numpy.ndarray:
+    """Gets the rows of the CTC track file, as an int64 array of shape (tracks, 4). Only a single pass over the tracks
+    is made, the positions are not visited."""
+    tracks = links._tracks
+    track_ids = {id(track): track_id for track_id, track in enumerate(tracks)}
+    first_time_point_numbers = numpy.fromiter((track._min_time_point_number for track in tracks), dtype=numpy.int64,
+                                              count=len(tracks))
+    track_lengths = numpy.fromiter((len(track._positions_by_time_point) for track in tracks), dtype=numpy.int64,
+                                   count=len(tracks))
+    parent_track_ids = numpy.fromiter((track_ids[id(track._previous_tracks[0])] if len(track._previous_tracks) > 0
+                                       else -1 for track in tracks), dtype=numpy.int64, count=len(tracks))
+    return _to_ctc_tracks(first_time_point_numbers, first_time_point_numbers + track_lengths - 1, parent_track_ids)
+
+
+def track_table_to_ctc_tracks(track_table: TrackTable) -> numpy.ndarray:
+    """Like links_to_ctc_tracks, but for a track table, for example from a binary file."""
+    parent_track_ids = numpy.full(track_table.track_count(), -1, dtype=numpy.int64)
+    has_parent = track_table.previous_counts() > 0
+    parent_track_ids[has_parent] = track_table.previous_track_ids[track_table.previous_offsets[:-1][has_parent]]
+    last_time_point_numbers = track_table.track_first_time_point_numbers + numpy.diff(track_table.track_offsets) - 1
+    return _to_ctc_tracks(track_table.track_first_time_point_numbers, last_time_point_numbers, parent_track_ids)
+
+
+def _to_ctc_tracks(first_time_point_numbers: numpy.ndarray, last_time_point_numbers: numpy.ndarray,
+                   parent_track_ids: numpy.ndarray) -> numpy.ndarray:
+    ctc_tracks = numpy.empty((len(parent_track_ids), 4), dtype=numpy.int64)
+    ctc_tracks[:, 0] = numpy.arange(1, len(parent_track_ids) + 1)
+    ctc_tracks[:, 1] = first_time_point_numbers
+    ctc_tracks[:, 2] = last_time_point_numbers
+    ctc_tracks[:, 3] = parent_track_ids + 1  # So -1 becomes 0
+    return ctc_tracks
+
+
+def write_ctc_track_file(file_path: str, ctc_tracks: numpy.ndarray):
+    """Writes the rows of a CTC track file, see links_to_ctc_tracks."""
+    numpy.savetxt(file_path, numpy.asarray(ctc_tracks, dtype=numpy.int64).reshape(-1, 4), fmt="%d", delimiter=" ")
+
+
+def read_ctc_track_file(file_path: str) -> numpy.ndarray:
+    """Reads a CTC track file, as an int64 array of shape (tracks, 4)."""
+    with open(file_path, "r") as handle:
+        values = handle.read().split()
+    if len(values) % 4 != 0:
+        raise ValueError(f"Expected four numbers on every line of {file_path}")
+    return numpy.array(values, dtype=numpy.int64).reshape(-1, 4)
+
+
+def ctc_tracks_to_experiment(ctc_tracks: numpy.ndarray, labels: numpy.ndarray, time_point_numbers: numpy.ndarray,
+                             coords_xyz: numpy.ndarray) -> Experiment:
+    """Creates an experiment from the rows of a CTC track file. The positions are given as one row per label per time
+    point: labels[i] at time_point_numbers[i] is at coords_xyz[i]. Every track must have exactly one position at every
+    time point from its first to its last time point. Tracks of a single position without parent or children end up
+    as positions without links.
+
+    A track that is the only child of its parent is added to the track of the parent, as Links stores those as a single
+    track. Links to parents that skip time points are left out, with a warning, as Links cannot store them."""
+    ctc_tracks = numpy.asarray(ctc_tracks, dtype=numpy.int64).reshape(-1, 4)
+    track_labels, first_time_point_numbers, last_time_point_numbers, parent_labels = ctc_tracks.T
+    labels = numpy.asarray(labels, dtype=numpy.int64)
+    time_point_numbers = numpy.asarray(time_point_numbers, dtype=numpy.int64)
+    coords_xyz = numpy.asarray(coords_xyz, dtype=numpy.float64).reshape(-1, 3)
+    if not len(labels) == len(time_point_numbers) == len(coords_xyz):
+        raise ValueError("Need a label, time point number and coordinates for every position")
+
+    # Find the parent of every CTC track (index in ctc_tracks)
+    label_order = numpy.argsort(track_labels, kind="stable")
+    sorted_labels = track_labels[label_order]
+    if numpy.any(sorted_labels[1:] == sorted_labels[:-1]):
+        raise ValueError("Found a label that is used for multiple tracks")
+
+    def find_tracks(labels_to_find: numpy.ndarray, description: str) -> numpy.ndarray:
+        indices = numpy.minimum(numpy.searchsorted(sorted_labels, labels_to_find), max(len(sorted_labels) - 1, 0))
+        if len(labels_to_find) > 0 and (len(sorted_labels) == 0
+                                        or numpy.any(sorted_labels[indices] != labels_to_find)):
+            raise ValueError(f"Found a {description} that is not in the track file")
+        return label_order[indices]
+
+    track_count = len(ctc_tracks)
+    parents = numpy.full(track_count, -1, dtype=numpy.int64)
+    has_parent = parent_labels != 0
+    parents[has_parent] = find_tracks(parent_labels[has_parent], "parent label")
+    skips_time_points = has_parent & (first_time_point_numbers != last_time_point_numbers[parents] + 1)
+    if numpy.any(skips_time_points):
+        warnings.warn(f"Left out {numpy.count_nonzero(skips_time_points)} links to parent tracks that skip time"
+                      f" points, for example for track {track_labels[skips_time_points][0]}")
+        parents[skips_time_points] = -1
+        has_parent &= ~skips_time_points
+
+    # Tracks that are the only child of their parent are merged into the parent. Every track gets the index of the first
+    # track it is merged into
+    child_counts = numpy.bincount(parents[has_parent], minlength=track_count)
+    is_merged = has_parent & (child_counts[numpy.maximum(parents, 0)] == 1)
+    heads = numpy.where(is_merged, parents, numpy.arange(track_count))
+    while True:
+        new_heads = heads[heads]
+        if numpy.array_equal(new_heads, heads):
+            break
+        heads = new_heads
+    head_track_ids = numpy.full(track_count, -1, dtype=numpy.int64)
+    head_track_ids[~is_merged] = numpy.arange(numpy.count_nonzero(~is_merged))
+
+    # Check that every track has a position at every time point
+    row_ctc_tracks = find_tracks(labels, "position label")
+    row_track_ids = head_track_ids[heads[row_ctc_tracks]]
+    row_counts = numpy.bincount(row_ctc_tracks, minlength=track_count)
+    if numpy.any(row_counts != last_time_point_numbers - first_time_point_numbers + 1) \
+            or numpy.any(time_point_numbers < first_time_point_numbers[row_ctc_tracks]) \
+            or numpy.any(time_point_numbers > last_time_point_numbers[row_ctc_tracks]):
+        raise ValueError("Every track must have exactly one position at every time point from its begin to its end")
+    order = numpy.lexsort((time_point_numbers, row_track_ids))
+    sorted_time_point_numbers = time_point_numbers[order]
+    track_lengths = numpy.bincount(row_track_ids, minlength=numpy.count_nonzero(~is_merged))
+    track_starts = numpy.cumsum(track_lengths) - track_lengths
+    if numpy.any(numpy.diff(sorted_time_point_numbers)[numpy.diff(row_track_ids[order]) == 0] != 1):
+        raise ValueError("Every track must have exactly one position at every time point from its begin to its end")
+
+    positions = _positions_from_arrays(coords_xyz[order], sorted_time_point_numbers)
+    tracks = [LinkingTrack(positions[start:start + length])
+              for start, length in zip(track_starts.tolist(), track_lengths.tolist())]
+    for ctc_track, parent in zip(numpy.flatnonzero(has_parent & ~is_merged).tolist(),
+                                 parents[has_parent & ~is_merged].tolist()):
+        track = tracks[head_track_ids[ctc_track]]
+        previous_track = tracks[head_track_ids[heads[parent]]]
+        previous_track._next_tracks.append(track)
+        track._previous_tracks.append(previous_track)
+
+    experiment = Experiment()
+    experiment.positions = PositionCollection(positions)
+    experiment.links._tracks = [track for track in tracks if len(track._positions_by_time_point) > 1
+                                or len(track._previous_tracks) > 0 or len(track._next_tracks) > 0]
+    experiment.links._position_to_track = {position.to_dict_key(): track for track in experiment.links._tracks
+                                           for position in track._positions_by_time_point}
+    return experiment
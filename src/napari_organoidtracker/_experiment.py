@@ -1,11 +1,19 @@
+import logging
+from functools import partial
 from random import random
-from typing import List, Tuple, Dict, Iterable
+from typing import Any, Callable, List, Tuple, Dict, Iterable, Optional, Union, AbstractSet
 
 import numpy
 
-from napari_organoidtracker._links import Links
+from napari_organoidtracker import _profiling
+from napari_organoidtracker._basics import TimePoint
+from napari_organoidtracker._links import Links, LinkingTrack
+from napari_organoidtracker._position import Position
 from napari_organoidtracker._position_collection import PositionCollection
 from napari_organoidtracker._position_data import PositionData
+from napari_organoidtracker._track_table import TrackTable
+
+_logger = logging.getLogger("napari_organoidtracker")
 
 
 class Experiment:
@@ -18,6 +26,99 @@ class Experiment:
         self.positions = PositionCollection()
         self.position_data = PositionData()
 
+    def subset_lineages(self, roots: Iterable[LinkingTrack]) -> "Experiment":
+        """Creates a new experiment with only the given tracks and the tracks descending from them, together with their
+        positions, position data and lineage data. See Links.extract_lineages."""
+        subset = Experiment()
+        subset.links = self.links.extract_lineages(roots)
+        positions = [position for track in subset.links._tracks for position in track._positions_by_time_point]
+        subset.positions = self.positions.copy_subset(positions)
+        subset.position_data = self.position_data.copy_subset(positions)
+        return subset
+
+    def view(self, time_range: range) -> "ExperimentView":
+        """Gets a read-only view of the time points in the given range, for example experiment.view(range(100, 120)).
+        Nothing is copied, so creating a view is cheap. The view reflects later changes to this experiment."""
+        if time_range.step != 1:
+            raise ValueError(f"Time range must have a step of 1, got {time_range}")
+        if len(time_range) == 0:
+            raise ValueError(f"Time range is empty: {time_range}")
+        return ExperimentView(self, time_range.start, time_range.stop - 1)
+
+
+class ExperimentView:
+    """Read-only view of an Experiment, restricted to a time window. Tracks that cross the edges of the window are
+    clipped, so the view behaves like a copy of the experiment with all positions outside the window deleted. Use
+    Experiment.view to create one."""
+
+    experiment: Experiment
+    _first_time_point_number: int
+    _last_time_point_number: int
+
+    def __init__(self, experiment: Experiment, first_time_point_number: int, last_time_point_number: int):
+        self.experiment = experiment
+        self._first_time_point_number = first_time_point_number
+        self._last_time_point_number = last_time_point_number
+
+    def first_time_point_number(self) -> int:
+        """Gets the first time point number of the window."""
+        return self._first_time_point_number
+
+    def last_time_point_number(self) -> int:
+        """Gets the last time point number (inclusive) of the window."""
+        return self._last_time_point_number
+
+    def is_time_point_number_in_range(self, time_point_number: Optional[int]) -> bool:
+        """Checks if the given time point number falls within the window."""
+        return time_point_number is not None \
+            and self._first_time_point_number <= time_point_number <= self._last_time_point_number
+
+    def positions_of_time_point(self, time_point: TimePoint) -> AbstractSet[Position]:
+        """Returns all positions of the given time point, or an empty set if it is outside the window."""
+        if not self.is_time_point_number_in_range(time_point.time_point_number()):
+            return set()
+        return self.experiment.positions.of_time_point(time_point)
+
+    def iterate_positions(self) -> Iterable[Position]:
+        """Iterates over all positions within the window."""
+        all_positions = self.experiment.positions._all_positions
+        for time_point_number in range(self._first_time_point_number, self._last_time_point_number + 1):
+            positions_at_time_point = all_positions.get(time_point_number)
+            if positions_at_time_point is not None:
+                yield from positions_at_time_point.positions()
+
+    def count_positions(self) -> int:
+        """Gets the number of positions within the window."""
+        all_positions = self.experiment.positions._all_positions
+        return sum(len(all_positions[time_point_number])
+                   for time_point_number in range(self._first_time_point_number, self._last_time_point_number + 1)
+                   if time_point_number in all_positions)
+
+    def get_position_data(self, position: Position, data_name: str) -> Optional[Any]:
+        """Gets the attribute of the position with the given name. Returns None if not found, or if the position is
+        outside the window."""
+        if not self.is_time_point_number_in_range(position.time_point_number()):
+            return None
+        return self.experiment.position_data.get_position_data(position, data_name)
+
+    def find_tracks(self) -> List[LinkingTrack]:
+        """Gets all tracks that have at least one position within the window. Note that these are the (unclipped)
+        tracks of the experiment, so they must not be modified.
+
+        This checks every track of the experiment, so it takes time proportional to the total number of tracks, not to
+        the number of tracks in the window. The result is not cached, as the experiment may change after the view was
+        created. So for many windows of a large experiment, call this once per window, and reuse the result."""
+        first_time_point_number = self._first_time_point_number
+        last_time_point_number = self._last_time_point_number
+        return [track for track in self.experiment.links._tracks
+                if track._min_time_point_number <= last_time_point_number
+                and track._min_time_point_number + len(track._positions_by_time_point) > first_time_point_number]
+
+    def to_track_table(self) -> TrackTable:
+        """Builds a track table of the clipped tracks. Track ids are the indices in find_tracks()."""
+        return TrackTable.from_tracks(self.find_tracks(), first_time_point_number=self._first_time_point_number,
+                                      last_time_point_number=self._last_time_point_number)
+
 
 def _get_str_float_bool_metadata_keys(position_data: PositionData) -> Iterable[str]:
     """Get the metadata keys of values that are floats or booleans."""
@@ -26,64 +127,182 @@ def _get_str_float_bool_metadata_keys(position_data: PositionData) -> Iterable[s
             yield metadata_key
 
 
-def _experiment_to_napari(experiment: Experiment) -> List[Tuple[numpy.ndarray, Dict, str]]:
+def _to_napari_feature(value: Any) -> Any:
+    """Converts a metadata value to a feature value for napari: strings are converted to numbers, and missing values
+    become 0, just like in _experiment_to_napari."""
+    if isinstance(value, str):
+        return abs(hash(value)) % 1000
+    if isinstance(value, (bool, float, int)):
+        return value
+    return 0
+
+
+def _experiment_to_napari(experiment: Union[Experiment, ExperimentView], *, event_layers: bool = False,
+                          overview_step: Optional[int] = None, motion_features: bool = False
+                          ) -> List[Tuple[numpy.ndarray, Dict, str]]:
     """Convert an Experiment object to the Napari format.
 
-    The track layer format of Napari is documented at https://napari.org/stable/howtos/layers/tracks.html .
+    The track layer format of Napari is documented at https://napari.org/stable/howtos/layers/tracks.html . If
+    event_layers is True, points layers with all cell divisions, track starts and track ends are added as well.
+
+    If overview_step is set, only every overview_step-th position of every track is included in the tracks layer,
+    together with the last position of every track (so that divisions and track ends remain visible). This makes the
+    layer a lot faster to build and to draw. The full-resolution layer data can then be created on request by calling
+    the function stored in the "load_full_resolution" entry of the layer metadata.
+
+    If motion_features is True, features like the speed and the displacement of every position are added, see the
+    _motion module.
+
+    If an ExperimentView is given, only the time points within its window are included. Tracks crossing the edges of
+    the window are clipped.
     """
 
-    links = experiment.links
-    positions_table = []  # Each row is [track_id, t, z, y, x], ordered by track_id and then t
-    metadata = dict()
-    for metadata_key in _get_str_float_bool_metadata_keys(experiment.position_data):
-        metadata[metadata_key] = []
-
-    linking_graph = {}
-    for track_id, track in links.find_all_tracks_and_ids():
-        for position in track.positions():
-            # Build positions table
-            positions_table.append(
-                [
-                    track_id,
-                    position.time_point_number(),
-                    position.z,
-                    position.y,
-                    position.x,
-                ]
-            )
-
-            # Build metadata dictionary
-            for metadata_key, metadata_values in metadata.items():
-                metadata_value = experiment.position_data.get_position_data(position, metadata_key)
-                if isinstance(metadata_value, str):
-                    metadata_value = abs(hash(metadata_value)) % 1000
-                if metadata_value is None or not isinstance(metadata_value, (bool, float, int)):
-                    metadata_values.append(0)
-                else:
-                    metadata_values.append(metadata_value)
-
-        previous_track_ids = [
-            links.get_track_id(previous_track)
-            for previous_track in track.get_previous_tracks()
-        ]
-        linking_graph[track_id] = previous_track_ids
+    with _profiling.stage("build_track_table"):
+        if isinstance(experiment, ExperimentView):
+            tracks = experiment.find_tracks()
+            track_table = TrackTable.from_tracks(tracks, first_time_point_number=experiment.first_time_point_number(),
+                                                 last_time_point_number=experiment.last_time_point_number())
+            links = experiment.experiment.links
+            position_data = experiment.experiment.position_data
+        else:
+            tracks = experiment.links._tracks
+            track_table = TrackTable.from_links(experiment.links)
+            links = experiment.links
+            position_data = experiment.position_data
 
-    output_array = []
+    def collect_features(rows: numpy.ndarray) -> Dict[str, List]:
+        metadata = dict()
+        for metadata_key in _get_str_float_bool_metadata_keys(position_data):
+            metadata[metadata_key] = [
+                _to_napari_feature(position_data.get_position_data(track_table.positions[row], metadata_key))
+                for row in rows.tolist()]
+        return metadata
 
-    if experiment.links.has_links():
-        positions_table = numpy.array(positions_table, dtype=numpy.float32)
+    # Stored for every track that starts a lineage. In a view, that can also be a track of which the earlier tracks
+    # are outside the window
+    lineage_metadata = dict()
+    for track_id in numpy.flatnonzero(track_table.previous_counts() == 0).tolist():
+        lineage_data = dict(links.find_all_data_of_lineage(tracks[track_id]))
+        if len(lineage_data) > 0:
+            lineage_metadata[track_id] = lineage_data
 
-        # Move all time points so that we start at time point 0 (OrganoidTracker can start at any time point number, but
-        # Napari always starts at 0)
-        positions_table[:, 1] -= positions_table[:, 1].min()
+    return _track_table_to_napari(track_table, collect_features, event_layers=event_layers,
+                                  overview_step=overview_step,
+                                  load_full_resolution=partial(_experiment_to_napari, experiment,
+                                                               motion_features=motion_features),
+                                  lineage_metadata=lineage_metadata, motion_features=motion_features)
 
-        # Remove the Z column if all values are 0 (then we have 2D tracking data)
-        if numpy.all(positions_table[:, 2] == 0):
-            positions_table = numpy.delete(positions_table, 2, axis=1)
-            print("Removed Z column from tracking data because all values were 0.")
-        else:
-            print("Z column was not removed from tracking data because not all values were 0.")
 
-        output_array.append((positions_table, {"graph": linking_graph, "features": metadata}, "tracks"))
+def _track_table_to_napari(track_table: TrackTable, collect_features: Callable[[numpy.ndarray], Dict[str, Any]], *,
+                           event_layers: bool, overview_step: Optional[int],
+                           load_full_resolution: Callable[[], List[Tuple[numpy.ndarray, Dict, str]]],
+                           positions_table: Optional[numpy.ndarray] = None,
+                           lineage_metadata: Optional[Dict[int, Dict[str, Any]]] = None,
+                           motion_features: bool = False, linking_graph: Optional[Dict[int, List[int]]] = None
+                           ) -> List[Tuple[numpy.ndarray, Dict, str]]:
+    """Creates the napari layers from the track table. collect_features must return the features of the given rows.
+    If positions_table is given, it must be the full-resolution result of _create_positions_table, which is then used
+    instead of creating a new one. Likewise, linking_graph can be given to reuse the napari graph of the tracks.
+
+    The layer metadata stores the original number of the first time point (napari always starts at 0), and the lineage
+    metadata by track id. That way, the layer can be saved again without losing information, see the _writer module.
+    The names of the features that are computed here instead of read from the file are stored as "derived_features",
+    so that the writer can leave them out."""
+    if overview_step is not None and overview_step > 1:
+        rows = _find_overview_rows(track_table, overview_step)
+    else:
+        overview_step = None
+        rows = numpy.arange(len(track_table))
+
+    with _profiling.stage("collect_napari_features"):
+        metadata = collect_features(rows)
+    derived_feature_names = list()
+    if motion_features:
+        from napari_organoidtracker._motion import compute_motion_features
+        with _profiling.stage("compute_motion_features"):
+            for feature_name, values in compute_motion_features(track_table).items():
+                if feature_name not in metadata:  # Position metadata with the same name takes precedence
+                    metadata[feature_name] = values[rows]
+                    derived_feature_names.append(feature_name)
+
+    if linking_graph is None:
+        linking_graph = {}
+        for track_id in range(track_table.track_count()):
+            linking_graph[track_id] = track_table.get_previous_track_ids(track_id).tolist()
+
+    output_array = []
+
+    if track_table.track_count() > 0:
+        if positions_table is None:
+            positions_table = _create_positions_table(track_table, rows)
+        elif overview_step is not None:
+            positions_table = positions_table[rows]
+        is_2d = positions_table.shape[1] == 4
+
+        layer_metadata = {"first_time_point_number": int(track_table.time_point_numbers.min())}
+        if lineage_metadata is not None and len(lineage_metadata) > 0:
+            layer_metadata["lineage_meta"] = lineage_metadata
+        if len(derived_feature_names) > 0:
+            layer_metadata["derived_features"] = derived_feature_names  # Not saved by the writer
+        layer_kwargs = {"graph": linking_graph, "features": metadata, "metadata": layer_metadata}
+        if overview_step is not None:
+            layer_kwargs["name"] = "Tracks (overview)"
+            layer_metadata["load_full_resolution"] = load_full_resolution
+        output_array.append((positions_table, layer_kwargs, "tracks"))
+
+        if event_layers:
+            output_array += _events_to_napari(track_table, is_2d)
 
     return output_array
+
+
+def _create_positions_table(track_table: TrackTable, rows: numpy.ndarray) -> numpy.ndarray:
+    """Creates the data of the tracks layer for the given rows of the track table."""
+    # Each row is [track_id, t, z, y, x], ordered by track_id and then t
+    positions_table = numpy.empty((len(rows), 5), dtype=numpy.float32)
+    positions_table[:, 0] = track_table.track_ids()[rows]
+    positions_table[:, 1] = track_table.time_point_numbers[rows]
+    positions_table[:, 2:5] = track_table.coords_xyz[rows, ::-1]
+
+    # Move all time points so that we start at time point 0 (OrganoidTracker can start at any time point number, but
+    # Napari always starts at 0)
+    positions_table[:, 1] -= positions_table[:, 1].min()
+
+    # Remove the Z column if all values are 0 (then we have 2D tracking data)
+    if numpy.all(positions_table[:, 2] == 0):
+        positions_table = numpy.delete(positions_table, 2, axis=1)
+        _logger.info("Removed Z column from tracking data because all values were 0.")
+    else:
+        _logger.info("Z column was not removed from tracking data because not all values were 0.")
+    return positions_table
+
+
+def _find_overview_rows(track_table: TrackTable, overview_step: int) -> numpy.ndarray:
+    """Gets the rows of every overview_step-th position of each track, plus the last position of each track."""
+    ages = numpy.arange(len(track_table)) - numpy.repeat(track_table.first_rows(), numpy.diff(track_table.track_offsets))
+    keep = ages % overview_step == 0
+    keep[track_table.last_rows()] = True
+    return numpy.flatnonzero(keep)
+
+
+def _events_to_napari(track_table: TrackTable, is_2d: bool) -> List[Tuple[numpy.ndarray, Dict, str]]:
+    """Creates points layers for all cell divisions, track starts and track ends. Tracks that start in the first time
+    point or end in the last time point are not included, as those are not that interesting."""
+    first_time_point_number = int(track_table.time_point_numbers.min())
+    last_time_point_number = int(track_table.time_point_numbers.max())
+
+    # Each row is [t, z, y, x], with t starting at 0, just like in the tracks layer
+    points_table = numpy.empty((len(track_table), 4), dtype=numpy.float32)
+    points_table[:, 0] = track_table.time_point_numbers - first_time_point_number
+    points_table[:, 1:4] = track_table.coords_xyz[:, ::-1]
+    if is_2d:
+        points_table = numpy.delete(points_table, 1, axis=1)
+
+    return [
+        (points_table[track_table.division_rows()],
+         {"name": "Cell divisions", "face_color": "yellow", "size": 8}, "points"),
+        (points_table[track_table.track_start_rows(first_time_point_number)],
+         {"name": "Track starts", "face_color": "lime", "size": 8}, "points"),
+        (points_table[track_table.track_end_rows(last_time_point_number)],
+         {"name": "Track ends", "face_color": "red", "size": 8}, "points"),
+    ]
@@ -1,10 +1,16 @@
 """Copied from OrganoidTracker."""
 
 import warnings
-from typing import Optional, Dict, Iterable, List, Set, Tuple, Any
+from itertools import chain
+from typing import Optional, Dict, Iterable, List, Set, Tuple, Any, TYPE_CHECKING
+
+import numpy
 
 from napari_organoidtracker._basics import DataType, TimePoint
-from napari_organoidtracker._position import Position
+from napari_organoidtracker._position import Position, _positions_from_arrays, _positions_to_arrays
+
+if TYPE_CHECKING:
+    from napari_organoidtracker._lineage_layout import LineageLayout
 
 
 class LinkingTrack:
@@ -142,6 +148,16 @@ class LinkingTrack:
         size of 1. Larger sizes indicate a cell merge, which makes no biological sense."""
         return set(self._previous_tracks)
 
+    def __getstate__(self):
+        # The positions are packed into an array, see Links.__getstate__ for pickling all tracks at once
+        coords_xyz, _ = _positions_to_arrays(self._positions_by_time_point)
+        return self._min_time_point_number, coords_xyz, self._next_tracks, self._previous_tracks, self._lineage_data
+
+    def __setstate__(self, state):
+        self._min_time_point_number, coords_xyz, self._next_tracks, self._previous_tracks, self._lineage_data = state
+        self._positions_by_time_point = _positions_from_arrays(coords_xyz, numpy.arange(
+            self._min_time_point_number, self._min_time_point_number + len(coords_xyz), dtype=numpy.int64))
+
     def __len__(self):
         """Gets the time length of the track, in number of time points."""
         return len(self._positions_by_time_point)
@@ -201,12 +217,68 @@ class Links:
     no position in the next step, then either the cell died or the cell moved out of the image."""
 
     _tracks: List[LinkingTrack]
-    _position_to_track: Dict[str, LinkingTrack]
+    _position_to_track: Optional[Dict[str, LinkingTrack]]  # Use _get_position_to_track() to read it
 
     def __init__(self):
         self._tracks = []
         self._position_to_track = dict()
 
+    def __getstate__(self):
+        """Packs all tracks into arrays, which is a lot smaller and faster to pickle than the tracks and positions
+        themselves. The index of positions is rebuilt on first use after unpickling, see _get_position_to_track."""
+        track_ids = {id(track): track_id for track_id, track in enumerate(self._tracks)}
+        coords_xyz, _ = _positions_to_arrays(list(chain.from_iterable(
+            track._positions_by_time_point for track in self._tracks)))
+        return {
+            "track_lengths": numpy.array([len(track._positions_by_time_point) for track in self._tracks],
+                                         dtype=numpy.int64),
+            "track_min_time_point_numbers": numpy.array([track._min_time_point_number for track in self._tracks],
+                                                        dtype=numpy.int64),
+            "coords_xyz": coords_xyz,
+            "next_counts": numpy.array([len(track._next_tracks) for track in self._tracks], dtype=numpy.int64),
+            "next_track_ids": numpy.array([track_ids[id(next_track)] for track in self._tracks
+                                           for next_track in track._next_tracks], dtype=numpy.int64),
+            "previous_counts": numpy.array([len(track._previous_tracks) for track in self._tracks],
+                                           dtype=numpy.int64),
+            "previous_track_ids": numpy.array([track_ids[id(previous_track)] for track in self._tracks
+                                               for previous_track in track._previous_tracks], dtype=numpy.int64),
+            "lineage_data": {track_id: track._lineage_data for track_id, track in enumerate(self._tracks)
+                             if len(track._lineage_data) > 0}
+        }
+
+    def __setstate__(self, state: Dict[str, Any]):
+        track_lengths = state["track_lengths"]
+        track_min_time_point_numbers = state["track_min_time_point_numbers"]
+        track_starts = numpy.cumsum(track_lengths) - track_lengths
+        time_point_numbers = numpy.repeat(track_min_time_point_numbers - track_starts, track_lengths) \
+            + numpy.arange(track_lengths.sum(), dtype=numpy.int64)
+        positions = _positions_from_arrays(state["coords_xyz"], time_point_numbers)
+
+        self._tracks = [LinkingTrack(positions[start:start + length])
+                        for start, length in zip(track_starts.tolist(), track_lengths.tolist())]
+        self._position_to_track = None  # Built by _get_position_to_track once it's needed
+
+        for tracks_attribute, counts, linked_track_ids in [("_next_tracks", state["next_counts"],
+                                                            state["next_track_ids"]),
+                                                           ("_previous_tracks", state["previous_counts"],
+                                                            state["previous_track_ids"])]:
+            linked_track_ids = linked_track_ids.tolist()
+            offset = 0
+            for track, count in zip(self._tracks, counts.tolist()):
+                setattr(track, tracks_attribute, [self._tracks[linked_track_id] for linked_track_id
+                                                  in linked_track_ids[offset:offset + count]])
+                offset += count
+        for track_id, lineage_data in state["lineage_data"].items():
+            self._tracks[track_id]._lineage_data = lineage_data
+
+    def _get_position_to_track(self) -> Dict[str, LinkingTrack]:
+        """Gets the index of positions. After unpickling, this index is only built once it's needed, as that takes a
+        while because of the string keys."""
+        if self._position_to_track is None:
+            self._position_to_track = {position.to_dict_key(): track for track in self._tracks
+                                       for position in track._positions_by_time_point if position is not None}
+        return self._position_to_track
+
     def add_links(self, links: "Links"):
         """Adds all links from the graph. Existing link are not removed. Changes may write through in the original
         links."""
@@ -215,7 +287,16 @@ class Links:
                 self.add_link(position1, position2)
         else:
             self._tracks = links._tracks
-            self._position_to_track = links._position_to_track
+            self._position_to_track = links._get_position_to_track()
+
+    def add_disjoint_links(self, links: "Links"):
+        """Like add_links, but if no position has links in both, then the tracks are added as-is instead of link by
+        link, which is a lot faster. Changes may write through in the original links."""
+        if self._get_position_to_track().keys().isdisjoint(links._get_position_to_track().keys()):
+            self._tracks += links._tracks
+            self._get_position_to_track().update(links._get_position_to_track())
+        else:
+            self.add_links(links)
 
     def add_track(self, track: LinkingTrack):
         """Adds a track to the linking network. This is useful if you have a track that is not linked to the rest of the
@@ -224,7 +305,7 @@ class Links:
             raise ValueError("Track is already linked to other tracks")
         self._tracks.append(track)
         for position in track.positions():
-            self._position_to_track[position.to_dict_key()] = track
+            self._get_position_to_track()[position.to_dict_key()] = track
 
     def remove_all_links(self):
         """Removes all links in the experiment."""
@@ -232,11 +313,11 @@ class Links:
             track._next_tracks.clear()
             track._previous_tracks.clear()
         self._tracks.clear()
-        self._position_to_track.clear()
+        self._position_to_track = dict()
 
     def remove_links_of_position(self, position: Position):
         """Removes all links from and to the position."""
-        track = self._position_to_track.get(position.to_dict_key())
+        track = self._get_position_to_track().get(position.to_dict_key())
         if track is None:
             return
 
@@ -278,7 +359,7 @@ class Links:
             self._try_remove_if_one_length_track(track)
 
         # Remove from index
-        del self._position_to_track[position.to_dict_key()]
+        del self._get_position_to_track()[position.to_dict_key()]
 
     def replace_position(self, old_position: Position, position_new: Position):
         """Replaces one position with another. The old position is removed from the graph, the new one is added. All
@@ -287,24 +368,24 @@ class Links:
             raise ValueError("Cannot replace with position at another time point")
 
         # Update in track
-        track = self._position_to_track.get(old_position.to_dict_key())
+        track = self._get_position_to_track().get(old_position.to_dict_key())
         if track is not None:
             track._positions_by_time_point[
                 position_new.time_point_number() - track._min_time_point_number] = position_new
 
             # Update reference to track
-            del self._position_to_track[old_position.to_dict_key()]
-            self._position_to_track[position_new.to_dict_key()] = track
+            del self._get_position_to_track()[old_position.to_dict_key()]
+            self._get_position_to_track()[position_new.to_dict_key()] = track
 
     def has_links(self) -> bool:
         """Returns True if at least one link is present."""
-        return len(self._position_to_track) > 0
+        return len(self._get_position_to_track()) > 0
 
     def find_futures(self, position: Position) -> Set[Position]:
         """Returns the positions linked to this position in the next time point. Normally, this will be one position.
         However, if the cell divides between now and the next time point, two positions are returned. And if the cell
         track ends, zero positions are returned."""
-        track = self._position_to_track.get(position.to_dict_key())
+        track = self._get_position_to_track().get(position.to_dict_key())
         if track is None:
             return set()
         return track._find_futures(position.time_point_number())
@@ -320,7 +401,7 @@ class Links:
         """Returns the positions linked to this position in the previous time point. Normally, this will be one
         position. However, the cell track just started, zero positions are returned. In the case of a cell merge,
         multiple positions are returned."""
-        track = self._position_to_track.get(position.to_dict_key())
+        track = self._get_position_to_track().get(position.to_dict_key())
         if track is None:
             return set()
         return track._find_pasts(position.time_point_number())
@@ -364,8 +445,9 @@ class Links:
         if dt < -1:
             raise ValueError(f"Link skipped a time point: {position1} cannot be linked to {position2}")
 
-        track1 = self._position_to_track.get(position1.to_dict_key())
-        track2 = self._position_to_track.get(position2.to_dict_key())
+        position_to_track = self._get_position_to_track()
+        track1 = position_to_track.get(position1.to_dict_key())
+        track2 = position_to_track.get(position2.to_dict_key())
 
         if track1 is not None and track2 is not None and self.contains_link(position1, position2):
             return  # Already has that link, don't add a second link (this will corrupt the data structure)
@@ -378,18 +460,18 @@ class Links:
                 # It could be handled just fine by the code below, which will create a new track and then merge the
                 # tracks, but this is faster
                 track1._positions_by_time_point.append(position2)
-                self._position_to_track[position2.to_dict_key()] = track1
+                position_to_track[position2.to_dict_key()] = track1
                 return
 
         if track1 is None:  # Create new mini-track
             track1 = LinkingTrack([position1])
             self._tracks.append(track1)
-            self._position_to_track[position1.to_dict_key()] = track1
+            position_to_track[position1.to_dict_key()] = track1
 
         if track2 is None:  # Create new mini-track
             track2 = LinkingTrack([position2])
             self._tracks.append(track2)
-            self._position_to_track[position2.to_dict_key()] = track2
+            position_to_track[position2.to_dict_key()] = track2
 
         if position1.time_point_number() < track1.last_time_point_number():
             # Need to split track 1 so that position1 is at the end
@@ -451,7 +533,7 @@ class Links:
 
     def find_links_of(self, position: Position) -> Set[Position]:
         """Gets all links of a position, both to the past and the future."""
-        track = self._position_to_track.get(position.to_dict_key())
+        track = self._get_position_to_track().get(position.to_dict_key())
         if track is None:
             return set()
         return track._find_futures(position.time_point_number()) | track._find_pasts(position.time_point_number())
@@ -469,8 +551,8 @@ class Links:
         if position1.time_point_number() == position2.time_point_number():
             return  # No link can possibly exist
 
-        track1 = self._position_to_track.get(position1.to_dict_key())
-        track2 = self._position_to_track.get(position2.to_dict_key())
+        track1 = self._get_position_to_track().get(position1.to_dict_key())
+        track2 = self._get_position_to_track().get(position2.to_dict_key())
         if track1 is None or track2 is None:
             return  # No link exists
         if track1 == track2:
@@ -534,7 +616,7 @@ class Links:
             return  # Has metadata, don't delete
 
         # Safe to delete
-        del self._position_to_track[track.find_first_position().to_dict_key()]
+        del self._get_position_to_track()[track.find_first_position().to_dict_key()]
         self._tracks.remove(track)
 
     def contains_link(self, position1: Position, position2: Position) -> bool:
@@ -549,7 +631,7 @@ class Links:
 
     def contains_position(self, position: Position) -> bool:
         """Returns True if the given position is part of this linking network."""
-        return position.to_dict_key() in self._position_to_track
+        return position.to_dict_key() in self._get_position_to_track()
 
     def find_all_links(self) -> Iterable[Tuple[Position, Position]]:
         """Gets all available links. The first position is always the earliest in time."""
@@ -588,18 +670,71 @@ class Links:
             copied_track._lineage_data = track._lineage_data.copy()
             copy._tracks.append(copied_track)
             for position in track.positions():
-                copy._position_to_track[position.to_dict_key()] = copied_track
+                copy._get_position_to_track()[position.to_dict_key()] = copied_track
 
         # We can now re-establish the links between all tracks
         for track in self._tracks:
-            track_copy = copy._position_to_track[track.find_first_position().to_dict_key()]
+            track_copy = copy._get_position_to_track()[track.find_first_position().to_dict_key()]
             for next_track in track._next_tracks:
-                next_track_copy = copy._position_to_track[next_track.find_first_position().to_dict_key()]
+                next_track_copy = copy._get_position_to_track()[next_track.find_first_position().to_dict_key()]
                 track_copy._next_tracks.append(next_track_copy)
                 next_track_copy._previous_tracks.append(track_copy)
 
         return copy
 
+    def extract_lineages(self, roots: Iterable[LinkingTrack]) -> "Links":
+        """Returns a copy of the given tracks and all tracks that descend from them. Only these tracks are visited, so
+        this is a lot faster than copying all links and then deleting the rest.
+
+        Links to tracks that are not copied (so to the tracks before a root that is not the start of its lineage) are
+        left out. Such a root gets a copy of the lineage data of its lineage."""
+        # Collect the tracks, starting with the roots
+        tracks = list()
+        copied_tracks = dict()  # id(track) -> copy
+        to_visit = list(roots)
+        to_visit.reverse()
+        while len(to_visit) > 0:
+            track = to_visit.pop()
+            if id(track) in copied_tracks:
+                continue  # Already visited, for example because a root was a descendant of another root
+            copied_track = LinkingTrack(track._positions_by_time_point.copy())
+            if len(track._previous_tracks) == 0:
+                copied_track._lineage_data = track._lineage_data.copy()
+            tracks.append(track)
+            copied_tracks[id(track)] = copied_track
+            to_visit += reversed(track._next_tracks)
+
+        # Link the copied tracks
+        for track in tracks:
+            copied_track = copied_tracks[id(track)]
+            copied_track._next_tracks = [copied_tracks[id(next_track)] for next_track in track._next_tracks]
+            copied_track._previous_tracks = [copied_tracks[id(previous_track)] for previous_track
+                                             in track._previous_tracks if id(previous_track) in copied_tracks]
+            if len(copied_track._previous_tracks) == 0 and len(track._previous_tracks) > 0:
+                copied_track._lineage_data = dict(self.find_all_data_of_lineage(track))
+
+        copy = Links()
+        copy._tracks = [copied_tracks[id(track)] for track in tracks]
+        copy._position_to_track = {position.to_dict_key(): copied_track for copied_track in copy._tracks
+                                   for position in copied_track._positions_by_time_point}
+        return copy
+
+    def create_lineage_layout(self) -> "LineageLayout":
+        """Computes where every track should be drawn in a lineage tree plot, for all lineages at once. Track ids are
+        the same as in find_all_tracks_and_ids(). See the _lineage_layout module."""
+        from napari_organoidtracker._lineage_layout import compute_lineage_layout
+
+        track_ids = {id(track): track_id for track_id, track in enumerate(self._tracks)}
+        first_time_point_numbers = numpy.fromiter((track._min_time_point_number for track in self._tracks),
+                                                  dtype=numpy.int64, count=len(self._tracks))
+        track_lengths = numpy.fromiter((len(track._positions_by_time_point) for track in self._tracks),
+                                       dtype=numpy.int64, count=len(self._tracks))
+        parent_track_ids = numpy.fromiter((track_ids[id(track._previous_tracks[0])] if len(track._previous_tracks) > 0
+                                           else -1 for track in self._tracks),
+                                          dtype=numpy.int64, count=len(self._tracks))
+        return compute_lineage_layout(first_time_point_numbers, first_time_point_numbers + track_lengths - 1,
+                                      parent_track_ids)
+
     def _split_track(self, old_track: LinkingTrack, split_index: int) -> LinkingTrack:
         """Modifies the given track so that all positions after a certain time points are removed, and placed in a new
         track. So positions[0:split_index] will remain in this track, positions[split_index:] will be moved."""
@@ -623,7 +758,7 @@ class Links:
         # Update indices for changed tracks
         self._tracks.insert(self._tracks.index(old_track) + 1, track_after_split)
         for position_after_split in positions_after_split:
-            self._position_to_track[position_after_split.to_dict_key()] = track_after_split
+            self._get_position_to_track()[position_after_split.to_dict_key()] = track_after_split
 
         return track_after_split
 
@@ -648,7 +783,7 @@ class Links:
         first_track._lineage_data.update(second_track._lineage_data)
         self._tracks.remove(second_track)
         for moved_position in second_track.positions():
-            self._position_to_track[moved_position.to_dict_key()] = first_track
+            self._get_position_to_track()[moved_position.to_dict_key()] = first_track
         first_track._next_tracks = second_track._next_tracks
         for new_next_track in first_track._next_tracks:  # Notify all next tracks that they have a new predecessor
             new_next_track._update_link_to_previous(second_track, first_track)
@@ -659,7 +794,8 @@ class Links:
         internal code.
 
         This method is very useful to debug the data structure if you get some weird results."""
-        for position, track in self._position_to_track.items():
+        position_to_track = self._get_position_to_track()
+        for position, track in position_to_track.items():
             if track not in self._tracks:
                 raise ValueError(f"{track} is not in the track list, but is in the index for position {position}")
 
@@ -676,11 +812,11 @@ class Links:
             if len(track._previous_tracks) > 0 and len(track._lineage_data) > 0:
                 raise ValueError(f"{track} has lineage meta data, even though it is not the start of a lineage")
             for position in track.positions():
-                if position.to_dict_key() not in self._position_to_track:
+                if position.to_dict_key() not in position_to_track:
                     raise ValueError(f"{position} of {track} is not indexed")
-                elif self._position_to_track[position.to_dict_key()] != track:
+                elif position_to_track[position.to_dict_key()] != track:
                     raise ValueError(f"{position} in track {track} is indexed as being in track"
-                                     f" {self._position_to_track[position.to_dict_key()]}")
+                                     f" {position_to_track[position.to_dict_key()]}")
             for previous_track in track._previous_tracks:
                 if previous_track.last_time_point_number() >= track._min_time_point_number:
                     raise ValueError(f"Previous track {previous_track} is not in the past compared to {track}")
@@ -711,7 +847,7 @@ class Links:
 
     def get_track(self, position: Position) -> Optional[LinkingTrack]:
         """Gets the track the given position belong in."""
-        return self._position_to_track.get(position.to_dict_key())
+        return self._get_position_to_track().get(position.to_dict_key())
 
     def sort_tracks_by_x(self):
         """Sorts the tracks, which affects the order in which most find_ functions return data (like
@@ -847,13 +983,14 @@ class Links:
     def move_in_time(self, time_point_delta: int):
         """Moves all data with the given time point delta."""
         # We need to update self._tracks and rebuild self._position_to_track
-        self._position_to_track.clear()
+        position_to_track = dict()
+        self._position_to_track = position_to_track
         for track in self._tracks:
             track._min_time_point_number += time_point_delta
             for i, position in enumerate(track._positions_by_time_point):
                 moved_position = position.with_time_point_number(position.time_point_number() + time_point_delta)
                 track._positions_by_time_point[i] = moved_position
-                self._position_to_track[moved_position.to_dict_key()] = track
+                position_to_track[moved_position.to_dict_key()] = track
 
     def connect_tracks(self, *, previous: LinkingTrack, next: LinkingTrack):
         """Connects two tracks. The previous track should end one time point before the next track starts. Raises
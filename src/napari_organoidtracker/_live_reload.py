@@ -0,0 +1,433 @@
+"""Reloading of tracking files that are still growing, for example during a live tracking run in which the .aut file is
+rewritten every now and then with more time points.
+
+A LiveReloader keeps the result of the previous parse. After the file has changed, it is decoded again, and every time
+point and every track in it is compared to the previous version, using the decoded values as they are. Only the time
+points and tracks that changed are parsed again; for the others, the coordinate arrays and napari features of the
+previous parse are reused. The tracks layer is then assembled from those parts using array operations, without creating
+an Experiment. If the only change is that tracks were added to the end of the file, the track table, features and graph
+of the previous layer are extended instead.
+
+This only works for the v2 format, which stores the positions per time point and the tracks as separate entries. Files
+in the v1 format are parsed completely on every change.
+
+To keep a napari layer up to date, use watch_file. That checks the file for changes in a background thread, so that the
+viewer stays interactive, and replaces the layer data in place."""
+
+import logging
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy
+
+from napari_organoidtracker import _json_backend, _profiling
+from napari_organoidtracker._aut_parser import _parse_organoidtracker_data
+from napari_organoidtracker._compression import open_aut_file
+from napari_organoidtracker._experiment import _experiment_to_napari, _to_napari_feature, _track_table_to_napari
+from napari_organoidtracker._track_table import TrackTable, _to_offsets
+
+_logger = logging.getLogger("napari_organoidtracker")
+
+LayerData = Tuple[numpy.ndarray, Dict[str, Any], str]
+
+
+def _to_coords_array(coords: Any) -> numpy.ndarray:
+    """Converts a list of [x, y, z] (or an array of that, from the simdjson backend) to an array of shape (n, 3)."""
+    return numpy.asarray(coords, dtype=numpy.float64).reshape(-1, 3)
+
+
+def _is_same_json(value: Any, other: Any) -> bool:
+    """Checks whether two decoded JSON values are equal. The simdjson backend decodes coordinate lists into arrays,
+    which are compared as arrays, so that nothing needs to be converted."""
+    if isinstance(value, numpy.ndarray) or isinstance(other, numpy.ndarray):
+        return isinstance(value, numpy.ndarray) and isinstance(other, numpy.ndarray) \
+            and numpy.array_equal(value, other)
+    return value == other
+
+
+class _TimePointEntry:
+    """One entry of the "positions" list of a v2 file."""
+
+    coords_xyz_px: Any  # As decoded, so a list of [x, y, z] or an array
+    position_meta: Dict[str, List[Any]]
+    _row_by_coords: Optional[Dict[Tuple[float, float, float], int]]
+
+    def __init__(self, time_point_json: Dict[str, Any]):
+        self.coords_xyz_px = time_point_json["coords_xyz_px"]
+        self.position_meta = time_point_json.get("position_meta", dict())
+        self._row_by_coords = None
+
+    def is_same(self, time_point_json: Dict[str, Any]) -> bool:
+        """Checks whether this entry has the same contents as the given JSON."""
+        return _is_same_json(time_point_json["coords_xyz_px"], self.coords_xyz_px) \
+            and time_point_json.get("position_meta", dict()) == self.position_meta
+
+    def get_row(self, coords_xyz: Tuple[float, float, float]) -> Optional[int]:
+        """Gets the index of the position with the given coordinates in this time point."""
+        if self._row_by_coords is None:
+            coords_list = self.coords_xyz_px.tolist() if isinstance(self.coords_xyz_px, numpy.ndarray) \
+                else self.coords_xyz_px
+            self._row_by_coords = {tuple(coords): row for row, coords in enumerate(coords_list)}
+        return self._row_by_coords.get(coords_xyz)
+
+
+class _TrackEntry:
+    """One entry of the "tracks" list of a v2 file, together with the napari features of its positions."""
+
+    time_point_start: int
+    coords_xyz: numpy.ndarray
+    coords_xyz_before: numpy.ndarray
+    lineage_meta: Dict[str, Any]
+
+    # The features of all positions, and the time point entries they were collected from
+    features: Optional[Dict[str, numpy.ndarray]]
+    _feature_sources: List[Optional[_TimePointEntry]]
+
+    # As decoded, for comparing with the next version of the file
+    _coords_xyz_px: Any
+    _coords_xyz_px_before: Any
+
+    def __init__(self, track_json: Dict[str, Any]):
+        self.time_point_start = track_json["time_point_start"]
+        self._coords_xyz_px = track_json["coords_xyz_px"]
+        self._coords_xyz_px_before = track_json.get("coords_xyz_px_before", [])
+        self.coords_xyz = _to_coords_array(self._coords_xyz_px)
+        self.coords_xyz_before = _to_coords_array(self._coords_xyz_px_before)
+        self.lineage_meta = track_json.get("lineage_meta", dict())
+        self.features = None
+        self._feature_sources = []
+
+    def is_same(self, track_json: Dict[str, Any]) -> bool:
+        """Checks whether this entry has the same contents as the given JSON."""
+        return track_json["time_point_start"] == self.time_point_start \
+            and _is_same_json(track_json["coords_xyz_px"], self._coords_xyz_px) \
+            and _is_same_json(track_json.get("coords_xyz_px_before", []), self._coords_xyz_px_before) \
+            and track_json.get("lineage_meta", dict()) == self.lineage_meta
+
+    def time_point_numbers(self) -> range:
+        return range(self.time_point_start, self.time_point_start + len(self.coords_xyz))
+
+    def get_features(self, time_points: Dict[int, _TimePointEntry], metadata_keys: List[str]
+                     ) -> Dict[str, numpy.ndarray]:
+        """Gets the napari features of all positions of this track. They are only collected again if the time points
+        the track runs through have changed."""
+        feature_sources = [time_points.get(time_point_number) for time_point_number in self.time_point_numbers()]
+        if self.features is not None and list(self.features.keys()) == metadata_keys \
+                and all(new is old for new, old in zip(feature_sources, self._feature_sources)):
+            return self.features
+
+        rows = [None if time_point is None else time_point.get_row(tuple(coords))
+                for time_point, coords in zip(feature_sources, self.coords_xyz.tolist())]
+        features = dict()
+        for metadata_key in metadata_keys:
+            values = list()
+            for time_point, row in zip(feature_sources, rows):
+                if row is None:
+                    values.append(0)
+                    continue
+                metadata_values = time_point.position_meta.get(metadata_key)
+                values.append(0 if metadata_values is None else _to_napari_feature(metadata_values[row]))
+            features[metadata_key] = numpy.array(values)
+        self.features = features
+        self._feature_sources = feature_sources
+        return features
+
+
+class LiveReloader:
+    """Keeps a tracks layer up to date with a file that is being rewritten. Call reload() to check for changes."""
+
+    file_path: str
+    changed_time_point_count: int  # Number of time points that were parsed again in the last reload
+    changed_track_count: int  # Number of tracks that were parsed again in the last reload
+    was_extended: bool  # Whether the last reload only added tracks, so that the previous layer data was extended
+
+    _json_backend: Optional[str]
+    _file_signature: Optional[Tuple[int, int]]
+    _time_points: Dict[int, _TimePointEntry]
+    _tracks: Dict[Tuple[int, Tuple[float, ...]], _TrackEntry]
+    _layer_data: Optional[LayerData]
+
+    # The parts of the layer data of the last reload, which are extended if only tracks were added
+    _layer_parts: Optional["_LayerParts"]
+
+    def __init__(self, file_path: str, *, json_backend: Optional[str] = None):
+        self.file_path = file_path
+        self.changed_time_point_count = 0
+        self.changed_track_count = 0
+        self.was_extended = False
+        self._json_backend = json_backend
+        self._file_signature = None
+        self._time_points = dict()
+        self._tracks = dict()
+        self._layer_data = None
+        self._layer_parts = None
+
+    def _get_file_signature(self) -> Tuple[int, int]:
+        stat = os.stat(self.file_path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def has_changed(self) -> bool:
+        """Checks whether the file was modified since the last reload, based on its modification time and size."""
+        try:
+            return self._get_file_signature() != self._file_signature
+        except OSError:
+            return False  # File is (temporarily) gone, for example because it's being replaced
+
+    def reload(self, *, force: bool = False) -> bool:
+        """Reloads the file if it has changed. Returns True if the layer data was updated. If the file cannot be read
+        (for example because it is still being written), the previous layer data is kept, and False is returned."""
+        if not force and not self.has_changed():
+            return False
+        try:
+            file_signature = self._get_file_signature()
+            with _profiling.stage("json_decode"), open_aut_file(self.file_path) as handle:
+                data = _json_backend.get_backend(self._json_backend).decode(handle.read())
+        except (OSError, ValueError) as e:
+            _logger.debug(f"Could not reload {self.file_path}, will try again later: {e}")
+            return False
+
+        if data.get("version") == "v2" and "tracks" in data:
+            self._layer_data = self._update_from_v2(data)
+        else:
+            # No incremental parsing possible, so parse everything
+            self._time_points.clear()
+            self._tracks.clear()
+            self._layer_parts = None
+            self.was_extended = False
+            layers = _experiment_to_napari(_parse_organoidtracker_data(data))
+            self._layer_data = layers[0] if len(layers) > 0 else None
+            self.changed_time_point_count = self.changed_track_count = -1
+        self._file_signature = file_signature
+        return True
+
+    def get_layer_data(self) -> Optional[LayerData]:
+        """Gets the data of the tracks layer, as of the last reload. Returns None if the file has not been loaded yet,
+        or if it contains no tracks."""
+        return self._layer_data
+
+    def _update_from_v2(self, data: Dict[str, Any]) -> Optional[LayerData]:
+        with _profiling.stage("parse_changed_time_points"):
+            time_points = dict()
+            self.changed_time_point_count = 0
+            for time_point_json in data.get("positions", []):
+                time_point_number = time_point_json["time_point"]
+                time_point = self._time_points.get(time_point_number)
+                if time_point is None or not time_point.is_same(time_point_json):
+                    time_point = _TimePointEntry(time_point_json)
+                    self.changed_time_point_count += 1
+                time_points[time_point_number] = time_point
+            self._time_points = time_points
+
+        with _profiling.stage("parse_changed_tracks"):
+            tracks = dict()
+            self.changed_track_count = 0
+            for track_json in data["tracks"]:
+                coords_xyz_px = track_json["coords_xyz_px"]
+                if len(coords_xyz_px) == 0:
+                    continue
+                first_coords = coords_xyz_px[0]
+                key = (track_json["time_point_start"],
+                       tuple(first_coords.tolist() if isinstance(first_coords, numpy.ndarray) else first_coords))
+                track = self._tracks.get(key)
+                if track is None or not track.is_same(track_json):
+                    track = _TrackEntry(track_json)
+                    self.changed_track_count += 1
+                tracks[key] = track
+            self._tracks = tracks
+
+        track_entries = list(tracks.values())
+        if len(track_entries) == 0:
+            self._layer_parts = None
+            self.was_extended = False
+            return None
+        metadata_keys = _find_feature_keys(time_points.values())
+        track_features = [track.get_features(time_points, metadata_keys) for track in track_entries]
+
+        # If the tracks of the last reload are still there, unchanged and in the same order, and only new tracks were
+        # added after them, then the previous track table, features and graph are extended
+        layer_parts = self._layer_parts
+        self.was_extended = layer_parts is not None and layer_parts.can_extend(track_entries, track_features,
+                                                                                metadata_keys)
+        if not self.was_extended:
+            layer_parts = _LayerParts(metadata_keys)
+            self._layer_parts = layer_parts
+        layer_parts.extend(track_entries, track_features)
+
+        # Without an overview, the features of all rows are requested
+        layers = _track_table_to_napari(layer_parts.builder.track_table, lambda rows: layer_parts.features,
+                                        event_layers=False, overview_step=None, load_full_resolution=lambda: [],
+                                        lineage_metadata=layer_parts.lineage_metadata,
+                                        linking_graph=layer_parts.linking_graph)
+        return layers[0]
+
+
+class _LayerParts:
+    """The parts of the layer data that are extended when tracks are added to the end of the file: the track table,
+    the napari features of every row, the linking graph and the lineage metadata."""
+
+    metadata_keys: List[str]
+    builder: "_TrackTableBuilder"
+    features: Dict[str, numpy.ndarray]
+    linking_graph: Dict[int, List[int]]
+    lineage_metadata: Dict[int, Dict[str, Any]]
+    _track_entries: List[_TrackEntry]
+    _track_features: List[Dict[str, numpy.ndarray]]
+
+    def __init__(self, metadata_keys: List[str]):
+        self.metadata_keys = metadata_keys
+        self.builder = _TrackTableBuilder()
+        self.features = dict()
+        self.linking_graph = dict()
+        self.lineage_metadata = dict()
+        self._track_entries = list()
+        self._track_features = list()
+
+    def can_extend(self, track_entries: List[_TrackEntry], track_features: List[Dict[str, numpy.ndarray]],
+                   metadata_keys: List[str]) -> bool:
+        """Checks whether the given tracks start with the tracks stored here, with the same features. The features of
+        unchanged tracks are the same objects, see _TrackEntry.get_features."""
+        return metadata_keys == self.metadata_keys and not self.builder.has_missing_links \
+            and len(track_entries) >= len(self._track_entries) \
+            and all(new is old for new, old in zip(track_entries, self._track_entries)) \
+            and all(new is old for new, old in zip(track_features, self._track_features))
+
+    def extend(self, track_entries: List[_TrackEntry], track_features: List[Dict[str, numpy.ndarray]]):
+        """Adds the tracks after the tracks stored here. The features, graph and lineage metadata are replaced by new
+        objects, as napari may still be using the old ones."""
+        first_track_id = len(self._track_entries)
+        new_track_entries = track_entries[first_track_id:]
+        new_track_features = track_features[first_track_id:]
+        self.builder.add_tracks(new_track_entries)
+
+        features = dict()
+        for metadata_key in self.metadata_keys:
+            arrays = [self.features[metadata_key]] if first_track_id > 0 else []
+            arrays += [track_features[metadata_key] for track_features in new_track_features]
+            features[metadata_key] = numpy.concatenate(arrays)
+        self.features = features
+
+        track_table = self.builder.track_table
+        self.linking_graph = dict(self.linking_graph)
+        for track_id in range(first_track_id, track_table.track_count()):
+            self.linking_graph[track_id] = track_table.get_previous_track_ids(track_id).tolist()
+        self.lineage_metadata = dict(self.lineage_metadata)
+        for track_id, track in enumerate(new_track_entries, start=first_track_id):
+            if len(track.lineage_meta) > 0:
+                self.lineage_metadata[track_id] = track.lineage_meta
+        self._track_entries = track_entries
+        self._track_features = track_features
+
+
+def _find_feature_keys(time_points: Iterable[_TimePointEntry]) -> List[str]:
+    """Finds the metadata keys that become napari features: those with numbers, booleans or strings. Like
+    PositionData.get_data_names_and_types, the type is determined by the first value that is found."""
+    feature_keys = dict()  # Used as an ordered set
+    other_keys = set()
+    for time_point in time_points:
+        for metadata_key, values in time_point.position_meta.items():
+            if metadata_key in feature_keys or metadata_key in other_keys:
+                continue
+            example_value = next((value for value in values if value is not None), None)
+            if example_value is None:
+                continue
+            if isinstance(example_value, (bool, float, int, str)):
+                feature_keys[metadata_key] = None
+            else:
+                other_keys.add(metadata_key)
+    return list(feature_keys.keys())
+
+
+class _TrackTableBuilder:
+    """Builds the track table from the track entries, using the coords_xyz_px_before of the tracks to link them. More
+    tracks can be added later, which then get the next track ids."""
+
+    track_table: Optional[TrackTable]
+    has_missing_links: bool  # Whether some previous tracks were not found. They could be among the tracks added later
+    _track_id_by_last_position: Dict[Tuple[float, ...], int]
+
+    def __init__(self):
+        self.track_table = None
+        self.has_missing_links = False
+        self._track_id_by_last_position = dict()
+
+    def add_tracks(self, tracks: List[_TrackEntry]):
+        """Adds the tracks, after the tracks that were already added. The track table is replaced by a new one."""
+        first_track_id = self.track_table.track_count() if self.track_table is not None else 0
+        track_lengths = numpy.array([len(track.coords_xyz) for track in tracks], dtype=numpy.int64)
+        track_first_time_point_numbers = numpy.array([track.time_point_start for track in tracks], dtype=numpy.int64)
+
+        for track_id, track in enumerate(tracks, start=first_track_id):
+            last_time_point_number = track.time_point_start + len(track.coords_xyz) - 1
+            self._track_id_by_last_position[(last_time_point_number, *track.coords_xyz[-1].tolist())] = track_id
+
+        previous_counts = numpy.zeros(len(tracks), dtype=numpy.int64)
+        previous_track_ids = list()
+        for i, track in enumerate(tracks):
+            for coords in track.coords_xyz_before.tolist():
+                previous_track_id = self._track_id_by_last_position.get((track.time_point_start - 1, *coords))
+                if previous_track_id is not None:
+                    previous_track_ids.append(previous_track_id)
+                    previous_counts[i] += 1
+                else:
+                    self.has_missing_links = True
+        previous_track_ids = numpy.array(previous_track_ids, dtype=numpy.int64)
+        coords_xyz = [track.coords_xyz for track in tracks]
+
+        old_table = self.track_table
+        if old_table is not None:
+            track_lengths = numpy.concatenate([numpy.diff(old_table.track_offsets), track_lengths])
+            track_first_time_point_numbers = numpy.concatenate([old_table.track_first_time_point_numbers,
+                                                                track_first_time_point_numbers])
+            previous_counts = numpy.concatenate([old_table.previous_counts(), previous_counts])
+            previous_track_ids = numpy.concatenate([old_table.previous_track_ids, previous_track_ids])
+            coords_xyz.insert(0, old_table.coords_xyz)
+        track_count = len(track_lengths)
+        self.track_table = TrackTable(
+            track_offsets=_to_offsets(track_lengths),
+            track_first_time_point_numbers=track_first_time_point_numbers,
+            previous_offsets=_to_offsets(previous_counts),
+            previous_track_ids=previous_track_ids,
+            next_counts=numpy.bincount(previous_track_ids, minlength=track_count).astype(numpy.int64),
+            coords_xyz=numpy.concatenate(coords_xyz) if len(coords_xyz) > 0 else numpy.empty((0, 3)),
+            positions=None)
+
+
+def update_tracks_layer(layer: Any, layer_data: LayerData):
+    """Replaces the contents of a napari tracks layer, so that the layer itself (and the settings of the user, like
+    the colormap) stays the same."""
+    data, layer_kwargs, _ = layer_data
+    layer.graph = dict()  # Otherwise, setting the data could fail on links to tracks that no longer exist
+    layer.data = data
+    layer.features = layer_kwargs["features"]
+    layer.graph = layer_kwargs["graph"]
+    layer.metadata.update(layer_kwargs["metadata"])
+
+
+def watch_file(layer: Any, file_path: str, *, interval: float = 2.0, json_backend: Optional[str] = None
+               ) -> Callable[[], None]:
+    """Keeps a napari tracks layer up to date with a file that is being rewritten. The file is checked every interval
+    seconds in a background thread, and the layer is updated in the main thread. Returns a function that stops
+    watching. Needs napari."""
+    import time
+
+    from napari.qt.threading import thread_worker
+
+    reloader = LiveReloader(file_path, json_backend=json_backend)
+    reloader.reload()  # The layer is assumed to show the current contents of the file
+
+    @thread_worker
+    def check_for_changes():
+        while True:
+            if reloader.reload():
+                layer_data = reloader.get_layer_data()
+                if layer_data is not None:
+                    yield layer_data
+            else:
+                yield None  # Gives napari the chance to stop this worker
+            time.sleep(interval)
+
+    worker = check_for_changes()
+    worker.yielded.connect(lambda layer_data: update_tracks_layer(layer, layer_data) if layer_data is not None
+                           else None)
+    worker.start()
+    return worker.quit
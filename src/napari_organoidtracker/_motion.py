@@ -0,0 +1,126 @@
+"""Motion features of every position, computed from a TrackTable using array operations. The rows of a track are
+contiguous in the table, so differences between consecutive rows of the same track give the movement of a cell.
+
+All distances are in pixels and all times in time points, as the resolution of the images is not known here. Each
+feature has one value per row of the track table:
+
+* velocity_x, velocity_y, velocity_z: movement since the previous time point. For the first position of a track, the
+  last position of the previous track (the mother cell) is used. Positions without a previous position get 0.
+* speed: length of the velocity vector.
+* displacement: distance to the first position of the track.
+* msd: mean squared displacement of the track, at a time lag equal to the age of the position. So for a position of
+  age 3, this is the mean of the squared distance over 3 time points, over all pairs of positions in the track that
+  are 3 time points apart.
+* age: number of time points since the start of the track, like LinkingTrack.get_age.
+* time_until_division: number of time points until the last position before the cell divides. -1 if the track doesn't
+  end in a division.
+"""
+
+from typing import Dict
+
+import numpy
+
+from napari_organoidtracker._track_table import TrackTable
+
+MOTION_FEATURE_NAMES = ("velocity_x", "velocity_y", "velocity_z", "speed", "displacement", "msd", "age",
+                        "time_until_division")
+
+
+def compute_motion_features(track_table: TrackTable) -> Dict[str, numpy.ndarray]:
+    """Computes all motion features, for every row in the track table."""
+    track_lengths = numpy.diff(track_table.track_offsets)
+    first_rows = track_table.first_rows()
+    row_first_rows = numpy.repeat(first_rows, track_lengths)
+    ages = numpy.arange(len(track_table), dtype=numpy.int64) - row_first_rows
+    coords_xyz = track_table.coords_xyz
+
+    # Velocity: within a track, the difference with the previous row. Positions without a previous position are
+    # compared with themselves, which gives 0
+    previous_rows = numpy.arange(-1, len(track_table) - 1, dtype=numpy.int64)
+    previous_rows[first_rows] = first_rows
+    has_previous_track = track_table.previous_counts() > 0
+    previous_track_ids = track_table.previous_track_ids[track_table.previous_offsets[:-1][has_previous_track]]
+    previous_rows[first_rows[has_previous_track]] = track_table.last_rows()[previous_track_ids]
+    velocity = coords_xyz - coords_xyz[previous_rows]
+
+    displacement = _lengths(coords_xyz - coords_xyz[row_first_rows])
+
+    divides = numpy.repeat(track_table.next_counts > 1, track_lengths)
+    last_ages = numpy.repeat(track_lengths - 1, track_lengths)
+    time_until_division = numpy.where(divides, last_ages - ages, -1)
+
+    return {
+        "velocity_x": velocity[:, 0],
+        "velocity_y": velocity[:, 1],
+        "velocity_z": velocity[:, 2],
+        "speed": _lengths(velocity),
+        "displacement": displacement,
+        "msd": _mean_squared_displacements(track_table, ages),
+        "age": ages,
+        "time_until_division": time_until_division,
+    }
+
+
+def _lengths(vectors: numpy.ndarray) -> numpy.ndarray:
+    """Gets the length of every row vector. Faster than numpy.linalg.norm."""
+    return numpy.sqrt(numpy.einsum("ij,ij->i", vectors, vectors))
+
+
+def _mean_squared_displacements(track_table: TrackTable, ages: numpy.ndarray) -> numpy.ndarray:
+    """Computes the mean squared displacement of every track, for every time lag up to the track length, using the FFT
+    algorithm. So MSD(m) = S1(m) - 2 S2(m), where S2 is the autocorrelation of the coordinates, and S1 is computed from
+    prefix sums of the squared coordinates.
+
+    To do this for all tracks at once, tracks are grouped by length (in powers of two), and the tracks in a group are
+    padded with zeros to the same length. This wastes at most half of the memory, instead of padding all tracks to the
+    length of the longest one."""
+    track_lengths = numpy.diff(track_table.track_offsets)
+    msd_by_row = numpy.zeros(len(track_table), dtype=numpy.float64)
+    if len(track_lengths) == 0:
+        return msd_by_row
+
+    bucket_sizes = 2 ** numpy.ceil(numpy.log2(numpy.maximum(track_lengths, 1))).astype(numpy.int64)
+    for bucket_size in numpy.unique(bucket_sizes).tolist():
+        track_ids = numpy.flatnonzero(bucket_sizes == bucket_size)
+        lengths = track_lengths[track_ids]
+
+        # Padded coordinates, shape (tracks, 3, bucket_size), so that the FFT runs over the last (contiguous) axis
+        bucket_track_ids = numpy.repeat(numpy.arange(len(track_ids)), lengths)
+        rows = _rows_of_tracks(track_table, track_ids, lengths)
+        bucket_ages = ages[rows]
+        # Center every track, which doesn't change the MSD, but makes the result more precise
+        coords_of_rows = track_table.coords_xyz[rows]
+        means = numpy.add.reduceat(coords_of_rows, numpy.cumsum(lengths) - lengths, axis=0) / lengths[:, numpy.newaxis]
+        coords = numpy.zeros((len(track_ids), bucket_size, 3), dtype=numpy.float64)
+        coords[bucket_track_ids, bucket_ages] = coords_of_rows - means[bucket_track_ids]
+        coords = coords.transpose(0, 2, 1).copy()
+
+        # S2: autocorrelation, using the FFT. Padding to twice the size avoids wrapping around. The FFT is linear, so
+        # the power spectra of x, y and z can be added before transforming back
+        spectrum = numpy.fft.rfft(coords, n=2 * bucket_size, axis=2)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).sum(axis=1)
+        autocorrelation = numpy.fft.irfft(power, n=2 * bucket_size, axis=1)[:, :bucket_size]
+
+        # S1: sum of D[k] + D[k + m] over k < N - m, with D the squared distance to the origin
+        squared = (coords ** 2).sum(axis=1)
+        prefix_sums = numpy.zeros((len(track_ids), bucket_size + 1), dtype=numpy.float64)
+        numpy.cumsum(squared, axis=1, out=prefix_sums[:, 1:])
+        lags = numpy.arange(bucket_size)
+        remaining = lengths[:, numpy.newaxis] - lags[numpy.newaxis, :]  # N - m, <= 0 for lags that don't exist
+        valid = remaining > 0
+        end_indices = numpy.clip(remaining, 0, bucket_size)
+        s1 = numpy.take_along_axis(prefix_sums, end_indices, axis=1) \
+            + prefix_sums[:, -1:] - prefix_sums[:, :bucket_size]
+        counts = numpy.where(valid, remaining, 1)
+        msd = numpy.where(valid, (s1 - 2 * autocorrelation) / counts, 0)
+
+        msd_by_row[rows] = numpy.maximum(msd[bucket_track_ids, bucket_ages], 0)  # Rounding can give tiny negatives
+    return msd_by_row
+
+
+def _rows_of_tracks(track_table: TrackTable, track_ids: numpy.ndarray, lengths: numpy.ndarray) -> numpy.ndarray:
+    """Gets all rows of the given tracks, in order."""
+    starts = track_table.track_offsets[track_ids]
+    offsets_in_result = numpy.zeros(len(track_ids), dtype=numpy.int64)
+    numpy.cumsum(lengths[:-1], out=offsets_in_result[1:])
+    return numpy.repeat(starts - offsets_in_result, lengths) + numpy.arange(lengths.sum(), dtype=numpy.int64)
@@ -0,0 +1,284 @@
+"""Neighbour graphs of the positions in every time point, for spatial features like the local cell density.
+
+Neighbours are either the k nearest positions, or all positions within a radius. They are found using a uniform grid
+over the positions of a time point: only positions in the surrounding grid cells need to be compared, and all of this
+is done using array operations, instead of looping over Python Position objects. The time points are divided over
+multiple processes.
+
+The neighbours of every time point are stored as CSR arrays (compressed sparse rows): the neighbours of position i are
+indices[offsets[i]:offsets[i + 1]], sorted by distance. Like everywhere else in this plugin, distances are in pixels,
+unless scale_xyz is given to convert them to (for example) micrometers.
+"""
+
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy
+
+from napari_organoidtracker._parallel import map_in_batches
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._position_collection import PositionCollection
+from napari_organoidtracker._position_data import PositionData
+from napari_organoidtracker._track_table import _to_offsets
+
+NEIGHBOUR_FEATURE_NAMES = ("neighbour_count", "local_density")
+
+_MAX_INT64 = int(numpy.iinfo(numpy.int64).max)
+_CUBE_KEY_DTYPE = numpy.dtype([("x", numpy.int64), ("y", numpy.int64), ("z", numpy.int64)])
+
+
+class NeighbourGraph:
+    """The neighbours of all positions in a single time point, in CSR format."""
+
+    positions: List[Position]
+    coords_xyz: numpy.ndarray  # Shape (N, 3), scaled using scale_xyz
+    offsets: numpy.ndarray  # Shape (N + 1,)
+    indices: numpy.ndarray  # Indices in positions, sorted by distance for every position
+    distances: numpy.ndarray  # Same shape as indices
+    radius: Optional[float]  # Search radius, or None if the k nearest neighbours were found
+
+    def __init__(self, *, positions: List[Position], coords_xyz: numpy.ndarray, offsets: numpy.ndarray,
+                 indices: numpy.ndarray, distances: numpy.ndarray, radius: Optional[float]):
+        self.positions = positions
+        self.coords_xyz = coords_xyz
+        self.offsets = offsets
+        self.indices = indices
+        self.distances = distances
+        self.radius = radius
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def neighbour_counts(self) -> numpy.ndarray:
+        """Gets the number of neighbours of every position."""
+        return numpy.diff(self.offsets)
+
+    def get_neighbours(self, index: int) -> List[Position]:
+        """Gets the neighbours of the position at the given index, nearest first."""
+        return [self.positions[neighbour] for neighbour in
+                self.indices[self.offsets[index]:self.offsets[index + 1]].tolist()]
+
+    def local_densities(self) -> numpy.ndarray:
+        """Gets the number of neighbours per volume unit around every position. For radius neighbours, the volume is
+        the sphere with the search radius. For k nearest neighbours, it is the sphere that reaches to the furthest
+        neighbour, which is infinitely small (so the density infinite) if that neighbour is at the same location.
+        Positions without neighbours have a density of 0."""
+        counts = self.neighbour_counts()
+        if self.radius is not None:
+            return counts / (4 / 3 * math.pi * self.radius ** 3)
+        densities = numpy.zeros(len(counts), dtype=numpy.float64)
+        has_neighbours = counts > 0
+        furthest_distances = self.distances[self.offsets[1:][has_neighbours] - 1]
+        with numpy.errstate(divide="ignore"):
+            densities[has_neighbours] = counts[has_neighbours] / (4 / 3 * math.pi * furthest_distances ** 3)
+        return densities
+
+
+def find_neighbours(coords_xyz: numpy.ndarray, *, k: Optional[int] = None, radius: Optional[float] = None
+                    ) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Finds either the k nearest neighbours, or all neighbours within the radius, of all given points. A point is
+    never its own neighbour. Returns the offsets, indices and distances in CSR format, see the module docstring."""
+    _check_k_or_radius(k, radius)
+    coords_xyz = numpy.asarray(coords_xyz, dtype=numpy.float64).reshape(-1, 3)
+    if radius is not None:
+        queries, neighbours, distances = _pairs_within_radius(coords_xyz, numpy.arange(len(coords_xyz)), radius)
+        return _to_csr(len(coords_xyz), queries, neighbours, distances)
+    return _k_nearest_neighbours(coords_xyz, k)
+
+
+def build_neighbour_graphs(positions: PositionCollection, *, k: Optional[int] = None, radius: Optional[float] = None,
+                           scale_xyz: Sequence[float] = (1, 1, 1), max_workers: Optional[int] = None
+                           ) -> Dict[int, NeighbourGraph]:
+    """Builds the neighbour graph of every time point, by time point number. The time points are divided over
+    max_workers processes (by default, one per CPU). With max_workers=1, everything runs in the current process.
+
+    Either k (the number of nearest neighbours) or radius must be given. Use scale_xyz to give the size of a pixel, so
+    that the anisotropic resolution of most microscopy images doesn't make cells above each other seem far apart."""
+    from napari_organoidtracker import _profiling
+
+    _check_k_or_radius(k, radius)
+    scale_xyz = numpy.asarray(scale_xyz, dtype=numpy.float64)
+    time_point_numbers = sorted(positions._all_positions.keys())
+    positions_by_time_point = [list(positions._all_positions[time_point_number].positions())
+                               for time_point_number in time_point_numbers]
+    coords_by_time_point = [numpy.array([(position.x, position.y, position.z) for position in positions_of_time_point],
+                                        dtype=numpy.float64).reshape(-1, 3) * scale_xyz
+                            for positions_of_time_point in positions_by_time_point]
+
+    with _profiling.stage("build_neighbour_graphs"):
+        # Batches of consecutive time points, which have about the same number of positions
+        results = map_in_batches(_find_neighbours_of_time_points, coords_by_time_point, k, radius,
+                                 max_workers=max_workers)
+
+    return {time_point_number: NeighbourGraph(positions=positions_of_time_point, coords_xyz=coords,
+                                              offsets=offsets, indices=indices, distances=distances, radius=radius)
+            for time_point_number, positions_of_time_point, coords, (offsets, indices, distances)
+            in zip(time_point_numbers, positions_by_time_point, coords_by_time_point, results)}
+
+
+def store_neighbour_features(position_data: PositionData, graphs: Dict[int, NeighbourGraph]):
+    """Stores the number of neighbours and the local density of every position as position data, so that they are
+    shown as features of the tracks layer, and saved by the writer. Infinite densities are not stored."""
+    neighbour_counts = dict()
+    local_densities = dict()
+    for graph in graphs.values():
+        for position, neighbour_count, local_density in zip(graph.positions, graph.neighbour_counts().tolist(),
+                                                            graph.local_densities().tolist()):
+            neighbour_counts[position] = neighbour_count
+            if math.isfinite(local_density):
+                local_densities[position] = local_density
+    position_data.add_positions_data("neighbour_count", neighbour_counts)
+    position_data.add_positions_data("local_density", local_densities)
+
+
+def _check_k_or_radius(k: Optional[int], radius: Optional[float]):
+    if (k is None) == (radius is None):
+        raise ValueError("Specify either k or radius")
+    if k is not None and k < 1:
+        raise ValueError(f"k must be at least 1, but was {k}")
+    if radius is not None and not radius > 0:
+        raise ValueError(f"radius must be positive, but was {radius}")
+
+
+def _find_neighbours_of_time_points(coords_by_time_point: List[numpy.ndarray], k: Optional[int],
+                                    radius: Optional[float]
+                                    ) -> List[Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]]:
+    """Finds the neighbours in multiple time points. Runs in a worker process, so everything must be picklable."""
+    return [find_neighbours(coords, k=k, radius=radius) for coords in coords_by_time_point]
+
+
+def _pairs_within_radius(coords_xyz: numpy.ndarray, query_indices: numpy.ndarray, radius: float
+                         ) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Finds all pairs of a query point and another point at most the radius apart. Returns the query indices, the
+    neighbour indices and the distances, in no particular order."""
+    queries, neighbours, distances = _find_close_pairs(coords_xyz[query_indices], coords_xyz, radius)
+    queries = query_indices[queries]
+    is_other_point = neighbours != queries
+    return queries[is_other_point], neighbours[is_other_point], distances[is_other_point]
+
+
+def _to_cube_keys(cubes: numpy.ndarray, grid_size: Optional[numpy.ndarray]) -> numpy.ndarray:
+    """Gets the sort key of every cube. If the grid size is given, the cube coordinates (all in 0 <= c < grid_size) are
+    combined into a single int64. Otherwise, every key is a record of the three coordinates, which NumPy sorts and
+    searches in lexicographic order."""
+    if grid_size is None:
+        return numpy.ascontiguousarray(cubes, dtype=numpy.int64).view(_CUBE_KEY_DTYPE).ravel()
+    return (cubes[:, 0] * grid_size[1] + cubes[:, 1]) * grid_size[2] + cubes[:, 2]
+
+
+def _find_close_pairs(query_coords_xyz: numpy.ndarray, coords_xyz: numpy.ndarray, radius: float
+                      ) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Finds all pairs of a query point and a point at most the radius apart. The query points can be a different set
+    of points. Returns the indices in query_coords_xyz, the indices in coords_xyz and the distances, in no particular
+    order.
+
+    The points are put in a grid of cubes with the radius as size, so the neighbours of a point are always in the same
+    cube or in one of the 26 cubes around it. Every point gets the key of its cube, and the points are sorted by key,
+    so that the points in a cube can be found using a binary search. The key combines the three cube coordinates into a
+    single int64. If the grid is so large that this would overflow (a small radius compared to the spread of the
+    points), the cube coordinates themselves are used as key instead, which is slower to sort."""
+    empty = numpy.empty(0, dtype=numpy.int64)
+    if len(coords_xyz) == 0 or len(query_coords_xyz) == 0:
+        return empty, empty, numpy.empty(0, dtype=numpy.float64)
+
+    # Cube coordinates start at 1, so that the cubes around every point have non-negative coordinates
+    min_coords = numpy.minimum(coords_xyz.min(axis=0), query_coords_xyz.min(axis=0))
+    cubes = numpy.floor((coords_xyz - min_coords) / radius).astype(numpy.int64) + 1
+    query_cubes = numpy.floor((query_coords_xyz - min_coords) / radius).astype(numpy.int64) + 1
+    grid_size = numpy.maximum(cubes.max(axis=0), query_cubes.max(axis=0)) + 2
+    if math.prod(grid_size.tolist()) > _MAX_INT64:
+        grid_size = None  # Keys would overflow
+    keys = _to_cube_keys(cubes, grid_size)
+    order = numpy.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    # Searching is faster for sorted keys, so the queries are handled in the order of their cubes as well
+    query_keys = _to_cube_keys(query_cubes, grid_size)
+    query_indices = numpy.argsort(query_keys, kind="stable")
+    query_cubes = query_cubes[query_indices]
+    all_queries = list()
+    all_neighbours = list()
+    all_distances = list()
+    for offset in numpy.array(numpy.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1])).reshape(3, -1).T:
+        neighbour_cubes = query_cubes + offset
+        neighbour_keys = _to_cube_keys(neighbour_cubes, grid_size)
+        starts = numpy.searchsorted(sorted_keys, neighbour_keys, side="left")
+        counts = numpy.searchsorted(sorted_keys, neighbour_keys, side="right") - starts
+        total = counts.sum()
+        if total == 0:
+            continue
+
+        # All (query, candidate) pairs, so for every query all points in the cube
+        queries = numpy.repeat(query_indices, counts)
+        offsets_in_cube = numpy.arange(total, dtype=numpy.int64) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        candidates = order[numpy.repeat(starts, counts) + offsets_in_cube]
+        differences = coords_xyz[candidates] - query_coords_xyz[queries]
+        distances = numpy.sqrt(numpy.einsum("ij,ij->i", differences, differences))
+        is_close = distances <= radius
+        all_queries.append(queries[is_close])
+        all_neighbours.append(candidates[is_close])
+        all_distances.append(distances[is_close])
+
+    if len(all_queries) == 0:
+        return empty, empty, numpy.empty(0, dtype=numpy.float64)
+    return numpy.concatenate(all_queries), numpy.concatenate(all_neighbours), numpy.concatenate(all_distances)
+
+
+def _k_nearest_neighbours(coords_xyz: numpy.ndarray, k: int) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Finds the k nearest neighbours using radius searches. The radius starts at the size of a sphere that contains
+    about k points (if they were evenly spread), and is doubled for the points that have fewer than k neighbours within
+    it. Once a point has at least k neighbours within the radius, its k nearest neighbours are among them."""
+    point_count = len(coords_xyz)
+    k = min(k, point_count - 1)  # Can't have more neighbours than there are other points
+    if k <= 0:
+        return _to_csr(point_count, numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.int64),
+                       numpy.empty(0, dtype=numpy.float64))
+
+    radius = _estimate_k_nearest_radius(coords_xyz, k)
+    pending = numpy.arange(point_count, dtype=numpy.int64)
+    all_queries = list()
+    all_neighbours = list()
+    all_distances = list()
+    while len(pending) > 0:
+        queries, neighbours, distances = _pairs_within_radius(coords_xyz, pending, radius)
+        found_counts = numpy.bincount(queries, minlength=point_count)
+        is_done = found_counts[queries] >= k
+        queries, neighbours, distances = queries[is_done], neighbours[is_done], distances[is_done]
+
+        # Keep the k nearest of every finished query
+        order = numpy.lexsort((distances, queries))
+        queries, neighbours, distances = queries[order], neighbours[order], distances[order]
+        query_starts = numpy.searchsorted(queries, queries, side="left")
+        is_nearest = numpy.arange(len(queries)) - query_starts < k
+        all_queries.append(queries[is_nearest])
+        all_neighbours.append(neighbours[is_nearest])
+        all_distances.append(distances[is_nearest])
+
+        pending = pending[found_counts[pending] < k]
+        radius *= 2
+    return _to_csr(point_count, numpy.concatenate(all_queries), numpy.concatenate(all_neighbours),
+                   numpy.concatenate(all_distances))
+
+
+def _estimate_k_nearest_radius(coords_xyz: numpy.ndarray, k: int) -> float:
+    """Estimates the radius that contains about k other points, assuming that the points are evenly spread over their
+    bounding box. Axes along which all points are at the same coordinate (like z for 2D data) are ignored."""
+    extents = coords_xyz.max(axis=0) - coords_xyz.min(axis=0)
+    extents = extents[extents > 0]
+    if len(extents) == 0:
+        return 1.0  # All points are at the same location
+    radius = float(extents.max())
+    while radius > 0:
+        # Expected number of points in a cube with sides of 2 * radius, which is about twice the volume of the sphere
+        cube_fraction = numpy.prod(numpy.minimum(2 * radius / extents, 1))
+        if cube_fraction * len(coords_xyz) < 2 * k:
+            return radius * 2
+        radius /= 2
+    return float(extents.max())
+
+
+def _to_csr(point_count: int, queries: numpy.ndarray, neighbours: numpy.ndarray, distances: numpy.ndarray
+            ) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Sorts the pairs by query and then by distance, and converts them to CSR format."""
+    order = numpy.lexsort((neighbours, distances, queries))
+    return _to_offsets(numpy.bincount(queries, minlength=point_count)), neighbours[order], distances[order]
@@ -0,0 +1,36 @@
+"""Runs work for many items (time points, lineages, etc.) in multiple processes.
+
+The items are divided into batches of consecutive items, and every batch is sent to a worker process as a whole. More
+batches balance the work better, fewer batches reduce the overhead of sending the data to the workers.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Sequence
+
+import numpy
+
+# Number of batches per worker process
+_BATCHES_PER_WORKER = 4
+
+
+def map_in_batches(function: Callable[..., List[Any]], items: Sequence[Any], *args: Any,
+                   max_workers: Optional[int] = None) -> List[Any]:
+    """Calls function(batch, *args) for batches of the items, in max_workers processes (by default, one per CPU), and
+    returns the concatenated results. So the function must return one result for every item of the batch. With
+    max_workers=1, everything runs in the current process, as a single batch. The function and the arguments must be
+    picklable, so the function must be defined at the top level of a module."""
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(items))
+    if max_workers <= 1:
+        return function(items, *args)
+
+    batch_count = min(max_workers * _BATCHES_PER_WORKER, len(items))
+    boundaries = numpy.linspace(0, len(items), batch_count + 1).astype(numpy.int64).tolist()
+    batches = [items[start:end] for start, end in zip(boundaries[:-1], boundaries[1:])]
+    results = list()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        for batch_results in pool.map(function, batches, *[[arg] * len(batches) for arg in args]):
+            results += batch_results
+    return results
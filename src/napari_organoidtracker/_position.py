@@ -1,6 +1,9 @@
 """Copied from OrganoidTracker."""
 
-from typing import List, Optional, Union
+from itertools import chain
+from typing import List, Optional, Tuple, Union
+
+import numpy
 
 from napari_organoidtracker._basics import TimePoint
 
@@ -48,6 +51,10 @@ class Position:
     def time_point_number(self) -> Optional[int]:
         return self._time_point_number
 
+    def __reduce__(self):
+        # Much smaller than the default for classes with __slots__, which also pickles the names of the slots
+        return _restore_position, (self.x, self.y, self.z, self._time_point_number)
+
     def __repr__(self):
         string = (
             "Position("
@@ -251,3 +258,42 @@ class Position:
             )
         return_list.append(to_pos)
         return return_list
+
+
+def _restore_position(x: float, y: float, z: float, time_point_number: Optional[int]) -> Position:
+    """Used for unpickling."""
+    position = Position.__new__(Position)
+    position.x = x
+    position.y = y
+    position.z = z
+    position._time_point_number = time_point_number
+    return position
+
+
+def _positions_to_arrays(positions: List[Optional[Position]]) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Packs the positions into a float64 array of shape (N, 3) with the coordinates, and an int64 array with the time
+    point numbers. Used for compact pickling. None is stored as NaN coordinates, and a missing time point as
+    numpy.iinfo(numpy.int64).min."""
+    missing_time_point = numpy.iinfo(numpy.int64).min
+    no_coords = (numpy.nan, numpy.nan, numpy.nan)
+    coords_xyz = numpy.fromiter(chain.from_iterable(
+        (position.x, position.y, position.z) if position is not None else no_coords for position in positions),
+        dtype=numpy.float64, count=3 * len(positions)).reshape(-1, 3)
+    time_point_numbers = numpy.fromiter(
+        (position._time_point_number if position is not None and position._time_point_number is not None
+         else missing_time_point for position in positions), dtype=numpy.int64, count=len(positions))
+    return coords_xyz, time_point_numbers
+
+
+def _positions_from_arrays(coords_xyz: numpy.ndarray, time_point_numbers: numpy.ndarray) -> List[Optional[Position]]:
+    """The reverse of _positions_to_arrays."""
+    is_missing_time_point = time_point_numbers == numpy.iinfo(numpy.int64).min
+    time_point_numbers = time_point_numbers.tolist()
+    if is_missing_time_point.any():
+        for i in numpy.flatnonzero(is_missing_time_point).tolist():
+            time_point_numbers[i] = None
+    positions = [_restore_position(x, y, z, time_point_number)
+                 for (x, y, z), time_point_number in zip(coords_xyz.tolist(), time_point_numbers)]
+    for i in numpy.flatnonzero(numpy.isnan(coords_xyz[:, 0])).tolist():
+        positions[i] = None
+    return positions
@@ -1,7 +1,9 @@
 from typing import Dict, AbstractSet, Optional, Iterable, Set
 
+import numpy
+
 from napari_organoidtracker._basics import TimePoint
-from napari_organoidtracker._position import Position
+from napari_organoidtracker._position import Position, _positions_from_arrays, _positions_to_arrays
 
 
 class _PositionsAtTimePoint:
@@ -105,6 +107,27 @@ class PositionCollection:
         for position in positions:
             self.add(position)
 
+    def __getstate__(self):
+        # Packing the positions into arrays makes pickling a lot faster and smaller
+        time_point_numbers = list(self._all_positions.keys())
+        counts = [len(positions_at_time_point) for positions_at_time_point in self._all_positions.values()]
+        coords_xyz, _ = _positions_to_arrays(list(self))
+        return time_point_numbers, counts, coords_xyz
+
+    def __setstate__(self, state):
+        time_point_numbers, counts, coords_xyz = state
+        positions = _positions_from_arrays(coords_xyz, numpy.repeat(numpy.array(time_point_numbers, dtype=numpy.int64),
+                                                                    counts))
+        self._all_positions = dict()
+        start = 0
+        for time_point_number, count in zip(time_point_numbers, counts):
+            positions_at_time_point = _PositionsAtTimePoint()
+            for position in positions[start:start + count]:
+                positions_at_time_point.add_position(position)
+            self._all_positions[time_point_number] = positions_at_time_point
+            start += count
+        self._recalculate_min_max_time_points()
+
 
     def of_time_point(self, time_point: TimePoint) -> AbstractSet[Position]:
         """Returns all positions for a given time point. Returns an empty set if that time point doesn't exist."""
@@ -241,3 +264,18 @@ class PositionCollection:
         the_copy._max_time_point_number = self._max_time_point_number
         return the_copy
 
+    def copy_subset(self, positions: Iterable[Position]) -> "PositionCollection":
+        """Creates a new collection with only the given positions of this collection. Positions that are not in this
+        collection are left out."""
+        the_copy = PositionCollection()
+        for position in positions:
+            positions_at_time_point = self._all_positions.get(position.time_point_number())
+            if positions_at_time_point is None or not positions_at_time_point.contains_position(position):
+                continue
+            copied_positions_at_time_point = the_copy._all_positions.get(position.time_point_number())
+            if copied_positions_at_time_point is None:
+                copied_positions_at_time_point = _PositionsAtTimePoint()
+                the_copy._all_positions[position.time_point_number()] = copied_positions_at_time_point
+            copied_positions_at_time_point.add_position(position)
+        the_copy._recalculate_min_max_time_points()
+        return the_copy
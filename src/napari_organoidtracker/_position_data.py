@@ -1,8 +1,10 @@
 from collections import defaultdict
 from typing import Dict, Optional, Iterable, Set, List, Any, Type, Tuple, Union
 
+import numpy
+
 from napari_organoidtracker._basics import DataType, TimePoint, min_none, max_none
-from napari_organoidtracker._position import Position
+from napari_organoidtracker._position import Position, _positions_from_arrays, _positions_to_arrays
 
 
 class _MetadataAtTimepoint:
@@ -28,6 +30,24 @@ class _MetadataAtTimepoint:
         copy._metadata_counts = self._metadata_counts.copy()
         return copy
 
+    def copy_subset(self, positions: Iterable[Position]) -> "_MetadataAtTimepoint":
+        """Gets a deep copy of the metadata of the given positions. Positions without metadata are left out. Data names
+        that are not used by any of the positions are removed."""
+        copy = _MetadataAtTimepoint()
+        for position in positions:
+            metadata = self._positions.get(position)
+            if metadata is not None:
+                copy._positions[position] = metadata.copy()
+        copy._metadata_names = self._metadata_names.copy()
+        for metadata_name, metadata_index in self._metadata_names.items():
+            copy._metadata_counts[metadata_name] = sum(1 for metadata in copy._positions.values()
+                                                       if metadata_index < len(metadata)
+                                                       and metadata[metadata_index] is not None)
+        for metadata_name, count in list(copy._metadata_counts.items()):
+            if count == 0:
+                copy.delete_data_with_name(metadata_name)
+        return copy
+
     def _move_in_time(self, time_point_offset: int):
         """Must only be called from PositionCollection, otherwise the indexing is wrong."""
         new_dict = dict()
@@ -257,6 +277,51 @@ class PositionData:
         self._all_positions = dict()
         self._data_names_and_types = dict()
 
+    def __getstate__(self):
+        """Packs the positions of every time point into arrays, and the metadata into one column per data name. Columns
+        with only floats are packed into arrays as well. The metadata counts are recalculated when unpickling."""
+        time_points = list()
+        for time_point_number, data_of_time_point in self._all_positions.items():
+            coords_xyz, _ = _positions_to_arrays(list(data_of_time_point._positions.keys()))
+            columns = list()
+            for data_index in range(len(data_of_time_point._metadata_names)):
+                values = [data_of_position[data_index] if data_index < len(data_of_position) else None
+                          for data_of_position in data_of_time_point._positions.values()]
+                if all(type(value) is float or value is None for value in values):
+                    is_present = numpy.array([value is not None for value in values], dtype=bool)
+                    columns.append((numpy.array([0.0 if value is None else value for value in values],
+                                                dtype=numpy.float64), is_present))
+                else:
+                    columns.append(values)
+            time_points.append((time_point_number, coords_xyz, list(data_of_time_point._metadata_names.keys()),
+                                columns))
+        return {"time_points": time_points, "data_names_and_types": self._data_names_and_types,
+                "min_time_point_number": self._min_time_point_number,
+                "max_time_point_number": self._max_time_point_number}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self._all_positions = dict()
+        self._data_names_and_types = state["data_names_and_types"]
+        self._min_time_point_number = state["min_time_point_number"]
+        self._max_time_point_number = state["max_time_point_number"]
+        for time_point_number, coords_xyz, metadata_names, columns in state["time_points"]:
+            data_of_time_point = _MetadataAtTimepoint()
+            value_columns = list()
+            for metadata_name, column in zip(metadata_names, columns):
+                if isinstance(column, tuple):  # Packed floats
+                    values, is_present = column
+                    column = [value if present else None for value, present in zip(values.tolist(),
+                                                                                   is_present.tolist())]
+                value_columns.append(column)
+                data_of_time_point._metadata_names[metadata_name] = len(data_of_time_point._metadata_names)
+                data_of_time_point._metadata_counts[metadata_name] = sum(value is not None for value in column)
+            positions = _positions_from_arrays(coords_xyz, numpy.full(len(coords_xyz), time_point_number,
+                                                                      dtype=numpy.int64))
+            data_of_time_point._positions = {position: list(values) for position, values in
+                                             zip(positions, zip(*value_columns) if len(value_columns) > 0
+                                                 else ([] for _ in positions))}
+            self._all_positions[time_point_number] = data_of_time_point
+
     def _update_min_max_time_points_for_addition(self, new_time_point_number: int):
         """Bookkeeping: makes sure the min and max time points are updated when a new time point is added"""
         if self._min_time_point_number is None or new_time_point_number < self._min_time_point_number:
@@ -415,6 +480,30 @@ class PositionData:
         the_copy._data_names_and_types = self._data_names_and_types.copy()
         return the_copy
 
+    def copy_subset(self, positions: Iterable[Position]) -> "PositionData":
+        """Creates a copy of the metadata of only the given positions. Data names that are not used by any of these
+        positions are left out."""
+        by_time_point = defaultdict(list)
+        for position in positions:
+            by_time_point[position.time_point_number()].append(position)
+
+        the_copy = PositionData()
+        for time_point_number, positions_of_time_point in by_time_point.items():
+            data_of_time_point = self._all_positions.get(time_point_number)
+            if data_of_time_point is None:
+                continue
+            copied_data_of_time_point = data_of_time_point.copy_subset(positions_of_time_point)
+            if not copied_data_of_time_point.is_empty():
+                the_copy._all_positions[time_point_number] = copied_data_of_time_point
+
+        used_data_names = set()
+        for copied_data_of_time_point in the_copy._all_positions.values():
+            used_data_names.update(copied_data_of_time_point._metadata_names.keys())
+        the_copy._data_names_and_types = {data_name: data_type for data_name, data_type
+                                          in self._data_names_and_types.items() if data_name in used_data_names}
+        the_copy._recalculate_min_max_time_points()
+        return the_copy
+
     def find_all_positions_with_data(self, data_name: str) -> Iterable[Tuple[Position, DataType]]:
         """Gets a dictionary of all positions with the given data marker. Do not modify the returned dictionary."""
         for data_of_time_point in self._all_positions.values():
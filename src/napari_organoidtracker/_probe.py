@@ -0,0 +1,354 @@
+"""Quickly inspects .aut files without parsing them. By default, only the start of the file is read, which is enough to
+find the version tag (OrganoidTracker always writes that first). Optionally, the whole file is scanned to find all
+top-level keys and to count the number of time points, tracks and positions. Scanning only looks at brackets and
+strings, so no Python objects are created for the (many) numbers in the file.
+
+Only the standard library is used here, so that napari_get_reader can use this module."""
+
+import json
+import os
+import re
+from typing import BinaryIO, Dict, List, Optional
+
+from napari_organoidtracker._compression import open_aut_file
+
+SUPPORTED_VERSIONS = ("v1", "v2")
+
+# Binary files, see the _binary_format module
+BINARY_EXTENSION = ".autb"
+BINARY_MAGIC = b"OTAUTB\0\0"
+
+_CHUNK_SIZE = 1024 * 1024
+_DEFAULT_HEADER_SIZE = 64 * 1024
+
+# Matches a string (group 1 is None if the string doesn't end in this chunk) or a bracket
+_TOKEN_PATTERN = re.compile(rb'"(?:[^"\\]|\\.)*(")?|[{}\[\]]')
+_WHITESPACE = b" \t\r\n"
+
+# Only the keys up to this depth are decoded; deeper keys are never needed for counting
+_MAX_KEY_DEPTH = 3
+
+
+def _build_skip_pattern(max_nesting: int) -> "re.Pattern[bytes]":
+    """Builds a pattern that matches the remainder of a container (so everything after the opening bracket), as long
+    as it doesn't contain more than max_nesting levels of nested containers. This lets the regex engine skip over the
+    parts of the file we don't need, which is a lot faster than handling every token in Python.
+
+    The re module only supports atomic groups from Python 3.11, so they are emulated using a lookahead and a
+    backreference. Without them, a failed match (at the end of a chunk) would take exponential time."""
+    group_count = 0
+
+    def atomic(pattern: bytes) -> bytes:
+        nonlocal group_count
+        group_count += 1
+        name = b"a" + str(group_count).encode()
+        return b"(?=(?P<" + name + b">" + pattern + b"))(?P=" + name + b")"
+
+    def content(nesting: int) -> bytes:
+        alternatives = [atomic(rb'[^"{}\[\]]+'), atomic(rb'"(?:[^"\\]|\\.)*"')]
+        if nesting > 0:
+            alternatives.append(rb"[\[{]" + content(nesting - 1) + rb"[\]}]")
+        return atomic(b"(?:" + b"|".join(alternatives) + b")*")
+
+    return re.compile(content(max_nesting) + rb"[\]}]")
+
+
+_SKIP_PATTERN = _build_skip_pattern(3)
+_SKIP_WINDOW = 16 * 1024
+
+
+class AutFileSummary:
+    """What we know about an .aut file after probing it. If complete is False, only the start of the file was
+    scanned, so keys may be missing and the counts are None."""
+
+    file_size: int  # Size on disk, so compressed size for compressed files
+    version: Optional[str]  # Raw value of the version tag, or None if not found
+    keys: List[str]  # Top-level keys, in file order
+    complete: bool  # Whether the whole file was scanned
+
+    # Only available when counting, and only for the formats where they can be derived from the structure
+    time_point_count: Optional[int]
+    track_count: Optional[int]
+    position_count: Optional[int]
+    link_count: Optional[int]
+
+    def __init__(self, file_size: int):
+        self.file_size = file_size
+        self.version = None
+        self.keys = list()
+        self.complete = False
+        self.time_point_count = None
+        self.track_count = None
+        self.position_count = None
+        self.link_count = None
+
+    def get_version(self) -> Optional[str]:
+        """Gets the version of the file format. Files without a version tag are v1 files, but that can only be known
+        for sure if the whole file was scanned."""
+        if self.version is not None:
+            return self.version
+        if self.complete and "family_scores" in self.keys:
+            return "v1"
+        return None
+
+    def is_supported(self) -> Optional[bool]:
+        """Returns True if the reader supports this file, False if not, or None if we cannot know that without scanning
+        more of the file."""
+        if self.version is not None:
+            return self.version in SUPPORTED_VERSIONS
+        if self.complete:
+            return "family_scores" in self.keys
+        return None
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"file_size": self.file_size, "version": self.get_version(), "keys": self.keys,
+                "complete": self.complete, "time_point_count": self.time_point_count,
+                "track_count": self.track_count, "position_count": self.position_count,
+                "link_count": self.link_count}
+
+    def __repr__(self) -> str:
+        return f"AutFileSummary({self.to_dict()})"
+
+
+class _StructureScanner:
+    """Follows the nesting of the JSON document, one chunk of bytes at a time."""
+
+    _summary: AutFileSummary
+    _count: bool
+    _depth: int  # Number of currently open containers
+    _keys_by_depth: List[Optional[str]]  # Last seen key for the object at every depth
+    _pending: bytes  # Unfinished token from the previous chunk
+    _pending_key: Optional[bytes]  # String at the end of the previous chunk, which may turn out to be a key
+    _expecting_version: bool  # Whether the next string is the value of the version tag
+    _counters: Dict[str, int]
+    started: bool
+
+    def __init__(self, summary: AutFileSummary, count: bool):
+        self._summary = summary
+        self._count = count
+        self._depth = 0
+        self._keys_by_depth = [None] * (_MAX_KEY_DEPTH + 2)
+        self._pending = b""
+        self._pending_key = None
+        self._expecting_version = False
+        self._counters = {"time_points": 0, "tracks": 0, "positions": 0, "links": 0}
+        self.started = False
+
+    def feed(self, chunk: bytes) -> bool:
+        """Scans the chunk. Returns False if the data is not a JSON object, which means that it is not an .aut file."""
+        chunk = self._pending + chunk
+        self._pending = b""
+        if not self.started:
+            stripped = chunk.lstrip(_WHITESPACE)
+            if len(stripped) == 0:
+                return True
+            if not stripped.startswith(b"{"):
+                return False
+            self.started = True
+
+        chunk_length = len(chunk)
+        if self._pending_key is not None:
+            start = len(chunk) - len(chunk.lstrip(_WHITESPACE))
+            if start == chunk_length:
+                return True  # Still don't know what follows the string
+            self._handle_possible_key(self._pending_key, chunk, start)
+            self._pending_key = None
+
+        keys_by_depth = self._keys_by_depth
+        index = 0
+        while True:
+            match = _TOKEN_PATTERN.search(chunk, index)
+            if match is None:
+                return True
+            index = match.end()
+            first_byte = chunk[match.start()]
+            if first_byte == 0x22:  # A string
+                if match.group(1) is None:
+                    # String continues in the next chunk
+                    self._pending = chunk[match.start():]
+                    return True
+                if self._depth <= _MAX_KEY_DEPTH:
+                    end = index
+                    while end < chunk_length and chunk[end] in _WHITESPACE:
+                        end += 1
+                    if end == chunk_length:
+                        self._pending_key = match.group()  # Need the next chunk to see whether a colon follows
+                    else:
+                        self._handle_possible_key(match.group(), chunk, end)
+            elif first_byte == 0x7B or first_byte == 0x5B:  # { or [
+                self._expecting_version = False
+                if self._count:
+                    self._count_container()
+                self._depth += 1
+                if self._depth <= _MAX_KEY_DEPTH:
+                    keys_by_depth[self._depth] = None
+                if self._can_skip_content():
+                    # Containers at low depths can be large, so we don't look too far ahead for those. Otherwise, if the
+                    # container doesn't end in this chunk, we would be scanning the rest of the chunk for nothing
+                    end = chunk_length if self._depth > _MAX_KEY_DEPTH else min(chunk_length, index + _SKIP_WINDOW)
+                    skip_match = _SKIP_PATTERN.match(chunk, index, end)
+                    if skip_match is not None:
+                        if self._count and self._contains_positions():
+                            self._counters["positions"] += chunk.count(b"[", index, skip_match.end())
+                        index = skip_match.end()
+                        self._depth -= 1
+            else:  # } or ]
+                self._depth -= 1
+
+    def _handle_possible_key(self, token: bytes, chunk: bytes, index_after_token: int):
+        if index_after_token >= len(chunk) or chunk[index_after_token] != 0x3A:  # Not followed by a colon
+            if self._expecting_version and self._depth == 1:
+                self._summary.version = json.loads(token)
+            self._expecting_version = False
+            return
+        key = json.loads(token)
+        self._keys_by_depth[self._depth] = key
+        self._expecting_version = False
+        if self._depth == 1:
+            self._summary.keys.append(key)
+            self._expecting_version = key == "version"
+
+    def _count_container(self):
+        """Called for every opening bracket, before the depth is increased."""
+        depth = self._depth
+        if depth < 2:
+            return
+        top_level_key = self._keys_by_depth[1]
+        counters = self._counters
+        if top_level_key in ("positions", "shapes"):
+            if self._summary.version == "v2":
+                if depth == 2:
+                    counters["time_points"] += 1
+                elif depth == 4 and self._keys_by_depth[3] == "coords_xyz_px":
+                    counters["positions"] += 1
+            else:
+                if depth == 2:
+                    counters["time_points"] += 1
+                elif depth == 3:
+                    counters["positions"] += 1
+        elif top_level_key == "tracks":
+            if depth == 2:
+                counters["tracks"] += 1
+        elif top_level_key in ("links", "links_scratch", "links_baseline"):
+            if depth == 3 and self._keys_by_depth[2] == "links":
+                counters["links"] += 1
+
+    def _can_skip_content(self) -> bool:
+        """Checks whether we can skip over the contents of the container that was just opened, because we don't need to
+        look at the individual tokens inside it."""
+        depth = self._depth
+        if depth <= 2:
+            return False
+        if not self._count or depth >= 4:
+            return True
+        top_level_key = self._keys_by_depth[1]
+        if top_level_key in ("positions", "shapes"):
+            return self._summary.version != "v2"  # Skip over position lists, but not over the time point objects of v2
+        return top_level_key not in ("links", "links_scratch", "links_baseline")
+
+    def _contains_positions(self) -> bool:
+        """Checks whether the container that was just opened is a list of positions."""
+        if self._keys_by_depth[1] not in ("positions", "shapes"):
+            return False
+        if self._summary.version == "v2":
+            return self._depth == 4 and self._keys_by_depth[3] == "coords_xyz_px"
+        return self._depth == 3
+
+    def finish(self):
+        summary = self._summary
+        summary.complete = True
+        if not self._count:
+            return
+        counters = self._counters
+        if any(key in summary.keys for key in ("positions", "shapes")):
+            summary.time_point_count = counters["time_points"]
+            summary.position_count = counters["positions"]
+        if "tracks" in summary.keys:
+            summary.track_count = counters["tracks"]
+        if any(key in summary.keys for key in ("links", "links_scratch", "links_baseline")):
+            summary.link_count = counters["links"]
+
+
+def probe_aut_file(file_path: str, *, scan_all_keys: bool = False, count: bool = False,
+                   header_size: int = _DEFAULT_HEADER_SIZE) -> Optional[AutFileSummary]:
+    """Probes the given file. By default, reading stops once the version tag has been found, or after header_size
+    bytes. If scan_all_keys is True, the whole file is scanned to find all top-level keys. If count is True, the whole
+    file is scanned and the number of time points, positions, tracks (v2 only) and links (v1 only) are counted.
+
+    Returns None if the file is not a JSON object, so certainly not an .aut file. Raises OSError if the file cannot be
+    read."""
+    with open_aut_file(file_path) as handle:
+        return _probe_handle(handle, os.path.getsize(file_path), scan_all_keys=scan_all_keys or count, count=count,
+                             header_size=header_size)
+
+
+def _probe_handle(handle: BinaryIO, file_size: int, *, scan_all_keys: bool, count: bool,
+                  header_size: int) -> Optional[AutFileSummary]:
+    summary = AutFileSummary(file_size)
+    scanner = _StructureScanner(summary, count)
+    bytes_read = 0
+    while True:
+        chunk_size = _CHUNK_SIZE if scan_all_keys else min(_CHUNK_SIZE, header_size - bytes_read)
+        if chunk_size <= 0:
+            return summary  # Header is exhausted
+        chunk = handle.read(chunk_size)
+        if len(chunk) == 0:
+            if not scanner.started:
+                return None  # Empty file
+            scanner.finish()
+            return summary
+        bytes_read += len(chunk)
+        if not scanner.feed(chunk):
+            return None
+        if not scan_all_keys and summary.version is not None:
+            return summary  # Found what we were looking for
+
+
+_VERSION_OR_FAMILY_SCORES_KEY = re.compile(rb'"(?:version|family_scores)"\s*:')
+
+
+def _may_be_supported(handle: BinaryIO) -> bool:
+    """Checks whether the key "version" or "family_scores" occurs anywhere in the file. If not, the file certainly is
+    not a general tracking file. (Note that a match doesn't prove that the key is at the top level.) This is a lot
+    faster than scanning the structure, as it runs completely in the regex engine."""
+    overlap = b""
+    while True:
+        chunk = handle.read(_CHUNK_SIZE)
+        if len(chunk) == 0:
+            return False
+        data = overlap + chunk
+        if _VERSION_OR_FAMILY_SCORES_KEY.search(data) is not None:
+            return True
+        overlap = data[-32:]
+
+
+def check_supported(file_path: str):
+    """Raises ValueError if the file is certainly not supported by the reader, without parsing it. The check is cheap
+    for files with a version tag; for other files, the file is searched for the family_scores key."""
+    with open_aut_file(file_path) as handle:
+        summary = _probe_handle(handle, os.path.getsize(file_path), scan_all_keys=False, count=False,
+                                header_size=_DEFAULT_HEADER_SIZE)
+    if summary is None:
+        raise ValueError("Unknown file format", "This plugin is not able to load this AUT file: it is not a JSON"
+                                                " object.")
+    supported = summary.is_supported()
+    if supported is None:
+        with open_aut_file(file_path) as handle:  # Not all decompressors can seek back to the start
+            supported = _may_be_supported(handle)
+        if not supported:
+            raise ValueError("Unknown file format", "This plugin is not able to load this AUT file: it is missing"
+                                                    " the version tag.")
+    elif not supported:
+        raise ValueError("Unknown data version", "This plugin is not able to load data of version "
+                         + str(summary.version) + ".")
+
+
+def is_binary_aut_file(file_path: str) -> bool:
+    """Checks whether the file is a binary .autb file, by looking at the first few bytes."""
+    if not file_path.endswith(BINARY_EXTENSION):
+        return False
+    try:
+        with open(file_path, "rb") as handle:
+            return handle.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+    except OSError:
+        return False
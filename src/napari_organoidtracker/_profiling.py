@@ -0,0 +1,152 @@
+"""Opt-in instrumentation of the reader pipeline. Set the NAPARI_ORGANOIDTRACKER_PROFILE environment variable to 1 (or
+pass profile=True to reader_function) to record the wall time, CPU time, change in the number of allocated memory
+blocks and the tracemalloc peak of every stage of loading a file. The number of allocated blocks
+(sys.getallocatedblocks) follows the number of live objects closely, but unlike counting the objects it doesn't need
+to walk the whole heap. The report is logged as a short summary line (level INFO) and as JSON (level DEBUG) to the
+"napari_organoidtracker" logger.
+
+When profiling is not active, the stage() context manager does nothing, so it is cheap to leave in the code."""
+
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+_logger = logging.getLogger("napari_organoidtracker")
+
+_ENVIRONMENT_VARIABLE = "NAPARI_ORGANOIDTRACKER_PROFILE"
+
+
+class _StageFrame:
+    """Bookkeeping for a stage that is currently running."""
+
+    name: str
+    start_wall_time: float
+    start_cpu_time: float
+    start_allocated_blocks: int
+    start_traced_memory: int
+    peak_traced_memory: int  # Highest peak seen in nested stages, as those reset the tracemalloc peak
+
+    def __init__(self, name: str, start_allocated_blocks: int, start_traced_memory: int):
+        self.name = name
+        self.start_allocated_blocks = start_allocated_blocks
+        self.start_traced_memory = start_traced_memory
+        self.peak_traced_memory = start_traced_memory
+        self.start_wall_time = time.perf_counter()
+        self.start_cpu_time = time.process_time()
+
+
+class ProfilingReport:
+    """The measurements of all stages. Stages that run multiple times (like parsing the metadata of every time point)
+    are combined into one entry."""
+
+    _stages: Dict[str, Dict[str, Any]]
+    _running: List[_StageFrame]
+
+    def __init__(self):
+        self._stages = dict()
+        self._running = list()
+
+    def _start_stage(self, name: str):
+        allocated_blocks = sys.getallocatedblocks()
+        current_memory, peak_memory = tracemalloc.get_traced_memory()
+        if len(self._running) > 0:
+            parent = self._running[-1]
+            parent.peak_traced_memory = max(parent.peak_traced_memory, peak_memory)
+        tracemalloc.reset_peak()
+        if name not in self._stages:
+            self._stages[name] = {"name": name, "depth": len(self._running), "calls": 0, "wall_time_s": 0.0,
+                                  "cpu_time_s": 0.0, "allocated_blocks_delta": 0, "tracemalloc_peak_bytes": 0}
+        self._running.append(_StageFrame(name, allocated_blocks, current_memory))
+
+    def _end_stage(self):
+        end_wall_time = time.perf_counter()
+        end_cpu_time = time.process_time()
+        frame = self._running.pop()
+        peak_memory = max(frame.peak_traced_memory, tracemalloc.get_traced_memory()[1])
+        allocated_blocks = sys.getallocatedblocks()
+        if len(self._running) > 0:
+            parent = self._running[-1]
+            parent.peak_traced_memory = max(parent.peak_traced_memory, peak_memory)
+
+        stage = self._stages[frame.name]
+        stage["calls"] += 1
+        stage["wall_time_s"] += end_wall_time - frame.start_wall_time
+        stage["cpu_time_s"] += end_cpu_time - frame.start_cpu_time
+        stage["allocated_blocks_delta"] += allocated_blocks - frame.start_allocated_blocks
+        stage["tracemalloc_peak_bytes"] = max(stage["tracemalloc_peak_bytes"],
+                                              peak_memory - frame.start_traced_memory)
+
+    def stages(self) -> List[Dict[str, Any]]:
+        """Gets all measured stages, in the order in which they were first started. The depth is the number of stages
+        the stage was nested in."""
+        return list(self._stages.values())
+
+    def get_stage(self, name: str) -> Optional[Dict[str, Any]]:
+        """Gets the measurements of the given stage, or None if that stage never ran."""
+        return self._stages.get(name)
+
+    def to_json(self) -> str:
+        return json.dumps({"stages": self.stages()})
+
+    def summary(self) -> str:
+        """Gets a single line with the wall time of every stage."""
+        return "Profile: " + ", ".join(f"{stage['name']} {stage['wall_time_s']:.3f}s" for stage in self.stages())
+
+
+_active_report: Optional[ProfilingReport] = None
+_last_report: Optional[ProfilingReport] = None
+
+
+def is_profiling_requested() -> bool:
+    """Checks whether profiling was turned on using the environment variable."""
+    return os.environ.get(_ENVIRONMENT_VARIABLE, "").lower() in ("1", "true", "yes", "on")
+
+
+def get_last_report() -> Optional[ProfilingReport]:
+    """Gets the report of the last profiled run, or None if nothing was profiled yet."""
+    return _last_report
+
+
+@contextmanager
+def profile() -> Iterator[ProfilingReport]:
+    """Profiles all stages that run inside this context. Afterwards, the report is logged. If profiling is already
+    active, the stages are added to the existing report instead."""
+    global _active_report, _last_report
+    if _active_report is not None:
+        yield _active_report
+        return
+
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    report = ProfilingReport()
+    _active_report = report
+    try:
+        yield report
+    finally:
+        _active_report = None
+        _last_report = report
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _logger.info(report.summary())
+        _logger.debug(report.to_json())
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Measures the code inside this context as the given stage. Does nothing if profiling is not active."""
+    report = _active_report
+    if report is None:
+        yield
+        return
+
+    report._start_stage(name)
+    try:
+        yield
+    finally:
+        report._end_stage()
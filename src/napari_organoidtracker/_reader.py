@@ -4,17 +4,15 @@ This module is an example of a barebones numpy reader plugin for napari.
 It implements the Reader specification, but your plugin may choose to
 implement multiple readers or even other plugin contributions. see:
 https://napari.org/stable/plugins/guides.html?#readers
-"""
 
-import json
-from typing import Any, Dict, List
+Only the standard library is imported here: napari calls napari_get_reader
+for every file that is opened, so that needs to be fast. Only the start of
+the file is read to check its version. The parsing modules are imported once
+reader_function runs.
+"""
 
-from napari_organoidtracker import _experiment
-from napari_organoidtracker._basics import TimePoint
-from napari_organoidtracker._experiment import Experiment
-from napari_organoidtracker._links import Links, LinkingTrack
-from napari_organoidtracker._position import Position
-from napari_organoidtracker._position_data import PositionData
+from functools import partial
+from typing import Iterable, Optional, Tuple
 
 
 def napari_get_reader(path):
@@ -37,15 +35,55 @@ def napari_get_reader(path):
         # so we are only going to look at the first file.
         path = path[0]
 
-    # if we know we cannot read the file, we immediately return None.
-    if not path.endswith(".aut"):
+    # directories are read as a set of shards, see the _shards module
+    import os
+    if os.path.isdir(path):
+        from napari_organoidtracker._shards import find_shard_files
+        return reader_function if len(find_shard_files(path)) > 0 else None
+
+    # binary files are recognized by their first few bytes
+    from napari_organoidtracker._probe import BINARY_EXTENSION, is_binary_aut_file
+    if path.endswith(BINARY_EXTENSION):
+        return reader_function if is_binary_aut_file(path) else None
+
+    # if we know we cannot read the file, we immediately return None, without opening it.
+    from napari_organoidtracker._compression import is_aut_file_name
+    if not is_aut_file_name(path):
+        return None
+
+    # look at the start of the file, so that we can refuse files we don't support (or can't open)
+    from napari_organoidtracker._probe import probe_aut_file
+    try:
+        summary = probe_aut_file(path)
+    except OSError:
+        return None
+    if summary is None or summary.is_supported() is False:
         return None
 
     # otherwise we return the *function* that can read ``path``.
     return reader_function
 
 
-def reader_function(input_path):
+def napari_get_reader_with_events(path):
+    """Like napari_get_reader, but the returned function also adds points layers for all cell divisions, track starts
+    and track ends."""
+    if napari_get_reader(path) is None:
+        return None
+    return partial(reader_function, event_layers=True)
+
+
+def napari_get_reader_with_motion_features(path):
+    """Like napari_get_reader, but the returned function also adds the velocity, speed and other motion features of
+    every position to the tracks layer."""
+    if napari_get_reader(path) is None:
+        return None
+    return partial(reader_function, motion_features=True)
+
+
+def reader_function(input_path, *, event_layers: bool = False, overview_step: Optional[int] = None,
+                    profile: Optional[bool] = None, json_backend: Optional[str] = None,
+                    time_range: Optional[Tuple[int, int]] = None, metadata_keys: Optional[Iterable[str]] = None,
+                    use_cache: bool = True, motion_features: bool = False):
     """Take a path or list of paths and return a list of LayerData tuples.
 
     Readers are expected to return data as a list of tuples, where each tuple
@@ -66,171 +104,99 @@ def reader_function(input_path):
         in napari, and layer_type is a lower-case string naming the type of
         layer. Both "meta", and "layer_type" are optional. napari will
         default to layer_type=="image" if not provided
+
+    If event_layers is True, then for every file also points layers are
+    returned for the cell divisions, track starts and track ends. If
+    overview_step is set, a lightweight overview tracks layer is returned
+    instead of the full-resolution one, see
+    _experiment._experiment_to_napari. If motion_features is True, the
+    velocity, speed, displacement, mean squared displacement, age and time
+    until division of every position are added as features, see the _motion
+    module.
+
+    If profile is True, the time and memory used by every stage of loading
+    is measured and logged, see the _profiling module. If profile is None,
+    this is controlled by the NAPARI_ORGANOIDTRACKER_PROFILE environment
+    variable.
+
+    If a path is a directory, all .aut files in it are read in parallel and
+    combined into a single tracks layer, see the _shards module.
+
+    Files that were opened before in this session are returned from an
+    in-memory cache, unless use_cache is False, the file has changed since, or
+    profiling is active. Every call returns its own copy of the layers. See
+    the _cache module.
+
+    Binary .autb files (see the _binary_format module) are memory-mapped, and
+    the tracks layer data is then a view of the file.
+
+    The JSON backend ("json", "orjson" or "simdjson") can be selected using
+    json_backend, see the _json_backend module. By default, the fastest
+    installed backend is used.
+
+    To load only part of a file, pass time_range (the first and last time
+    point number to load, both inclusive) and/or metadata_keys (the position
+    metadata to load). Tracks are then cut at the edges of the time range.
+    This is not supported for binary files, as those are already mapped into
+    memory instead of being parsed.
     """
+    import os
+    from contextlib import nullcontext
+
+    from napari_organoidtracker import _cache, _profiling
+    from napari_organoidtracker._probe import BINARY_EXTENSION
+
     # handle both a string and a list of strings
     paths = [input_path] if isinstance(input_path, str) else input_path
 
+    if profile is None:
+        profile = _profiling.is_profiling_requested()
+
     return_list = []
-    for path in paths:
-        experiment = _read_organoidtracker_file(path)
-        return_list += _experiment._experiment_to_napari(experiment)
+    with _profiling.profile() if profile else nullcontext(), _profiling.stage("reader_function"):
+        for path in paths:
+            if path.endswith(BINARY_EXTENSION):
+                if time_range is not None or metadata_keys is not None:
+                    raise ValueError(f"Selective loading is not supported for binary files: {path}")
+                # Binary files are converted to layers directly, without creating an Experiment
+                from napari_organoidtracker._binary_format import _binary_file_to_napari
+                return_list += _binary_file_to_napari(path, event_layers=event_layers, overview_step=overview_step,
+                                                      motion_features=motion_features)
+                continue
+            if os.path.isdir(path):
+                from napari_organoidtracker._shards import read_shard_directory
+                experiment = read_shard_directory(path, json_backend=json_backend, time_range=time_range,
+                                                  metadata_keys=metadata_keys)
+            elif use_cache and not profile and _cache.get_cache().is_enabled():
+                key = (_cache.get_file_key(path), time_range, None if metadata_keys is None else tuple(metadata_keys))
+                return_list += _cache.get_cache().get_layers(
+                    key, (event_layers, overview_step, motion_features),
+                    read_experiment=partial(_read_experiment, path, json_backend=json_backend, time_range=time_range,
+                                            metadata_keys=metadata_keys),
+                    create_layers=partial(_experiment_to_napari, event_layers=event_layers, overview_step=overview_step,
+                                          motion_features=motion_features))
+                continue
+            else:
+                experiment = _read_experiment(path, json_backend=json_backend, time_range=time_range,
+                                              metadata_keys=metadata_keys)
+            return_list += _experiment_to_napari(experiment, event_layers=event_layers, overview_step=overview_step,
+                                                 motion_features=motion_features)
     return return_list
 
 
-def _read_organoidtracker_file(filepath) -> Experiment:
-    """Read a .aut file and return the data as a parsed Experiment object.
-    """
-    experiment = Experiment()
-
-    with open(filepath) as handle:
-        data = json.load(handle)
-
-    if "version" not in data and "family_scores" not in data:
-        # We don't have a general data file, but a specialized one
-        raise ValueError(
-            "Unknown file format",
-            "This plugin is not able to load this AUT file: it is missing the version tag.",
-        )
-
-    version = data.get("version", "v1")
-    if version == "v1":
-        if "shapes" in data:
-            # Deprecated, nowadays stored in "positions"
-            _parse_simple_position_format(experiment, data["shapes"])
-        elif "positions" in data:
-            _parse_simple_position_format(experiment, data["positions"])
-
-        if "links" in data:
-            _parse_d3_links_format(experiment, data["links"])
-        elif "links_scratch" in data:  # Deprecated, was used back when experiments could hold multiple linking sets
-            _parse_d3_links_format(experiment, data["links_scratch"])
-        elif "links_baseline" in data:  # Deprecated, was used back when experiments could hold multiple linking sets
-            _parse_d3_links_format(experiment, data["links_baseline"])
-    elif version == "v2":
-        if "positions" in data:
-            _parse_positions_and_meta_format(experiment, data["positions"])
-        _parse_tracks_and_meta_format(experiment, data["tracks"])
-    else:
-        raise ValueError(
-            "Unknown data version",
-            "This plugin is not able to load data of version " + str(data["version"]) + ".",
-        )
-
-    return experiment
-
-
-def _parse_d3_links_format(experiment: Experiment, links_json: Dict[str, Any]):
-    """Parses a node_link_graph and adds all links and positions to the experiment."""
-    links = Links()
-    position_data = PositionData()
-    _add_d3_data(position_data, links, links_json)
-    links.sort_tracks_by_x()
-    experiment.position_data = position_data
-    experiment.links = links
-
-
-def _add_d3_data(position_data: PositionData, links: Links, links_json: Dict):
-    """Adds data in the D3.js node-link format. Used for deserialization."""
-
-    # Add position data
-    for node in links_json["nodes"]:
-        if len(node.keys()) == 1:
-            # No extra data found
-            continue
-        position = _parse_position(node["id"])
-        for data_key, data_value in node.items():
-            if data_key == "id":
-                continue
-            position_data.set_position_data(position, data_key, data_value)
-
-    # Add links
-    for link in links_json["links"]:
-        source = _parse_position(link["source"])
-        target = _parse_position(link["target"])
-        links.add_link(source, target)
-
-        # Now that we have a link, we can add link and lineage data
-        for data_key, data_value in link.items():
-            if data_key.startswith("__lineage_"):
-                # Lineage metadata, store it
-                links.set_lineage_data(links.get_track(source), data_key[len("__lineage_"):], data_value)
-
-
-def _parse_position(json_structure: Dict[str, Any]) -> Position:
-    if "_time_point_number" in json_structure:
-        return Position(
-            json_structure["x"],
-            json_structure["y"],
-            json_structure["z"],
-            time_point_number=json_structure["_time_point_number"],
-        )
-    return Position(json_structure["x"], json_structure["y"], json_structure["z"])
-
-
-def _parse_simple_position_format(experiment: Experiment, json_structure: Dict[str, List]):
-    positions = experiment.positions
-
-    for time_point_number, raw_positions in json_structure.items():
-        time_point_number = int(time_point_number)  # str -> int
-
-        for raw_position in raw_positions:
-            position = Position(*raw_position[0:3], time_point_number=time_point_number)
-            positions.add(position)
-
-
-def _parse_positions_and_meta_format(experiment: Experiment, positions_json: List[Dict]):
-    positions = experiment.positions
-
-    for time_point_json in positions_json:
-        time_point_number = time_point_json["time_point"]
-
-        has_meta = "position_meta" in time_point_json
-        positions_of_time_point = list() if has_meta else None
-        for raw_position in time_point_json["coords_xyz_px"]:
-            position = Position(*raw_position, time_point_number=time_point_number)
-            positions.add(position)
-            if positions_of_time_point is not None:
-                positions_of_time_point.append(position)
-
-        if has_meta:
-            experiment.position_data.add_data_from_time_point_dict(TimePoint(time_point_number), positions_of_time_point,
-                                                                   time_point_json["position_meta"])
-
-
-def _parse_tracks_and_meta_format(experiment: Experiment, tracks_json: List[Dict]):
-    links = experiment.links
-
-    # Iterate a first time to add the tracks
-    for track_json in tracks_json:
-        time_point_number_start = track_json["time_point_start"]
-        time_point_number_end = time_point_number_start + len(track_json["coords_xyz_px"]) - 1
-
-        coords_xyz_px = track_json["coords_xyz_px"]
-        positions_of_track = list()
-        min_index = 0
-        max_index = len(coords_xyz_px) - 1
-        for i in range(min_index, max_index + 1):
-            position = Position(*coords_xyz_px[i], time_point_number=time_point_number_start + i)
-            positions_of_track.append(position)
-        track = LinkingTrack(positions_of_track)
-        links.add_track(track)
-
-        # Handle lineage metadata
-        if "lineage_meta" in track_json:
-            for metadata_key, metadata_value in track_json["lineage_meta"].items():
-                links.set_lineage_data(track, metadata_key, metadata_value)
-
-    # Iterate again to add connections to previous tracks
-    for track_json in tracks_json:
-        if "coords_xyz_px_before" not in track_json:
-            continue
-        time_point_number_start = track_json["time_point_start"]
-
-        position_first = Position(*track_json["coords_xyz_px"][0], time_point_number=time_point_number_start)
-        for i, raw_position in enumerate(track_json["coords_xyz_px_before"]):
-            # Connect the tracks
-            position_previous_track = Position(*raw_position, time_point_number=time_point_number_start - 1)
-            previous_track = links.get_track(position_previous_track)
-            current_track = links.get_track(position_first)
-            links.connect_tracks(previous=previous_track, next=current_track)
+def _read_experiment(path: str, **kwargs):
+    """Reads an .aut file as an Experiment, see _aut_parser._read_organoidtracker_file."""
+    from napari_organoidtracker import _profiling
+    from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+
+    with _profiling.stage("read_organoidtracker_file"):
+        return _read_organoidtracker_file(path, **kwargs)
+
+
+def _experiment_to_napari(experiment, **kwargs):
+    """Creates the napari layers of an Experiment, see _experiment._experiment_to_napari."""
+    from napari_organoidtracker import _profiling
+    from napari_organoidtracker._experiment import _experiment_to_napari
 
+    with _profiling.stage("experiment_to_napari"):
+        return _experiment_to_napari(experiment, **kwargs)
@@ -0,0 +1,51 @@
+"""Selective loading of .aut files. Often only a few time points, or a few metadata keys, of a large file are needed.
+A DataSelection describes that part, and the parser (and the simdjson backend, see the _json_backend module) then skip
+everything else. Tracks that cross the edges of the time range are cut, and links to positions outside the time range
+are dropped.
+
+Only the standard library is used here, so that this module can be imported by the JSON backends."""
+
+from typing import Iterable, Optional, Tuple
+
+
+class DataSelection:
+    """The part of a file that must be loaded. The time range includes both the first and the last time point. If a
+    field is None, everything is loaded."""
+
+    time_range: Optional[Tuple[int, int]]
+    metadata_keys: Optional[frozenset]
+
+    def __init__(self, *, time_range: Optional[Tuple[int, int]] = None, metadata_keys: Optional[Iterable[str]] = None):
+        if time_range is not None:
+            first, last = int(time_range[0]), int(time_range[1])
+            if last < first:
+                raise ValueError(f"Empty time range: {time_range}")
+            time_range = (first, last)
+        self.time_range = time_range
+        self.metadata_keys = frozenset(metadata_keys) if metadata_keys is not None else None
+
+    def is_everything(self) -> bool:
+        """Checks whether the whole file is selected."""
+        return self.time_range is None and self.metadata_keys is None
+
+    def contains_time_point(self, time_point_number: int) -> bool:
+        if self.time_range is None:
+            return True
+        return self.time_range[0] <= time_point_number <= self.time_range[1]
+
+    def overlaps_time_points(self, first_time_point_number: int, last_time_point_number: int) -> bool:
+        """Checks whether any time point from first to last (inclusive) is selected."""
+        if self.time_range is None:
+            return True
+        return first_time_point_number <= self.time_range[1] and last_time_point_number >= self.time_range[0]
+
+    def contains_metadata_key(self, metadata_key: str) -> bool:
+        if self.metadata_keys is None:
+            return True
+        return metadata_key in self.metadata_keys
+
+    def __repr__(self) -> str:
+        return f"DataSelection(time_range={self.time_range!r}, metadata_keys={self.metadata_keys!r})"
+
+
+EVERYTHING = DataSelection()
@@ -0,0 +1,108 @@
+"""Reader for tracking data that is split over multiple files (shards), for example one file per block of time points.
+All .aut files (optionally compressed) in a directory are parsed in parallel, and then combined into one experiment.
+
+Tracks that continue from one shard into the next are stitched together using the coords_xyz_px_before links of the
+v2 format: those point to positions in the previous shard, which are connected once all shards have been parsed. For
+this, the shards must not share any time points.
+
+Like the _reader module, only the standard library is imported at first, so that napari can quickly check whether a
+directory contains shards."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Tuple
+
+from napari_organoidtracker._compression import is_aut_file_name
+
+
+def find_shard_files(directory: str) -> List[str]:
+    """Gets the paths of all .aut files in the directory, sorted by name. Hidden files are ignored. Returns an empty
+    list if the directory doesn't exist."""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return []
+    return sorted(entry.path for entry in entries
+                  if not entry.name.startswith(".") and is_aut_file_name(entry.name) and entry.is_file())
+
+
+def _read_shard(file_path: str, json_backend: Optional[str], time_range: Optional[Tuple[int, int]],
+                metadata_keys: Optional[List[str]]):
+    """Reads a single shard. Returns the experiment, and the links to positions in other shards. Runs in a worker
+    process, so everything must be picklable."""
+    from napari_organoidtracker import _json_backend, _probe
+    from napari_organoidtracker._aut_parser import _parse_organoidtracker_data
+    from napari_organoidtracker._compression import open_aut_file
+    from napari_organoidtracker._selection import DataSelection
+
+    selection = DataSelection(time_range=time_range, metadata_keys=metadata_keys)
+    _probe.check_supported(file_path)
+    backend = _json_backend.get_backend(json_backend)
+    with open_aut_file(file_path) as handle:
+        data = backend.decode(handle.read(), selection)
+    dangling_links = list()
+    experiment = _parse_organoidtracker_data(data, selection, dangling_links=dangling_links)
+    return experiment, dangling_links
+
+
+def read_shard_directory(directory: str, *, json_backend: Optional[str] = None,
+                         time_range: Optional[Tuple[int, int]] = None, metadata_keys: Optional[Iterable[str]] = None,
+                         max_workers: Optional[int] = None):
+    """Reads all shards in the directory into one Experiment. The shards are parsed in parallel using max_workers
+    processes (by default, one per CPU). With max_workers=1, everything is parsed in the current process. See
+    _aut_parser._read_organoidtracker_file for the other parameters."""
+    from napari_organoidtracker import _profiling
+    from napari_organoidtracker._experiment import Experiment
+
+    file_paths = find_shard_files(directory)
+    if len(file_paths) == 0:
+        raise ValueError(f"No .aut files found in {directory}")
+    if metadata_keys is not None:
+        metadata_keys = list(metadata_keys)  # Make sure it can be sent to the worker processes
+
+    with _profiling.stage("read_shards"):
+        arguments = [(file_path, json_backend, time_range, metadata_keys) for file_path in file_paths]
+        if max_workers == 1 or len(file_paths) == 1:
+            results = [_read_shard(*argument) for argument in arguments]
+        else:
+            with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count() or 1, len(file_paths))) as pool:
+                results = list(pool.map(_read_shard, *zip(*arguments)))
+
+    with _profiling.stage("stitch_shards"):
+        # Sort by time, so that the track order is the same as for a single file. The file paths are sorted along, so
+        # that errors mention the right file
+        shards = sorted(zip(file_paths, results), key=lambda pair: _first_time_point_number(pair[1][0]))
+        experiment = Experiment()
+        dangling_links = list()
+        for file_path, (shard, shard_dangling_links) in shards:
+            _check_no_shared_time_points(experiment, shard, file_path)
+            experiment.positions.add_positions(shard.positions)
+            experiment.position_data.merge_data(shard.position_data)
+            # As the shards don't share time points, they don't share tracks either. (Except in the v1 format, where the
+            # links of a shard can include positions of the previous shard. Then the links are added one by one.)
+            experiment.links.add_disjoint_links(shard.links)
+            dangling_links += shard_dangling_links
+
+        links = experiment.links
+        for position_previous, position_first in dangling_links:
+            if links.get_track(position_previous) is None:
+                continue  # Points to a position that is in no shard (or outside the selected time range)
+            links.add_link(position_previous, position_first)
+    return experiment
+
+
+def _first_time_point_number(experiment) -> float:
+    first_time_point_number = experiment.positions.first_time_point_number()
+    if first_time_point_number is None:
+        return float("inf")  # Empty shards go last
+    return first_time_point_number
+
+
+def _check_no_shared_time_points(experiment, shard, file_path: str):
+    """Raises ValueError if the shard has positions in time points that are already in the experiment."""
+    first_time_point_number = shard.positions.first_time_point_number()
+    last_time_point_number = experiment.positions.last_time_point_number()
+    if first_time_point_number is not None and last_time_point_number is not None \
+            and first_time_point_number <= last_time_point_number:
+        raise ValueError(f"Shard {file_path} starts at time point {first_time_point_number}, but the previous shards"
+                         f" already go up to time point {last_time_point_number}. Shards must not share time points.")
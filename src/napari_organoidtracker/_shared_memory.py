@@ -0,0 +1,297 @@
+"""Flat, read-only copy of an Experiment in shared memory, for analysis in multiple processes.
+
+Pickling an Experiment is slow, as it consists of millions of Position objects and tracks that refer to each other. A
+SharedExperiment instead stores everything in arrays, in a single block of shared memory (see
+multiprocessing.shared_memory). Pickling a SharedExperiment only pickles the name of that block and the layout of the
+arrays in it, so a worker process can attach to the same memory without copying anything.
+
+The arrays describe the tracks in the same way as the TrackTable: the positions of track i are in the rows
+track_offsets[i]:track_offsets[i + 1], ordered by time. Positions that are not in any track come after the tracks,
+with a track id of -1. On top of that, there are CSR (compressed sparse row) arrays for the next tracks of every track,
+for the tracks in every lineage and for the rows in every time point, and one column for every metadata key.
+
+The process that created the SharedExperiment owns the shared memory, and must call unlink() (or use it in a with
+statement) once all work is done. Worker processes only attach to it.
+"""
+
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy
+
+from napari_organoidtracker._experiment import Experiment
+from napari_organoidtracker._parallel import map_in_batches
+from napari_organoidtracker._track_table import TrackTable, _to_offsets
+
+# Arrays start at a multiple of this many bytes
+_ALIGNMENT = 64
+
+# Layout of the arrays in the shared memory: name, dtype, shape and offset in bytes
+_Layout = List[Tuple[str, str, Tuple[int, ...], int]]
+
+# Already attached experiments in this process, by name of the shared memory
+_attached_experiments: Dict[str, "SharedExperiment"] = dict()
+
+
+class SharedExperiment:
+    """Read-only, array-based copy of an experiment in shared memory. Create one using SharedExperiment.create."""
+
+    coords_xyz: numpy.ndarray  # float64, shape (rows, 3)
+    time_point_numbers: numpy.ndarray  # int64, one per row
+    track_ids: numpy.ndarray  # int64, one per row, -1 for positions without links
+    track_offsets: numpy.ndarray  # int64, length is number of tracks + 1
+    track_first_time_point_numbers: numpy.ndarray  # int64, one per track
+    previous_offsets: numpy.ndarray  # int64, the previous tracks of track i are at previous_offsets[i]:[i + 1]
+    previous_track_ids: numpy.ndarray
+    next_offsets: numpy.ndarray  # int64, the next tracks of track i are at next_offsets[i]:[i + 1]
+    next_track_ids: numpy.ndarray
+    lineage_offsets: numpy.ndarray  # int64, the tracks of lineage i are at lineage_offsets[i]:[i + 1]
+    lineage_track_ids: numpy.ndarray  # The root of every lineage comes first, followed by the other tracks by id
+    time_point_row_offsets: numpy.ndarray  # Rows of time point first_time_point_number + i are at [i]:[i + 1]
+    time_point_rows: numpy.ndarray
+    first_time_point_number: int
+
+    _shared_memory: SharedMemory
+    _layout: _Layout
+    _metadata_categories: Dict[str, Optional[List[str]]]  # For string metadata, the strings of every code
+    _is_owner: bool
+    _metadata: Dict[str, numpy.ndarray]
+
+    def __init__(self, shared_memory: SharedMemory, layout: _Layout,
+                 metadata_categories: Dict[str, Optional[List[str]]], first_time_point_number: int, *,
+                 is_owner: bool):
+        """Internal, use SharedExperiment.create instead."""
+        self._shared_memory = shared_memory
+        self._layout = layout
+        self._metadata_categories = metadata_categories
+        self.first_time_point_number = first_time_point_number
+        self._is_owner = is_owner
+        self._metadata = dict()
+        for name, dtype, shape, offset in layout:
+            array = numpy.ndarray(shape, dtype=numpy.dtype(dtype), buffer=shared_memory.buf, offset=offset)
+            array.flags.writeable = False
+            if name.startswith("metadata:"):
+                self._metadata[name[len("metadata:"):]] = array
+            else:
+                setattr(self, name, array)
+
+    @staticmethod
+    def create(experiment: Experiment) -> "SharedExperiment":
+        """Copies the experiment into a new block of shared memory. The caller owns the memory, and must call unlink()
+        once it's no longer needed."""
+        from napari_organoidtracker import _profiling
+
+        with _profiling.stage("create_shared_experiment"):
+            arrays, metadata_categories, first_time_point_number = _to_arrays(experiment)
+
+            layout = list()
+            size = 0
+            for name, array in arrays.items():
+                size = -(-size // _ALIGNMENT) * _ALIGNMENT
+                layout.append((name, array.dtype.str, array.shape, size))
+                size += array.nbytes
+            shared_memory = SharedMemory(create=True, size=max(size, 1))
+            for (name, dtype, shape, offset), array in zip(layout, arrays.values()):
+                numpy.ndarray(shape, dtype=numpy.dtype(dtype), buffer=shared_memory.buf, offset=offset)[...] = array
+            return SharedExperiment(shared_memory, layout, metadata_categories, first_time_point_number,
+                                    is_owner=True)
+
+    def __reduce__(self):
+        # Only the name and the layout are pickled, the arrays are attached to again on unpickling
+        return _attach, (self._shared_memory.name, self._layout, self._metadata_categories,
+                         self.first_time_point_number)
+
+    def __len__(self) -> int:
+        """Gets the number of positions."""
+        return len(self.coords_xyz)
+
+    def track_count(self) -> int:
+        return len(self.track_offsets) - 1
+
+    def lineage_count(self) -> int:
+        return len(self.lineage_offsets) - 1
+
+    def get_lineage_track_ids(self, lineage_index: int) -> numpy.ndarray:
+        """Gets the ids of all tracks in the lineage. The first one is the root of the lineage."""
+        return self.lineage_track_ids[self.lineage_offsets[lineage_index]:self.lineage_offsets[lineage_index + 1]]
+
+    def get_next_track_ids(self, track_id: int) -> numpy.ndarray:
+        return self.next_track_ids[self.next_offsets[track_id]:self.next_offsets[track_id + 1]]
+
+    def get_previous_track_ids(self, track_id: int) -> numpy.ndarray:
+        return self.previous_track_ids[self.previous_offsets[track_id]:self.previous_offsets[track_id + 1]]
+
+    def get_track_rows(self, track_id: int) -> slice:
+        """Gets the rows of the positions in the track, ordered by time."""
+        return slice(int(self.track_offsets[track_id]), int(self.track_offsets[track_id + 1]))
+
+    def get_time_point_rows(self, time_point_number: int) -> numpy.ndarray:
+        """Gets the rows of all positions in the time point. Returns an empty array for unknown time points."""
+        index = time_point_number - self.first_time_point_number
+        if index < 0 or index >= len(self.time_point_row_offsets) - 1:
+            return self.time_point_rows[0:0]
+        return self.time_point_rows[self.time_point_row_offsets[index]:self.time_point_row_offsets[index + 1]]
+
+    def time_point_numbers_in_use(self) -> numpy.ndarray:
+        """Gets all time point numbers that have positions."""
+        counts = numpy.diff(self.time_point_row_offsets)
+        return numpy.flatnonzero(counts > 0) + self.first_time_point_number
+
+    def get_metadata_names(self) -> List[str]:
+        return list(self._metadata.keys())
+
+    def get_metadata(self, name: str) -> numpy.ndarray:
+        """Gets the metadata values of all rows. Numbers and booleans are returned as floats, with NaN for missing
+        values. Strings are returned as codes (-1 for missing values), see get_metadata_categories."""
+        return self._metadata[name]
+
+    def get_metadata_categories(self, name: str) -> Optional[List[str]]:
+        """For string metadata, gets the string of every code. Returns None for other metadata."""
+        return self._metadata_categories[name]
+
+    def to_track_table(self) -> TrackTable:
+        """Gets the tracks as a TrackTable, without copying the arrays. The table has no Position objects."""
+        row_count = int(self.track_offsets[-1])
+        next_counts = numpy.diff(self.next_offsets)
+        return TrackTable(track_offsets=self.track_offsets,
+                          track_first_time_point_numbers=self.track_first_time_point_numbers,
+                          previous_offsets=self.previous_offsets, previous_track_ids=self.previous_track_ids,
+                          next_counts=next_counts, coords_xyz=self.coords_xyz[:row_count], positions=None)
+
+    def close(self):
+        """Detaches from the shared memory. The arrays can no longer be used after this."""
+        for name, _, _, _ in self._layout:
+            if not name.startswith("metadata:"):
+                setattr(self, name, None)
+        self._metadata.clear()
+        self._shared_memory.close()
+
+    def unlink(self):
+        """Detaches from the shared memory, and frees it. Can only be called by the process that created it."""
+        if not self._is_owner:
+            raise ValueError("Only the process that created the shared memory can free it")
+        self.close()
+        self._shared_memory.unlink()
+
+    def __enter__(self) -> "SharedExperiment":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._is_owner:
+            self.unlink()
+        else:
+            self.close()
+
+
+def _attach(name: str, layout: _Layout, metadata_categories: Dict[str, Optional[List[str]]],
+            first_time_point_number: int) -> SharedExperiment:
+    """Attaches to an existing SharedExperiment. Every process attaches only once."""
+    experiment = _attached_experiments.get(name)
+    if experiment is None:
+        experiment = SharedExperiment(SharedMemory(name=name), layout, metadata_categories, first_time_point_number,
+                                      is_owner=False)
+        _attached_experiments[name] = experiment
+    return experiment
+
+
+def map_lineages(function: Callable[[SharedExperiment, numpy.ndarray], Any], experiment: SharedExperiment, *,
+                 max_workers: Optional[int] = None) -> List[Any]:
+    """Calls function(experiment, lineage_track_ids) for every lineage, in max_workers processes (by default, one per
+    CPU). Returns the results, in the order of the lineages. The function must be picklable, so it must be defined at
+    the top level of a module."""
+    return _map(function, experiment, [experiment.get_lineage_track_ids(lineage_index)
+                                       for lineage_index in range(experiment.lineage_count())], max_workers)
+
+
+def map_time_points(function: Callable[[SharedExperiment, int], Any], experiment: SharedExperiment, *,
+                    max_workers: Optional[int] = None) -> Dict[int, Any]:
+    """Calls function(experiment, time_point_number) for every time point with positions, in max_workers processes (by
+    default, one per CPU). Returns the results by time point number. The function must be picklable, so it must be
+    defined at the top level of a module."""
+    time_point_numbers = experiment.time_point_numbers_in_use().tolist()
+    return dict(zip(time_point_numbers, _map(function, experiment, time_point_numbers, max_workers)))
+
+
+def _map(function: Callable[[SharedExperiment, Any], Any], experiment: SharedExperiment, arguments: List[Any],
+         max_workers: Optional[int]) -> List[Any]:
+    # In batches, so that the experiment is only sent once per batch instead of once per call
+    return map_in_batches(_call_for_batch, arguments, function, experiment, max_workers=max_workers)
+
+
+def _call_for_batch(arguments: List[Any], function: Callable[[SharedExperiment, Any], Any],
+                    experiment: SharedExperiment) -> List[Any]:
+    """Runs in a worker process."""
+    return [function(experiment, argument) for argument in arguments]
+
+
+def _to_arrays(experiment: Experiment) -> Tuple[Dict[str, numpy.ndarray], Dict[str, Optional[List[str]]], int]:
+    """Converts the experiment to arrays. Returns the arrays by name, the categories of the string metadata and the
+    first time point number."""
+    track_table = TrackTable.from_links(experiment.links)
+    positions, coords_xyz, time_point_numbers, track_ids = track_table.with_untracked_positions(experiment.positions)
+
+    # Next tracks, by reversing the previous tracks
+    previous_counts = track_table.previous_counts()
+    later_track_ids = numpy.repeat(numpy.arange(track_table.track_count(), dtype=numpy.int64), previous_counts)
+    order = numpy.argsort(track_table.previous_track_ids, kind="stable")
+    next_offsets = _to_offsets(numpy.bincount(track_table.previous_track_ids, minlength=track_table.track_count()))
+    next_track_ids = later_track_ids[order]
+
+    # Lineages: follow the first previous track until there is none, by repeatedly jumping to the root of the root
+    roots = numpy.arange(track_table.track_count(), dtype=numpy.int64)
+    has_previous = previous_counts > 0
+    roots[has_previous] = track_table.previous_track_ids[track_table.previous_offsets[:-1][has_previous]]
+    while True:
+        new_roots = roots[roots]
+        if numpy.array_equal(new_roots, roots):
+            break
+        roots = new_roots
+    track_numbers = numpy.arange(track_table.track_count(), dtype=numpy.int64)
+    lineage_track_ids = numpy.lexsort((track_numbers, roots != track_numbers, roots))  # Root first
+    lineage_offsets = _to_offsets(numpy.unique(roots, return_counts=True)[1])
+
+    # Rows by time point
+    first_time_point_number = int(time_point_numbers.min()) if len(time_point_numbers) > 0 else 0
+    time_point_rows = numpy.argsort(time_point_numbers, kind="stable")
+    time_point_row_offsets = _to_offsets(numpy.bincount(time_point_numbers - first_time_point_number)
+                                         if len(time_point_numbers) > 0 else numpy.empty(0, dtype=numpy.int64))
+
+    arrays = {
+        "coords_xyz": coords_xyz,
+        "time_point_numbers": time_point_numbers,
+        "track_ids": track_ids,
+        "track_offsets": track_table.track_offsets,
+        "track_first_time_point_numbers": track_table.track_first_time_point_numbers,
+        "previous_offsets": track_table.previous_offsets,
+        "previous_track_ids": track_table.previous_track_ids,
+        "next_offsets": next_offsets,
+        "next_track_ids": next_track_ids,
+        "lineage_offsets": lineage_offsets,
+        "lineage_track_ids": lineage_track_ids,
+        "time_point_row_offsets": time_point_row_offsets,
+        "time_point_rows": time_point_rows,
+    }
+
+    # Metadata columns
+    metadata_categories = dict()
+    rows_by_position = {position: row for row, position in enumerate(positions)}
+    for name, data_type in experiment.position_data.get_data_names_and_types().items():
+        if data_type not in (bool, float, int, str):
+            continue  # Lists and other objects can't be stored in arrays
+        if data_type == str:
+            column = numpy.full(len(positions), -1, dtype=numpy.int32)
+            codes = dict()
+            for position, value in experiment.position_data.find_all_positions_with_data(name):
+                row = rows_by_position.get(position)
+                if row is not None and isinstance(value, str):
+                    column[row] = codes.setdefault(value, len(codes))
+            metadata_categories[name] = list(codes.keys())
+        else:
+            column = numpy.full(len(positions), numpy.nan, dtype=numpy.float64)
+            for position, value in experiment.position_data.find_all_positions_with_data(name):
+                row = rows_by_position.get(position)
+                if row is not None and isinstance(value, (bool, float, int)):
+                    column[row] = value
+            metadata_categories[name] = None
+        arrays["metadata:" + name] = column
+    return arrays, metadata_categories, first_time_point_number
@@ -0,0 +1,200 @@
+"""Generates synthetic OrganoidTracker data, used for testing and benchmarking. Cells move around using a random walk,
+and every time point each cell has a fixed chance of dividing or disappearing."""
+
+import io
+import json
+import math
+from typing import Any, Dict, Optional, Type
+
+import numpy
+
+from napari_organoidtracker._compression import open_aut_file
+
+_CELL_TYPES = ["stem", "paneth", "enterocyte", "goblet", "enteroendocrine"]
+
+
+class _SyntheticTracks:
+    """The simulated tracks, stored as flat arrays. Rows are ordered by track and then by time."""
+
+    track_offsets: numpy.ndarray  # Positions of track i are in rows track_offsets[i]:track_offsets[i + 1]
+    track_parents: numpy.ndarray  # Parent track of every track, or -1 if there is none
+    time_point_numbers: numpy.ndarray  # One per row
+    coords_xyz: numpy.ndarray  # Shape (rows, 3)
+    metadata: Dict[str, numpy.ndarray]  # One value per row
+
+    def __init__(self, track_offsets: numpy.ndarray, track_parents: numpy.ndarray, time_point_numbers: numpy.ndarray,
+                 coords_xyz: numpy.ndarray, metadata: Dict[str, numpy.ndarray]):
+        self.track_offsets = track_offsets
+        self.track_parents = track_parents
+        self.time_point_numbers = time_point_numbers
+        self.coords_xyz = coords_xyz
+        self.metadata = metadata
+
+    def track_count(self) -> int:
+        return len(self.track_offsets) - 1
+
+    def rows_by_time_point(self) -> Dict[int, numpy.ndarray]:
+        """Gets the rows of every time point, in order of time."""
+        order = numpy.argsort(self.time_point_numbers, kind="stable")
+        time_point_numbers, starts = numpy.unique(self.time_point_numbers[order], return_index=True)
+        ends = numpy.append(starts[1:], len(order))
+        return {int(time_point_number): order[start:end]
+                for time_point_number, start, end in zip(time_point_numbers, starts, ends)}
+
+
+def _simulate(*, time_point_count: int, cell_count: int, division_rate: float, disappearance_rate: float,
+              metadata: Dict[str, Type], is_2d: bool, first_time_point_number: int, seed: int) -> _SyntheticTracks:
+    rng = numpy.random.default_rng(seed)
+
+    # Scale the field with the number of cells, so that the cell density stays realistic
+    field_size_xy = max(100.0, 25 * math.sqrt(cell_count))
+    field_size_z = 0 if is_2d else 30
+    step_size = numpy.array([1.5, 1.5, 0 if is_2d else 0.3])
+
+    coords = rng.random((cell_count, 3)) * [field_size_xy, field_size_xy, field_size_z]
+    track_ids = numpy.arange(cell_count, dtype=numpy.int64)
+    track_parents = [numpy.full(cell_count, -1, dtype=numpy.int64)]
+    track_count = cell_count
+
+    rows_track_ids = [track_ids]
+    rows_time_point_numbers = [numpy.full(cell_count, first_time_point_number, dtype=numpy.int64)]
+    rows_coords = [coords]
+    for time_point_number in range(first_time_point_number + 1, first_time_point_number + time_point_count):
+        random_values = rng.random(len(track_ids))
+        dividing = random_values < division_rate
+        disappearing = (random_values >= division_rate) & (random_values < division_rate + disappearance_rate)
+        continuing = ~dividing & ~disappearing
+
+        # Continuing cells move a bit
+        continuing_coords = coords[continuing] + rng.normal(size=(numpy.count_nonzero(continuing), 3)) * step_size
+
+        # Dividing cells are replaced by two daughters, each in a new track
+        mother_coords = coords[dividing]
+        offsets = rng.normal(size=mother_coords.shape) * [3, 3, 0 if is_2d else 0.5]
+        daughter_coords = numpy.concatenate([mother_coords + offsets, mother_coords - offsets])
+        daughter_track_ids = numpy.arange(track_count, track_count + len(daughter_coords), dtype=numpy.int64)
+        track_count += len(daughter_coords)
+        track_parents.append(numpy.tile(track_ids[dividing], 2))
+
+        coords = numpy.concatenate([continuing_coords, daughter_coords])
+        track_ids = numpy.concatenate([track_ids[continuing], daughter_track_ids])
+        rows_track_ids.append(track_ids)
+        rows_time_point_numbers.append(numpy.full(len(track_ids), time_point_number, dtype=numpy.int64))
+        rows_coords.append(coords)
+
+    # Order by track, then by time
+    rows_track_ids = numpy.concatenate(rows_track_ids)
+    rows_time_point_numbers = numpy.concatenate(rows_time_point_numbers)
+    order = numpy.lexsort((rows_time_point_numbers, rows_track_ids))
+    track_offsets = numpy.zeros(track_count + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(rows_track_ids, minlength=track_count), out=track_offsets[1:])
+    row_count = len(order)
+
+    metadata_values = dict()
+    for metadata_key, metadata_type in metadata.items():
+        if metadata_type == bool:
+            metadata_values[metadata_key] = rng.random(row_count) < 0.5
+        elif metadata_type == int:
+            metadata_values[metadata_key] = rng.integers(0, 1000, row_count)
+        elif metadata_type == float:
+            metadata_values[metadata_key] = rng.normal(1000, 100, row_count)
+        elif metadata_type == str:
+            metadata_values[metadata_key] = numpy.array(_CELL_TYPES)[rng.integers(0, len(_CELL_TYPES), row_count)]
+        else:
+            raise ValueError(f"Unsupported metadata type for {metadata_key}: {metadata_type}")
+
+    return _SyntheticTracks(track_offsets, numpy.concatenate(track_parents), rows_time_point_numbers[order],
+                            numpy.concatenate(rows_coords)[order], metadata_values)
+
+
+def generate_synthetic_data(*, time_point_count: int = 10, cell_count: int = 20, division_rate: float = 0.02,
+                            disappearance_rate: float = 0.0, metadata: Optional[Dict[str, Type]] = None,
+                            is_2d: bool = False, version: str = "v2", first_time_point_number: int = 0,
+                            seed: int = 1) -> Dict[str, Any]:
+    """Generates the JSON structure of a synthetic tracking file. Cells start at random locations in the first time
+    point, and every time point they have a chance of dividing (into two new tracks) or disappearing. Metadata is a
+    dictionary of metadata key to type (bool, int, float or str), and random values are generated for every position.
+
+    Note that the number of positions depends on the division and disappearance rates: with both rates at zero, there
+    will be exactly time_point_count * cell_count positions."""
+    tracks = _simulate(time_point_count=time_point_count, cell_count=cell_count, division_rate=division_rate,
+                       disappearance_rate=disappearance_rate, metadata=metadata if metadata is not None else dict(),
+                       is_2d=is_2d, first_time_point_number=first_time_point_number, seed=seed)
+    if version == "v1":
+        return _to_v1_format(tracks)
+    if version == "v2":
+        return _to_v2_format(tracks)
+    raise ValueError(f"Unknown version: {version}")
+
+
+def write_synthetic_aut_file(file_path: str, **kwargs):
+    """Writes a synthetic tracking file. See generate_synthetic_data for the supported keyword arguments. The file is
+    compressed if the file name ends with for example .aut.gz, see the _compression module."""
+    data = generate_synthetic_data(**kwargs)
+    with open_aut_file(file_path, "wb") as handle, io.TextIOWrapper(handle, encoding="utf-8") as text_handle:
+        json.dump(data, text_handle)
+
+
+def _to_v2_format(tracks: _SyntheticTracks) -> Dict[str, Any]:
+    coords = tracks.coords_xyz.tolist()
+    metadata = {metadata_key: values.tolist() for metadata_key, values in tracks.metadata.items()}
+
+    positions_json = list()
+    for time_point_number, rows in tracks.rows_by_time_point().items():
+        time_point_json = {"time_point": time_point_number, "coords_xyz_px": [coords[row] for row in rows.tolist()]}
+        if len(metadata) > 0:
+            time_point_json["position_meta"] = {metadata_key: [values[row] for row in rows.tolist()]
+                                                for metadata_key, values in metadata.items()}
+        positions_json.append(time_point_json)
+
+    tracks_json = list()
+    track_offsets = tracks.track_offsets.tolist()
+    track_parents = tracks.track_parents.tolist()
+    time_point_numbers = tracks.time_point_numbers.tolist()
+    for track_id in range(tracks.track_count()):
+        start, end = track_offsets[track_id], track_offsets[track_id + 1]
+        track_json = {"time_point_start": time_point_numbers[start], "coords_xyz_px": coords[start:end]}
+        parent = track_parents[track_id]
+        if parent >= 0:
+            track_json["coords_xyz_px_before"] = [coords[track_offsets[parent + 1] - 1]]
+        tracks_json.append(track_json)
+
+    return {"version": "v2", "positions": positions_json, "tracks": tracks_json}
+
+
+def _to_v1_format(tracks: _SyntheticTracks) -> Dict[str, Any]:
+    coords = tracks.coords_xyz.tolist()
+    time_point_numbers = tracks.time_point_numbers.tolist()
+    metadata = {metadata_key: values.tolist() for metadata_key, values in tracks.metadata.items()}
+
+    def position_json(row: int) -> Dict[str, Any]:
+        x, y, z = coords[row]
+        return {"x": x, "y": y, "z": z, "_time_point_number": time_point_numbers[row]}
+
+    positions_json = dict()
+    for time_point_number, rows in tracks.rows_by_time_point().items():
+        positions_json[str(time_point_number)] = [coords[row] for row in rows.tolist()]
+
+    nodes_json = list()
+    if len(metadata) > 0:
+        for row in range(len(coords)):
+            node_json = {"id": position_json(row)}
+            for metadata_key, values in metadata.items():
+                node_json[metadata_key] = values[row]
+            nodes_json.append(node_json)
+
+    links_json = list()
+    track_offsets = tracks.track_offsets.tolist()
+    track_parents = tracks.track_parents.tolist()
+    for track_id in range(tracks.track_count()):
+        start, end = track_offsets[track_id], track_offsets[track_id + 1]
+        parent = track_parents[track_id]
+        if parent >= 0:
+            links_json.append({"source": position_json(track_offsets[parent + 1] - 1),
+                               "target": position_json(start)})
+        for row in range(start, end - 1):
+            links_json.append({"source": position_json(row), "target": position_json(row + 1)})
+
+    return {"version": "v1", "positions": positions_json,
+            "links": {"directed": False, "multigraph": False, "graph": {}, "nodes": nodes_json, "links": links_json}}
+
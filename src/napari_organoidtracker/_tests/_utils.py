@@ -0,0 +1,19 @@
+"""Helpers shared by the tests."""
+
+from napari_organoidtracker._experiment import Experiment
+
+
+def get_contents(experiment: Experiment):
+    """Gets all positions, links and metadata, in a form that can be compared."""
+    position_data = {data_name: dict(experiment.position_data.find_all_positions_with_data(data_name))
+                     for data_name in experiment.position_data.find_all_data_names()}
+    lineage_data = {track.find_first_position(): dict(experiment.links.find_all_data_of_lineage(track))
+                    for track in experiment.links._tracks}
+    return set(experiment.positions), set(experiment.links.find_all_links()), position_data, lineage_data
+
+
+def get_metadata_types(experiment: Experiment):
+    """Gets the type of every position metadata value. get_contents can't see those, as 1544 == 1544.0."""
+    return {data_name: {position: type(value)
+                        for position, value in experiment.position_data.find_all_positions_with_data(data_name)}
+            for data_name in experiment.position_data.find_all_data_names()}
@@ -0,0 +1,55 @@
+import os
+
+import numpy
+
+from napari_organoidtracker import napari_get_reader
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._binary_format import convert_to_binary, read_binary_file, write_binary_file
+from napari_organoidtracker._experiment import _experiment_to_napari
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._tests._utils import get_contents, get_metadata_types
+
+
+def test_round_trip(tmp_path):
+    my_test_file = os.path.join(os.path.dirname(__file__), "E482-AZ-pos3.aut")
+    binary_file = os.path.join(tmp_path, "E482-AZ-pos3.autb")
+    convert_to_binary(my_test_file, binary_file)
+
+    experiment = _read_organoidtracker_file(my_test_file)
+    experiment.positions.add(Position(1, 2, 3, time_point_number=4))  # A position without links
+    write_binary_file(experiment, binary_file)
+
+    experiment_from_binary = read_binary_file(binary_file)
+    assert get_contents(experiment_from_binary) == get_contents(experiment)
+    assert get_metadata_types(experiment_from_binary) == get_metadata_types(experiment)
+    assert experiment_from_binary.position_data.get_data_names_and_types() \
+           == experiment.position_data.get_data_names_and_types()
+
+
+def test_napari_layers(tmp_path):
+    my_test_file = os.path.join(os.path.dirname(__file__), "E482-AZ-pos3.aut")
+    binary_file = os.path.join(tmp_path, "E482-AZ-pos3.autb")
+    convert_to_binary(my_test_file, binary_file)
+
+    reader = napari_get_reader(binary_file)
+    assert callable(reader)
+    layer_data_list = reader(binary_file, event_layers=True)
+    expected_layer_data_list = _experiment_to_napari(_read_organoidtracker_file(my_test_file), event_layers=True)
+
+    # The tracks layer data is directly read from the file
+    tracks_data, tracks_kwargs, _ = layer_data_list[0]
+    assert not tracks_data.flags.owndata and not tracks_data.flags.writeable
+    assert numpy.array_equal(tracks_data, expected_layer_data_list[0][0])
+    assert tracks_kwargs["graph"] == expected_layer_data_list[0][1]["graph"]
+    assert numpy.array_equal(tracks_kwargs["features"]["intensity_cfp_volume"],
+                             expected_layer_data_list[0][1]["features"]["intensity_cfp_volume"])
+
+    for layer_data, expected_layer_data in zip(layer_data_list[1:], expected_layer_data_list[1:]):
+        assert numpy.array_equal(layer_data[0], expected_layer_data[0])
+
+
+def test_not_binary(tmp_path):
+    file_path = os.path.join(tmp_path, "fake.autb")
+    with open(file_path, "w") as handle:
+        handle.write("{}")
+    assert napari_get_reader(file_path) is None
@@ -0,0 +1,95 @@
+import os
+
+import numpy
+import pytest
+
+from napari_organoidtracker import _cache
+from napari_organoidtracker._reader import reader_function
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+
+
+@pytest.fixture
+def empty_cache():
+    _cache.clear_cache()
+    yield _cache.get_cache()
+    _cache.set_cache_limit(None)
+    _cache.clear_cache()
+
+
+def test_repeated_open(tmp_path, empty_cache):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=5, cell_count=10, metadata={"volume": float})
+
+    first_layers = reader_function(file_path)
+    second_layers = reader_function(file_path)
+    assert _cache.cache_info()["hits"] == 1
+    assert _cache.cache_info()["files"] == [os.path.realpath(file_path)]
+
+    # Same data, but copies
+    assert numpy.array_equal(second_layers[0][0], first_layers[0][0])
+    assert second_layers[0][0] is not first_layers[0][0]
+    assert second_layers[0][0].flags.writeable
+    assert second_layers[0][1] is not first_layers[0][1]
+    assert second_layers[0][1]["features"] is not first_layers[0][1]["features"]
+
+    # The Experiment is reused for the event layers
+    event_layers = reader_function(file_path, event_layers=True)
+    assert len(event_layers) == 4
+    assert len(empty_cache) == 1
+
+    # Opening it with another time range creates a new entry
+    reader_function(file_path, time_range=(1, 2))
+    assert len(empty_cache) == 2
+
+    _cache.clear_cache()
+    assert _cache.cache_info()["entries"] == 0
+
+
+def test_changing_returned_layers(tmp_path, empty_cache):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=5, cell_count=10, division_rate=0.2,
+                             metadata={"volume": float})
+    data, layer_kwargs, _ = reader_function(file_path)[0]
+    data[0, 2] = -999
+    layer_kwargs["features"]["volume"][0] = -999
+    next(iter(layer_kwargs["graph"].values())).append(-999)
+
+    data, layer_kwargs, _ = reader_function(file_path)[0]
+    assert _cache.cache_info()["hits"] == 1
+    assert data[0, 2] != -999
+    assert layer_kwargs["features"]["volume"][0] != -999
+    assert all(-999 not in parent_ids for parent_ids in layer_kwargs["graph"].values())
+
+
+def test_changed_file(tmp_path, empty_cache):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=5, cell_count=10)
+    reader_function(file_path)
+
+    write_synthetic_aut_file(file_path, time_point_count=6, cell_count=10)
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    layers = reader_function(file_path)
+    assert numpy.max(layers[0][0][:, 1]) == 5
+    assert _cache.cache_info()["hits"] == 0
+
+
+def test_eviction(tmp_path, empty_cache):
+    file_paths = [os.path.join(tmp_path, f"synthetic_{i}.aut") for i in range(3)]
+    for file_path in file_paths:
+        write_synthetic_aut_file(file_path, time_point_count=5, cell_count=10)
+    reader_function(file_paths[0])
+    size_bytes = _cache.cache_info()["size_bytes"]
+    assert size_bytes > 0
+
+    # Room for two files
+    _cache.set_cache_limit(int(size_bytes * 2.5))
+    for file_path in file_paths:
+        reader_function(file_path)
+    assert _cache.cache_info()["files"] == [os.path.realpath(file_paths[1]), os.path.realpath(file_paths[2])]
+
+    # Disabled cache
+    _cache.set_cache_limit(0)
+    assert len(empty_cache) == 0
+    assert reader_function(file_paths[0])[0][0].flags.writeable
+    assert len(empty_cache) == 0
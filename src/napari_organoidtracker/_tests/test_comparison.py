@@ -0,0 +1,135 @@
+import itertools
+import os
+
+import numpy
+import pytest
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._comparison import _linear_sum_assignment, _match_points, compare_experiments
+from napari_organoidtracker._experiment import Experiment
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+
+
+def _shifted(position: Position) -> Position:
+    return Position(position.x + 0.5, position.y - 0.5, position.z, time_point_number=position.time_point_number())
+
+
+def _create_automatic_experiment(ground_truth: Experiment, seed: int) -> Experiment:
+    """Creates a copy of the ground truth with some positions and links missing, and some extra positions."""
+    random = numpy.random.default_rng(seed)
+    positions = list(ground_truth.positions)
+    missing_positions = {position for position in positions if random.random() < 0.05}
+    automatic = Experiment()
+    for position in positions:
+        if position not in missing_positions:
+            automatic.positions.add(_shifted(position))
+    for position1, position2 in ground_truth.links.find_all_links():
+        if position1 in missing_positions or position2 in missing_positions or random.random() < 0.05:
+            continue
+        automatic.links.add_link(_shifted(position1), _shifted(position2))
+    for position in positions[:10]:
+        automatic.positions.add(Position(position.x + 500, position.y, position.z,
+                                         time_point_number=position.time_point_number()))
+    return automatic
+
+
+def _find_divisions(experiment: Experiment):
+    return {position for position in experiment.positions if len(experiment.links.find_futures(position)) > 1}
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_against_brute_force(tmp_path, max_workers):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=10, cell_count=20, division_rate=0.1)
+    ground_truth = _read_organoidtracker_file(file_path)
+    automatic = _create_automatic_experiment(ground_truth, seed=max_workers)
+
+    result = compare_experiments(automatic, ground_truth, max_distance=3, max_workers=max_workers)
+
+    # Every shifted position must be matched to its original
+    matches = result.get_matches()
+    shifted_to_original = {_shifted(position): position for position in ground_truth.positions}
+    assert matches == {position: shifted_to_original[position] for position in automatic.positions
+                       if position in shifted_to_original}
+    assert result.positions.true_positives == len(matches)
+    assert result.positions.false_positives == 10
+    assert result.positions.false_negatives == len(ground_truth.positions) - len(matches)
+
+    automatic_links = list(automatic.links.find_all_links())
+    correct_links = [(position1, position2) for position1, position2 in automatic_links
+                     if ground_truth.links.contains_link(matches[position1], matches[position2])]
+    assert result.links.true_positives == len(correct_links)
+    assert result.links.false_positives == len(automatic_links) - len(correct_links)
+    assert result.links.false_negatives == len(list(ground_truth.links.find_all_links())) - len(correct_links)
+
+    automatic_divisions = _find_divisions(automatic)
+    ground_truth_divisions = _find_divisions(ground_truth)
+    correct_divisions = [position for position in automatic_divisions if matches[position] in ground_truth_divisions]
+    assert result.divisions.true_positives == len(correct_divisions)
+    assert result.divisions.false_positives == len(automatic_divisions) - len(correct_divisions)
+    assert result.divisions.false_negatives == len(ground_truth_divisions) - len(correct_divisions)
+
+    # The track errors add up to the totals (as every link and missed position is in some track)
+    track_errors = result.ground_truth_track_errors()
+    assert sum(errors.position_errors for errors in track_errors) == result.positions.false_negatives
+    assert sum(errors.link_errors for errors in track_errors) == result.links.false_negatives
+    assert sum(errors.division_error for errors in track_errors) == result.divisions.false_negatives
+    for errors in track_errors:
+        assert ground_truth.links.get_track(errors.first_position).find_first_position() == errors.first_position
+    automatic_track_errors = result.automatic_track_errors()
+    assert sum(errors.link_errors for errors in automatic_track_errors) == result.links.false_positives
+
+
+def test_identical_experiments(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=5, cell_count=10, division_rate=0.2)
+    experiment = _read_organoidtracker_file(file_path)
+
+    result = compare_experiments(experiment, experiment, max_distance=1, max_workers=1)
+    for score in [result.positions, result.links, result.divisions]:
+        assert score.false_positives == score.false_negatives == 0
+        assert score.precision() == score.recall() == 1
+    assert result.ground_truth_track_errors() == []
+
+
+def test_linear_sum_assignment():
+    random = numpy.random.default_rng(3)
+    for size in [1, 2, 5, 6]:
+        costs = random.uniform(0, 10, size=(size, size))
+        assigned_columns = _linear_sum_assignment(costs)
+        best_cost = min(costs[numpy.arange(size), list(permutation)].sum()
+                        for permutation in itertools.permutations(range(size)))
+        assert sorted(assigned_columns.tolist()) == list(range(size))
+        assert costs[numpy.arange(size), assigned_columns].sum() == pytest.approx(best_cost)
+
+
+def test_match_points_maximizes_matches():
+    # Matching point 1 with the nearest point (b) would leave point 0 without a match
+    coords = numpy.array([[0, 0, 0], [2, 0, 0]], dtype=numpy.float64)
+    other_coords = numpy.array([[1.5, 0, 0], [2.2, 0, 0], [50, 0, 0]], dtype=numpy.float64)
+    matched, other_matched = _match_points(coords, other_coords, max_distance=1.6)
+    assert dict(zip(matched.tolist(), other_matched.tolist())) == {0: 0, 1: 1}
+
+
+@pytest.mark.parametrize("max_distance", [3, 8, 15])
+def test_match_points_against_dense_assignment(max_distance):
+    # Larger distances give larger clusters of competing points, which are solved in different ways
+    random = numpy.random.default_rng(4)
+    coords = random.uniform(0, 50, size=(40, 3))
+    other_coords = random.uniform(0, 50, size=(35, 3))
+    matched, other_matched = _match_points(coords, other_coords, max_distance=max_distance)
+    assert len(set(matched.tolist())) == len(matched)
+    assert len(set(other_matched.tolist())) == len(other_matched)
+    distances = numpy.linalg.norm(coords[matched] - other_coords[other_matched], axis=1)
+    assert numpy.all(distances <= max_distance)
+
+    all_distances = numpy.linalg.norm(coords[:, numpy.newaxis, :] - other_coords[numpy.newaxis, :, :], axis=2)
+    impossible_cost = all_distances[all_distances <= max_distance].sum() + 1
+    costs = numpy.full((40, 40), impossible_cost)
+    costs[:, :35] = numpy.where(all_distances <= max_distance, all_distances, impossible_cost)
+    assigned_columns = _linear_sum_assignment(costs)
+    expected_costs = costs[numpy.arange(40), assigned_columns]
+    expected_costs = expected_costs[expected_costs < impossible_cost]
+    assert len(matched) == len(expected_costs)
+    assert distances.sum() == pytest.approx(expected_costs.sum())
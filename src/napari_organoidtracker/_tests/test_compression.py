@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from napari_organoidtracker import napari_get_reader
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._probe import probe_aut_file
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+
+
+@pytest.mark.parametrize("extension", [".aut.gz", ".aut.bz2", ".aut.xz", ".aut.zst"])
+def test_read_compressed(tmp_path, extension):
+    if extension == ".aut.zst":
+        pytest.importorskip("zstandard")
+    settings = {"time_point_count": 5, "cell_count": 10, "division_rate": 0.1, "metadata": {"volume": float}}
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, **settings)
+    compressed_file_path = os.path.join(tmp_path, "synthetic" + extension)
+    write_synthetic_aut_file(compressed_file_path, **settings)
+    assert os.path.getsize(compressed_file_path) < os.path.getsize(file_path)
+
+    summary = probe_aut_file(compressed_file_path, count=True)
+    assert summary.version == "v2"
+    assert summary.position_count == probe_aut_file(file_path, count=True).position_count
+
+    layer_data_list = napari_get_reader(compressed_file_path)(compressed_file_path)
+    assert layer_data_list[0][2] == "tracks"
+
+    assert set(_read_organoidtracker_file(compressed_file_path).positions) \
+           == set(_read_organoidtracker_file(file_path).positions)
+
+
+def test_get_reader_compressed_names():
+    assert napari_get_reader("tracks.aut.tar") is None
+    assert napari_get_reader("tracks.gz") is None
@@ -0,0 +1,81 @@
+import os
+import warnings
+
+import numpy
+import pytest
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._binary_format import BinaryFile, write_binary_file
+from napari_organoidtracker._ctc import ctc_tracks_to_experiment, links_to_ctc_tracks, read_ctc_track_file, \
+    track_table_to_ctc_tracks, write_ctc_track_file
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+from napari_organoidtracker._track_table import TrackTable
+
+
+def _read_experiment(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=20, cell_count=10, division_rate=0.1,
+                             first_time_point_number=3)
+    return _read_organoidtracker_file(file_path)
+
+
+def test_export(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    ctc_tracks = links_to_ctc_tracks(experiment.links)
+
+    for track_id, track in experiment.links.find_all_tracks_and_ids():
+        previous_tracks = track.get_previous_tracks()
+        parent_label = experiment.links.get_track_id(previous_tracks.pop()) + 1 if len(previous_tracks) > 0 else 0
+        assert ctc_tracks[track_id].tolist() == [track_id + 1, track.first_time_point_number(),
+                                                 track.last_time_point_number(), parent_label]
+
+    # Same result from the track table of a binary file
+    binary_file_path = os.path.join(tmp_path, "synthetic.autb")
+    write_binary_file(experiment, binary_file_path)
+    assert numpy.array_equal(track_table_to_ctc_tracks(BinaryFile(binary_file_path).to_track_table()), ctc_tracks)
+
+    file_path = os.path.join(tmp_path, "res_track.txt")
+    write_ctc_track_file(file_path, ctc_tracks)
+    assert numpy.array_equal(read_ctc_track_file(file_path), ctc_tracks)
+
+
+def test_round_trip(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    track_table = TrackTable.from_links(experiment.links)
+    ctc_tracks = links_to_ctc_tracks(experiment.links)
+
+    # Shuffle the positions, like when they are collected from the mask images
+    order = numpy.random.default_rng(1).permutation(len(track_table))
+    imported = ctc_tracks_to_experiment(ctc_tracks, track_table.track_ids()[order] + 1,
+                                        track_table.time_point_numbers[order], track_table.coords_xyz[order])
+
+    imported.links.debug_sanity_check()
+    assert set(imported.positions) == set(experiment.positions)
+    assert set(imported.links.find_all_links()) == set(experiment.links.find_all_links())
+    assert numpy.array_equal(links_to_ctc_tracks(imported.links), ctc_tracks)
+
+
+def test_import_ctc_specifics():
+    # Track 2 continues track 1 without a division, track 3 has a gap before it, track 4 is a single position
+    ctc_tracks = [[1, 0, 1, 0], [2, 2, 3, 1], [3, 5, 5, 2], [4, 2, 2, 0]]
+    labels = [1, 1, 2, 2, 3, 4]
+    time_point_numbers = [0, 1, 2, 3, 5, 2]
+    coords_xyz = numpy.arange(18).reshape(6, 3)
+    with warnings.catch_warnings(record=True) as caught_warnings:
+        warnings.simplefilter("always")
+        experiment = ctc_tracks_to_experiment(ctc_tracks, labels, time_point_numbers, coords_xyz)
+    assert len(caught_warnings) == 1
+
+    experiment.links.debug_sanity_check()
+    assert len(experiment.positions) == 6
+    assert [len(track) for track in experiment.links.find_all_tracks()] == [4]
+    assert len(experiment.links) == 3
+
+
+def test_import_errors():
+    with pytest.raises(ValueError):  # Missing position at time point 1
+        ctc_tracks_to_experiment([[1, 0, 2, 0]], [1, 1], [0, 2], numpy.zeros((2, 3)))
+    with pytest.raises(ValueError):  # Unknown parent
+        ctc_tracks_to_experiment([[1, 0, 0, 5]], [1], [0], numpy.zeros((1, 3)))
+    with pytest.raises(ValueError):  # Unknown label
+        ctc_tracks_to_experiment([[1, 0, 0, 0]], [2], [0], numpy.zeros((1, 3)))
@@ -0,0 +1,86 @@
+import os
+
+import numpy
+import pytest
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._basics import TimePoint
+from napari_organoidtracker._experiment import _experiment_to_napari
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+from napari_organoidtracker._track_table import TrackTable
+
+
+def _links_of_track_table(track_table: TrackTable):
+    """Gets all links in the table, as pairs of positions."""
+    links = set()
+    positions = track_table.positions
+    for row in range(len(track_table) - 1):
+        if track_table.time_point_numbers[row + 1] == track_table.time_point_numbers[row] + 1 \
+                and row + 1 not in track_table.first_rows():
+            links.add((positions[row], positions[row + 1]))
+    for track_id in range(track_table.track_count()):
+        for previous_track_id in track_table.get_previous_track_ids(track_id).tolist():
+            links.add((positions[track_table.last_rows()[previous_track_id]],
+                       positions[track_table.first_rows()[track_id]]))
+    return links
+
+
+def _read_experiment(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=30, cell_count=8, division_rate=0.1,
+                             first_time_point_number=5, metadata={"volume": float})
+    return _read_organoidtracker_file(file_path)
+
+
+@pytest.mark.parametrize("time_range", [range(5, 35), range(10, 20), range(0, 8), range(34, 50), range(12, 13)])
+def test_same_as_deleting_positions(tmp_path, time_range):
+    experiment = _read_experiment(tmp_path)
+    view = experiment.view(time_range)
+
+    # Do it the slow way, by deleting all positions outside the time window
+    links = experiment.links.copy()
+    for position in list(experiment.positions):
+        if position.time_point_number() not in time_range:
+            links.remove_links_of_position(position)
+    expected_positions = {position for position in experiment.positions if position.time_point_number() in time_range}
+
+    track_table = view.to_track_table()
+    assert set(track_table.positions) == set(view.iterate_positions()) == expected_positions
+    assert len(track_table) == view.count_positions() == len(expected_positions)
+    assert _links_of_track_table(track_table) == set(links.find_all_links())
+    assert numpy.all(track_table.time_point_numbers == [position.time_point_number()
+                                                        for position in track_table.positions])
+    assert len(track_table.division_rows()) == sum(1 for track in links.find_all_tracks() if track.will_divide())
+
+    # The experiment itself is not modified
+    assert len(experiment.links) == len(_read_experiment(tmp_path).links)
+
+
+def test_napari_export(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    first_track = experiment.links._tracks[0]
+    experiment.links.set_lineage_data(first_track, "name", "first")
+
+    layers = _experiment_to_napari(experiment.view(range(10, 20)), event_layers=True)
+    data, layer_kwargs, layer_type = layers[0]
+    assert layer_type == "tracks"
+    assert layer_kwargs["metadata"]["first_time_point_number"] == 10
+    assert data[:, 1].min() == 0 and data[:, 1].max() == 9
+    assert len(data) == len(layer_kwargs["features"]["volume"])
+    assert "first" in [lineage_meta["name"] for lineage_meta in layer_kwargs["metadata"]["lineage_meta"].values()]
+
+    # Positions outside the window are not visible
+    view = experiment.view(range(10, 20))
+    outside_position = next(iter(experiment.positions.of_time_point(TimePoint(25))))
+    assert view.get_position_data(outside_position, "volume") is None
+    assert experiment.position_data.get_position_data(outside_position, "volume") is not None
+    assert view.positions_of_time_point(TimePoint(25)) == set()
+    assert view.positions_of_time_point(TimePoint(15)) == experiment.positions.of_time_point(TimePoint(15))
+
+
+def test_invalid_time_range():
+    from napari_organoidtracker._experiment import Experiment
+    with pytest.raises(ValueError):
+        Experiment().view(range(5, 5))
+    with pytest.raises(ValueError):
+        Experiment().view(range(0, 10, 2))
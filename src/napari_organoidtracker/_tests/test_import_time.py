@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+
+# Modules that must only be imported once a file is actually read
+_HEAVY_MODULES = ["numpy", "napari_organoidtracker._aut_parser", "napari_organoidtracker._experiment",
+                  "napari_organoidtracker._links", "napari_organoidtracker._position",
+                  "napari_organoidtracker._position_collection", "napari_organoidtracker._position_data"]
+
+# Total time spent in our own modules (so excluding the standard library) when importing the package
+_BUDGET_OWN_IMPORT_TIME_US = 20_000
+
+
+def _run_python(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                          check=True)
+
+
+def test_import_is_light():
+    result = _run_python("import napari_organoidtracker")
+
+    # Lines are formatted like "import time:   self [us] | cumulative | imported package"
+    own_import_time_us = 0
+    imported_modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, module_name = line[len("import time:"):].split("|")
+        module_name = module_name.strip()
+        imported_modules.add(module_name)
+        if module_name.startswith("napari_organoidtracker"):
+            own_import_time_us += int(self_time)
+
+    for heavy_module in _HEAVY_MODULES:
+        assert heavy_module not in imported_modules
+    assert own_import_time_us <= _BUDGET_OWN_IMPORT_TIME_US
+
+
+def test_rejecting_file_imports_nothing_heavy():
+    aut_file = os.path.join(os.path.dirname(__file__), "E482-AZ-pos3.aut")
+    code = ("import sys\n"
+            "from napari_organoidtracker import napari_get_reader\n"
+            "assert napari_get_reader('image.tif') is None\n"
+            "assert napari_get_reader('missing.aut') is None\n"
+            f"assert callable(napari_get_reader({aut_file!r}))\n"
+            f"print([module for module in {_HEAVY_MODULES!r} if module in sys.modules])")
+    result = _run_python(code)
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,33 @@
+import os
+
+import pytest
+
+from napari_organoidtracker import _json_backend
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+from napari_organoidtracker._tests._utils import get_contents
+
+
+@pytest.mark.parametrize("version", ["v1", "v2"])
+@pytest.mark.parametrize("backend_name", _json_backend.BACKEND_NAMES)
+def test_identical_experiments(tmp_path, version, backend_name):
+    if not _json_backend.is_backend_available(backend_name):
+        pytest.skip(f"{backend_name} is not installed")
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, version=version, time_point_count=5, cell_count=10, division_rate=0.1,
+                             metadata={"volume": float, "cell_type": str, "is_dividing": bool})
+
+    expected = get_contents(_read_organoidtracker_file(file_path, json_backend="json"))
+    actual = get_contents(_read_organoidtracker_file(file_path, json_backend=backend_name))
+    assert actual == expected
+
+
+def test_select_backend(monkeypatch):
+    monkeypatch.setenv("NAPARI_ORGANOIDTRACKER_JSON_BACKEND", "json")
+    assert _json_backend.get_backend().name == "json"
+
+    monkeypatch.delenv("NAPARI_ORGANOIDTRACKER_JSON_BACKEND")
+    assert _json_backend.get_backend().name in _json_backend.BACKEND_NAMES
+
+    with pytest.raises(ValueError):
+        _json_backend.get_backend("fastest")
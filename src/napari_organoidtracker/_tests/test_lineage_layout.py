@@ -0,0 +1,85 @@
+import os
+import time
+
+import numpy
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._lineage_layout import compute_lineage_layout
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+
+
+def _layout_recursively(links):
+    """Straightforward recursive version of the layout, to compare against."""
+    track_ids = {id(track): track_id for track_id, track in links.find_all_tracks_and_ids()}
+    track_x = dict()
+    leaves = list()
+
+    def place(track) -> float:
+        next_tracks = sorted(track._next_tracks, key=lambda next_track: track_ids[id(next_track)])
+        if len(next_tracks) == 0:
+            leaves.append(track_ids[id(track)])
+            x = float(len(leaves) - 1)
+        else:
+            children_x = [place(next_track) for next_track in next_tracks]
+            x = (children_x[0] + children_x[-1]) / 2
+        track_x[track_ids[id(track)]] = x
+        return x
+
+    for track_id, track in links.find_all_tracks_and_ids():
+        if len(track.get_previous_tracks()) == 0:
+            place(track)
+    return track_x, leaves
+
+
+def test_against_recursive_layout(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=40, cell_count=15, division_rate=0.05)
+    links = _read_organoidtracker_file(file_path).links
+
+    layout = links.create_lineage_layout()
+    expected_x, expected_leaves = _layout_recursively(links)
+    assert layout.division_track_ids.tolist() == [track_id for track_id, track in links.find_all_tracks_and_ids()
+                                                  if track.will_divide()]
+    assert layout.track_x.tolist() == [expected_x[track_id] for track_id in range(len(layout))]
+    assert layout.leaf_track_ids.tolist() == expected_leaves
+    for track_id, track in links.find_all_tracks_and_ids():
+        root_track = track
+        while len(root_track.get_previous_tracks()) > 0:
+            root_track = next(iter(root_track.get_previous_tracks()))
+        assert layout.root_track_ids[track_id] == links.get_track_id(root_track)
+
+    # The line of a next track starts where the line of the dividing track ends, at the division line
+    segments = layout.all_segments()
+    assert segments.shape == (len(layout) + len(layout.division_track_ids), 2, 2)
+    for division_segment, track_id in zip(layout.division_segments(), layout.division_track_ids.tolist()):
+        track = links.get_track_by_id(track_id)
+        assert division_segment[0, 1] == division_segment[1, 1] == track.last_time_point_number()
+        for next_track in track.get_next_tracks():
+            next_track_segment = segments[links.get_track_id(next_track)]
+            assert next_track_segment[0, 1] == track.last_time_point_number()
+            assert division_segment[0, 0] <= next_track_segment[0, 0] <= division_segment[1, 0]
+
+
+def test_many_tracks():
+    # Random binary trees: every track divides with a 50% chance
+    random = numpy.random.default_rng(5)
+    parent_track_ids = [-1] * 1000
+    last_time_point_numbers = [9] * 1000
+    for track_id in range(200_000):
+        if random.random() < 0.5:
+            parent_track_ids += [track_id, track_id]
+            last_time_point_numbers += [last_time_point_numbers[track_id] + 10] * 2
+        if len(parent_track_ids) >= 200_000:
+            break
+    parent_track_ids = numpy.array(parent_track_ids)
+    last_time_point_numbers = numpy.array(last_time_point_numbers)
+
+    start_time = time.perf_counter()
+    layout = compute_lineage_layout(last_time_point_numbers - 9, last_time_point_numbers, parent_track_ids)
+    assert time.perf_counter() - start_time < 1
+
+    leaf_count = len(layout.leaf_track_ids)
+    assert sorted(layout.track_x[layout.leaf_track_ids].tolist()) == list(range(leaf_count))
+    assert numpy.all(numpy.diff(layout.track_x[layout.leaf_track_ids]) == 1)
+    has_parent = parent_track_ids >= 0
+    assert numpy.all(layout.root_track_ids[has_parent] == layout.root_track_ids[parent_track_ids[has_parent]])
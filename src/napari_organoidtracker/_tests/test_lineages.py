@@ -0,0 +1,70 @@
+import os
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._experiment import _experiment_to_napari
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+
+
+def _read_experiment(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=20, cell_count=10, division_rate=0.1,
+                             metadata={"volume": float, "cell_type": str})
+    experiment = _read_organoidtracker_file(file_path)
+    for track in experiment.links.find_starting_tracks():
+        experiment.links.set_lineage_data(track, "name", "lineage " + str(track.find_first_position()))
+    return experiment
+
+
+def test_subset_lineages(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    dividing_roots = [track for track in experiment.links.find_starting_tracks()
+                      if any(track.will_divide() for track in track.find_all_descending_tracks(include_self=True))]
+    roots = dividing_roots[:2]
+    assert len(roots) == 2
+
+    subset = experiment.subset_lineages(roots)
+    subset.links.debug_sanity_check()
+
+    expected_positions = {position for root in roots for track in root.find_all_descending_tracks(include_self=True)
+                          for position in track.positions()}
+    assert set(subset.positions) == expected_positions
+    assert set(subset.links.find_all_positions()) == expected_positions
+    expected_links = {(position1, position2) for position1, position2 in experiment.links.find_all_links()
+                      if position1 in expected_positions}
+    assert set(subset.links.find_all_links()) == expected_links
+    for position in expected_positions:
+        assert dict(subset.position_data.find_all_data_of_position(position)) \
+               == dict(experiment.position_data.find_all_data_of_position(position))
+    for root in roots:
+        copied_root = subset.links.get_track(root.find_first_position())
+        assert dict(subset.links.find_all_data_of_lineage(copied_root)) \
+               == dict(experiment.links.find_all_data_of_lineage(root))
+
+    # The original is not modified
+    experiment.links.debug_sanity_check()
+    assert len(list(experiment.links.find_starting_tracks())) == 10
+
+    layers = _experiment_to_napari(subset)
+    assert len(layers[0][0]) == len(expected_positions)
+    assert len(layers[0][1]["metadata"]["lineage_meta"]) == 2
+
+
+def test_extract_lineage_from_middle(tmp_path):
+    # Extracting the lineage of a track after a division leaves out the mother cell, but keeps the lineage data
+    experiment = _read_experiment(tmp_path)
+    mother_track = next(track for track in experiment.links.find_all_tracks() if track.will_divide())
+    daughter_track = next(iter(mother_track.get_next_tracks()))
+
+    links = experiment.links.extract_lineages([daughter_track, mother_track, daughter_track])
+    links.debug_sanity_check()
+    assert next(links.find_all_tracks()).find_first_position() == daughter_track.find_first_position()
+    assert len(list(links.find_all_tracks())) == len(list(mother_track.find_all_descending_tracks(include_self=True)))
+    copied_mother_track = links.get_track(mother_track.find_first_position())
+    assert len(copied_mother_track.get_previous_tracks()) == 0
+    assert dict(links.find_all_data_of_lineage(copied_mother_track)) \
+           == dict(experiment.links.find_all_data_of_lineage(mother_track))
+
+    links = experiment.links.extract_lineages([daughter_track])
+    copied_daughter_track = links.get_track(daughter_track.find_first_position())
+    assert dict(links.find_all_data_of_lineage(copied_daughter_track)) \
+           == dict(experiment.links.find_all_data_of_lineage(daughter_track))
@@ -0,0 +1,131 @@
+import json
+import os
+
+import numpy
+import pytest
+
+from napari_organoidtracker import _json_backend
+from napari_organoidtracker._live_reload import LiveReloader, update_tracks_layer
+from napari_organoidtracker._reader import reader_function
+from napari_organoidtracker._synthetic import generate_synthetic_data
+
+
+def _write_tracks(data, file_path, track_count, modification_number):
+    """Writes all time points, but only the given number of tracks."""
+    with open(file_path, "w") as handle:
+        json.dump({"version": "v2", "positions": data["positions"], "tracks": data["tracks"][:track_count]}, handle)
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + modification_number * 1_000_000_000))
+
+
+def _write_first_time_points(data, file_path, last_time_point_number):
+    """Writes the v2 data up to and including the given time point, like a tracker that is still running."""
+    positions_json = [time_point_json for time_point_json in data["positions"]
+                      if time_point_json["time_point"] <= last_time_point_number]
+    tracks_json = [{**track_json, "coords_xyz_px": track_json["coords_xyz_px"][
+                                                   :last_time_point_number - track_json["time_point_start"] + 1]}
+                   for track_json in data["tracks"] if track_json["time_point_start"] <= last_time_point_number]
+    with open(file_path, "w") as handle:
+        json.dump({"version": "v2", "positions": positions_json, "tracks": tracks_json}, handle)
+
+    # Make sure that the modification time changes, even on file systems with a coarse clock
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + last_time_point_number * 1_000_000_000))
+
+
+def _assert_same_layer_data(layer_data, expected_layer_data):
+    assert numpy.array_equal(layer_data[0], expected_layer_data[0])
+    assert layer_data[1]["graph"] == expected_layer_data[1]["graph"]
+    assert layer_data[1]["features"].keys() == expected_layer_data[1]["features"].keys()
+    for metadata_key, values in expected_layer_data[1]["features"].items():
+        assert numpy.array_equal(layer_data[1]["features"][metadata_key], values)
+
+
+def test_growing_file(tmp_path):
+    data = generate_synthetic_data(time_point_count=8, cell_count=10, division_rate=0.1,
+                                   metadata={"volume": float, "is_dividing": bool, "cell_type": str})
+    file_path = os.path.join(tmp_path, "live.aut")
+    _write_first_time_points(data, file_path, 4)
+
+    reloader = LiveReloader(file_path)
+    assert reloader.reload()
+    assert reloader.changed_time_point_count == 5
+    _assert_same_layer_data(reloader.get_layer_data(), reader_function(file_path)[0])
+    assert not reloader.reload()  # Nothing changed
+
+    # Only the new time points, and the tracks that were still running, need to be parsed again
+    unchanged_track_count = sum(1 for track_json in data["tracks"]
+                                if track_json["time_point_start"] + len(track_json["coords_xyz_px"]) - 1 <= 4)
+    _write_first_time_points(data, file_path, 7)
+    assert reloader.reload()
+    assert reloader.changed_time_point_count == 3
+    assert reloader.changed_track_count == len(data["tracks"]) - unchanged_track_count
+    _assert_same_layer_data(reloader.get_layer_data(), reader_function(file_path)[0])
+
+
+@pytest.mark.parametrize("backend_name", _json_backend.BACKEND_NAMES)
+def test_added_tracks(tmp_path, backend_name):
+    if not _json_backend.is_backend_available(backend_name):
+        pytest.skip(f"{backend_name} is not installed")
+    data = generate_synthetic_data(time_point_count=6, cell_count=10, division_rate=0.2,
+                                   metadata={"volume": float, "cell_type": str})
+    file_path = os.path.join(tmp_path, "live.aut")
+    track_count = len(data["tracks"])
+    _write_tracks(data, file_path, track_count // 2, 1)
+
+    reloader = LiveReloader(file_path, json_backend=backend_name)
+    assert reloader.reload()
+    assert not reloader.was_extended
+    first_layer_data = reloader.get_layer_data()
+    first_graph = dict(first_layer_data[1]["graph"])
+    _assert_same_layer_data(first_layer_data, reader_function(file_path, use_cache=False)[0])
+
+    _write_tracks(data, file_path, track_count, 2)
+    assert reloader.reload()
+    assert reloader.was_extended
+    assert reloader.changed_time_point_count == 0
+    assert reloader.changed_track_count == track_count - track_count // 2
+    _assert_same_layer_data(reloader.get_layer_data(), reader_function(file_path, use_cache=False)[0])
+    assert first_layer_data[1]["graph"] == first_graph  # The previous layer data was not modified
+
+    # Removing tracks needs a full rebuild
+    _write_tracks(data, file_path, track_count - 1, 3)
+    assert reloader.reload()
+    assert not reloader.was_extended
+    _assert_same_layer_data(reloader.get_layer_data(), reader_function(file_path, use_cache=False)[0])
+
+
+def test_file_being_written(tmp_path):
+    data = generate_synthetic_data(time_point_count=3, cell_count=5)
+    file_path = os.path.join(tmp_path, "live.aut")
+    _write_first_time_points(data, file_path, 2)
+    reloader = LiveReloader(file_path)
+    assert reloader.reload()
+    layer_data = reloader.get_layer_data()
+
+    with open(file_path, "w") as handle:
+        handle.write('{"version": "v2", "positions": [')
+    assert not reloader.reload(force=True)
+    assert reloader.get_layer_data() is layer_data
+
+
+class _FakeTracksLayer:
+    def __init__(self):
+        self.data = None
+        self.graph = None
+        self.features = None
+        self.metadata = {"name_of_user_setting": 1}
+
+
+def test_update_tracks_layer(tmp_path):
+    data = generate_synthetic_data(time_point_count=3, cell_count=5, division_rate=0.5)
+    file_path = os.path.join(tmp_path, "live.aut")
+    _write_first_time_points(data, file_path, 2)
+    reloader = LiveReloader(file_path)
+    reloader.reload()
+
+    layer = _FakeTracksLayer()
+    update_tracks_layer(layer, reloader.get_layer_data())
+    assert layer.data is reloader.get_layer_data()[0]
+    assert layer.graph == reloader.get_layer_data()[1]["graph"]
+    assert layer.metadata == {"name_of_user_setting": 1, "first_time_point_number": 0}
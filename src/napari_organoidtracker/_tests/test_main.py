@@ -0,0 +1,129 @@
+import json
+import os
+
+import numpy
+import pytest
+
+from napari_organoidtracker.__main__ import main
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._binary_format import read_binary_file
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+from napari_organoidtracker._tests._utils import get_contents, get_metadata_types
+from napari_organoidtracker._track_table import TrackTable
+from napari_organoidtracker._writer import write_experiment
+
+
+def _write_files(tmp_path):
+    file_paths = list()
+    for i in range(3):
+        file_path = os.path.join(tmp_path, f"synthetic{i}.aut")
+        write_synthetic_aut_file(file_path, time_point_count=5, cell_count=10 + i, division_rate=0.1,
+                                 metadata={"volume": float, "cell_type": str}, seed=i)
+        file_paths.append(file_path)
+    return file_paths
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_inspect(tmp_path, capsys, workers):
+    file_paths = _write_files(tmp_path)
+    assert main(["inspect", *file_paths, "--json", "--workers", workers]) == 0
+
+    results = json.loads(capsys.readouterr().out)
+    assert [result["file"] for result in results] == file_paths
+    for file_path, result in zip(file_paths, results):
+        experiment = _read_organoidtracker_file(file_path)
+        assert result["version"] == "v2"
+        assert result["position_count"] == len(experiment.positions)
+        assert result["link_count"] == len(experiment.links)
+        assert result["first_time_point_number"] == 0 and result["last_time_point_number"] == 4
+        assert result["position_metadata"] == {"volume": "float", "cell_type": "str"}
+
+
+def test_inspect_failure(tmp_path, capsys):
+    file_paths = _write_files(tmp_path)
+    missing_file = os.path.join(tmp_path, "missing.aut")
+    assert main(["inspect", file_paths[0], missing_file, "--workers", "1"]) == 1
+
+    captured = capsys.readouterr()
+    assert file_paths[0] in captured.out and "positions:" in captured.out
+    assert "Inspected 1 of 2 files" in captured.err
+    assert missing_file + ": FileNotFoundError" in captured.err
+
+
+@pytest.mark.parametrize("workers", ["1", "2"])
+def test_convert_npz(tmp_path, workers):
+    file_paths = _write_files(tmp_path)
+    output_directory = os.path.join(tmp_path, "output")
+    assert main(["convert", *file_paths, "--to", "npz", "--output-dir", output_directory, "--event-layers",
+                 "--workers", workers]) == 0
+
+    for i, file_path in enumerate(file_paths):
+        experiment = _read_organoidtracker_file(file_path)
+        with numpy.load(os.path.join(output_directory, f"synthetic{i}.npz")) as arrays:
+            assert arrays["tracks"].shape == (len(experiment.positions), 5)
+            assert len(arrays["features/volume"]) == len(experiment.positions)
+            assert len(arrays["graph_track_ids"]) == len(arrays["graph_parent_track_ids"]) \
+                   == sum(len(track.get_next_tracks()) for track in experiment.links.find_all_tracks())
+            assert "points/Cell divisions" in arrays
+            assert int(arrays["first_time_point_number"]) == 0
+
+            # Strings are stored as codes into a table of all strings
+            positions = TrackTable.from_links(experiment.links).positions
+            cell_types = arrays["categories/cell_type"][arrays["features/cell_type"]].tolist()
+            assert cell_types == [experiment.position_data.get_position_data(position, "cell_type")
+                                  for position in positions]
+
+
+def test_convert_formats(tmp_path):
+    file_path = _write_files(tmp_path)[0]
+    experiment = _read_organoidtracker_file(file_path)
+
+    assert main(["convert", file_path, "--to", "autb"]) == 0
+    binary_experiment = read_binary_file(os.path.join(tmp_path, "synthetic0.autb"))
+    assert len(binary_experiment.positions) == len(experiment.positions)
+
+    # And back, compressed
+    assert main(["convert", os.path.join(tmp_path, "synthetic0.autb"), "--to", "aut.gz"]) == 0
+    compressed_experiment = _read_organoidtracker_file(os.path.join(tmp_path, "synthetic0.aut.gz"))
+    assert set(compressed_experiment.links.find_all_links()) == set(experiment.links.find_all_links())
+
+    # Never overwrite the input file
+    assert main(["convert", file_path, "--to", "aut"]) == 1
+
+
+def test_convert_is_lossless(tmp_path):
+    file_path = _write_files(tmp_path)[0]
+    experiment = _read_organoidtracker_file(file_path)
+    position = next(iter(experiment.positions))
+    experiment.position_data.set_position_data(position, "volume", None)
+    experiment.position_data.set_position_data(position, "cell_type", "stem cell")
+    experiment.positions.add(Position(1.123456789, 2.1, 3.0, time_point_number=2))  # Without links or metadata
+    write_experiment(file_path, experiment)
+
+    output_directory = os.path.join(tmp_path, "output")
+    for output_format, read in [("autb", read_binary_file), ("aut.gz", _read_organoidtracker_file)]:
+        assert main(["convert", file_path, "--to", output_format, "--output-dir", output_directory]) == 0
+        converted_experiment = read(os.path.join(output_directory, "synthetic0." + output_format))
+        assert get_contents(converted_experiment) == get_contents(experiment)
+
+
+def test_convert_keeps_metadata_types(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=5, cell_count=10, division_rate=0.1,
+                             metadata={"intensity": int, "volume": float, "is_dividing": bool, "cell_type": str},
+                             seed=1)
+    experiment = _read_organoidtracker_file(file_path)
+
+    # To binary and back
+    binary_directory = os.path.join(tmp_path, "binary")
+    json_directory = os.path.join(tmp_path, "json")
+    assert main(["convert", file_path, "--to", "autb", "--output-dir", binary_directory]) == 0
+    assert main(["convert", os.path.join(binary_directory, "synthetic.autb"), "--to", "aut",
+                 "--output-dir", json_directory]) == 0
+    converted_experiment = _read_organoidtracker_file(os.path.join(json_directory, "synthetic.aut"))
+
+    assert get_contents(converted_experiment) == get_contents(experiment)
+    assert get_metadata_types(converted_experiment) == get_metadata_types(experiment)
+    assert {type(value) for _, value in converted_experiment.position_data.find_all_positions_with_data(
+        "intensity")} == {int}
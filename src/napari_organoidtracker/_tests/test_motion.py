@@ -0,0 +1,57 @@
+import os
+
+import numpy
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._motion import MOTION_FEATURE_NAMES, compute_motion_features
+from napari_organoidtracker._reader import napari_get_reader_with_motion_features, reader_function
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+from napari_organoidtracker._track_table import TrackTable
+
+
+def _read_track_table(tmp_path) -> TrackTable:
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=20, cell_count=15, division_rate=0.1,
+                             disappearance_rate=0.02)
+    return TrackTable.from_links(_read_organoidtracker_file(file_path).links)
+
+
+def test_against_brute_force(tmp_path):
+    track_table = _read_track_table(tmp_path)
+    features = compute_motion_features(track_table)
+    assert tuple(features.keys()) == MOTION_FEATURE_NAMES
+    last_rows = track_table.last_rows()
+
+    for track_id in range(track_table.track_count()):
+        rows = numpy.arange(track_table.track_offsets[track_id], track_table.track_offsets[track_id + 1])
+        coords = track_table.coords_xyz[rows]
+        previous_track_ids = track_table.get_previous_track_ids(track_id)
+        previous_coords = coords[0] if len(previous_track_ids) == 0 else \
+            track_table.coords_xyz[last_rows[previous_track_ids[0]]]
+        velocity = numpy.diff(numpy.vstack([previous_coords, coords]), axis=0)
+        divides = track_table.next_counts[track_id] > 1
+
+        for age, row in enumerate(rows):
+            assert numpy.allclose(features["velocity_x"][row], velocity[age, 0])
+            assert numpy.allclose(features["velocity_y"][row], velocity[age, 1])
+            assert numpy.allclose(features["velocity_z"][row], velocity[age, 2])
+            assert numpy.isclose(features["speed"][row], numpy.linalg.norm(velocity[age]))
+            assert numpy.isclose(features["displacement"][row], numpy.linalg.norm(coords[age] - coords[0]))
+            expected_msd = numpy.mean(numpy.sum((coords[age:] - coords[:len(coords) - age]) ** 2, axis=1))
+            assert numpy.isclose(features["msd"][row], expected_msd, atol=1e-6)
+            assert features["age"][row] == age
+            assert features["time_until_division"][row] == (len(rows) - 1 - age if divides else -1)
+
+
+def test_reader(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=5, cell_count=5, metadata={"volume": float})
+
+    reader = napari_get_reader_with_motion_features(file_path)
+    assert callable(reader)
+    features = reader(file_path)[0][1]["features"]
+    assert set(features.keys()) == {"volume", *MOTION_FEATURE_NAMES}
+    assert len(features["speed"]) == 25
+
+    # Not added by default
+    assert reader_function(file_path)[0][1]["features"].keys() == {"volume"}
@@ -0,0 +1,87 @@
+import os
+
+import numpy
+import pytest
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._experiment import _experiment_to_napari
+from napari_organoidtracker._neighbours import NEIGHBOUR_FEATURE_NAMES, _find_close_pairs, build_neighbour_graphs, \
+    find_neighbours, store_neighbour_features
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+
+
+def _brute_force_distances(coords_xyz):
+    distances = numpy.linalg.norm(coords_xyz[:, numpy.newaxis, :] - coords_xyz[numpy.newaxis, :, :], axis=2)
+    numpy.fill_diagonal(distances, numpy.inf)  # Points are not their own neighbour
+    return distances
+
+
+@pytest.mark.parametrize("point_count", [0, 1, 2, 200])
+def test_radius_against_brute_force(point_count):
+    coords_xyz = numpy.random.default_rng(1).uniform(0, 100, size=(point_count, 3))
+    offsets, indices, distances = find_neighbours(coords_xyz, radius=15)
+    assert len(offsets) == point_count + 1
+
+    all_distances = _brute_force_distances(coords_xyz)
+    for i in range(point_count):
+        neighbours = indices[offsets[i]:offsets[i + 1]]
+        assert set(neighbours.tolist()) == set(numpy.flatnonzero(all_distances[i] <= 15).tolist())
+        assert numpy.allclose(distances[offsets[i]:offsets[i + 1]], all_distances[i, neighbours])
+        assert numpy.all(numpy.diff(distances[offsets[i]:offsets[i + 1]]) >= 0)
+
+
+@pytest.mark.parametrize("k", [1, 6, 500])
+def test_k_nearest_against_brute_force(k):
+    coords_xyz = numpy.random.default_rng(2).uniform(0, 100, size=(200, 3))
+    coords_xyz[:, 2] = numpy.round(coords_xyz[:, 2] / 10)  # Few z layers, like in microscopy images
+    offsets, indices, distances = find_neighbours(coords_xyz, k=k)
+
+    all_distances = _brute_force_distances(coords_xyz)
+    expected_count = min(k, len(coords_xyz) - 1)
+    for i in range(len(coords_xyz)):
+        assert offsets[i + 1] - offsets[i] == expected_count
+        expected_distances = numpy.sort(all_distances[i])[:expected_count]
+        assert numpy.allclose(distances[offsets[i]:offsets[i + 1]], expected_distances)
+        assert numpy.allclose(all_distances[i, indices[offsets[i]:offsets[i + 1]]], expected_distances)
+
+
+def test_huge_grid():
+    # With a cube size of 0.001, the grid has about 1e10 cubes along every axis, so 1e30 in total: too many for int64
+    coords_xyz = numpy.array([[0, 0, 0], [0.0005, 0, 0], [1e7, 1e7, 1e7], [1e7, 1e7, 1e7 + 0.0005], [1e7, 0, 5e6]])
+    queries, neighbours, distances = _find_close_pairs(coords_xyz, coords_xyz, 0.001)
+
+    pairs = set(zip(queries.tolist(), neighbours.tolist()))
+    assert pairs == {(0, 0), (0, 1), (1, 0), (1, 1), (2, 2), (2, 3), (3, 2), (3, 3), (4, 4)}
+    assert numpy.all(distances <= 0.001)
+
+
+def test_k_or_radius():
+    with pytest.raises(ValueError):
+        find_neighbours(numpy.zeros((2, 3)))
+    with pytest.raises(ValueError):
+        find_neighbours(numpy.zeros((2, 3)), k=2, radius=10)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_experiment_features(tmp_path, max_workers):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=4, cell_count=30, division_rate=0)
+    experiment = _read_organoidtracker_file(file_path)
+
+    graphs = build_neighbour_graphs(experiment.positions, k=5, scale_xyz=(0.3, 0.3, 2), max_workers=max_workers)
+    assert sorted(graphs.keys()) == [0, 1, 2, 3]
+    graph = graphs[2]
+    assert len(graph) == 30
+    assert numpy.all(graph.neighbour_counts() == 5)
+    nearest = graph.get_neighbours(0)[0]
+    assert nearest.time_point_number() == 2
+    position = graph.positions[0]
+    assert graph.distances[0] == pytest.approx(numpy.linalg.norm(
+        numpy.array([nearest.x - position.x, nearest.y - position.y, nearest.z - position.z]) * (0.3, 0.3, 2)))
+
+    store_neighbour_features(experiment.position_data, graphs)
+    features = _experiment_to_napari(experiment)[0][1]["features"]
+    for feature_name in NEIGHBOUR_FEATURE_NAMES:
+        assert len(features[feature_name]) == 120
+    assert set(features["neighbour_count"]) == {5}
+    assert min(features["local_density"]) > 0
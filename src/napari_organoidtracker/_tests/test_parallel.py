@@ -0,0 +1,17 @@
+import pytest
+
+from napari_organoidtracker._parallel import map_in_batches
+
+
+def _multiply_all(values, factor):
+    return [value * factor for value in values]
+
+
+@pytest.mark.parametrize("max_workers", [1, 2, 3])
+def test_map_in_batches(max_workers):
+    values = list(range(25))
+    assert map_in_batches(_multiply_all, values, 3, max_workers=max_workers) == [value * 3 for value in values]
+
+
+def test_map_in_batches_empty():
+    assert map_in_batches(_multiply_all, [], 3, max_workers=2) == []
@@ -0,0 +1,149 @@
+"""Performance regression tests. Absolute timings differ between machines, so every throughput is compared against a
+calibration workload (plain Python object creation and dictionary inserts, the same kind of work that the reader does)
+that is run on the same machine. The budgets are set at roughly a third of the measured throughput, so that only real
+regressions make these tests fail, not noise.
+
+In addition, some operations are timed at two sizes, to check that they scale linearly. That catches code that quietly
+became quadratic, even on machines where the absolute numbers are off.
+
+Run only these tests with `pytest -m performance`, or skip them with `pytest -m "not performance"`."""
+
+import gc
+import os
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+import pytest
+
+from napari_organoidtracker._aut_parser import _parse_organoidtracker_data, _read_organoidtracker_file
+from napari_organoidtracker._experiment import Experiment, _experiment_to_napari
+from napari_organoidtracker._synthetic import generate_synthetic_data, write_synthetic_aut_file
+
+pytestmark = pytest.mark.performance
+
+_CALIBRATION_OPERATIONS = 200_000
+
+# Minimal throughput, as a fraction of the calibration throughput
+_BUDGET_PARSE_V1 = 0.015
+_BUDGET_PARSE_V2 = 0.04
+_BUDGET_GET_TRACK = 0.4
+_BUDGET_EXPERIMENT_TO_NAPARI = 0.15
+
+_BUDGET_BYTES_PER_POSITION = 2000  # Peak memory while reading a file, per position
+_MAX_SCALING_FACTOR = 8  # For four times as much data, linear code takes four times as long, quadratic code sixteen
+
+
+class _CalibrationObject:
+    __slots__ = ["x", "y"]
+
+    def __init__(self, x: float, y: float):
+        self.x = x
+        self.y = y
+
+
+def _best_time(function: Callable[[], Any], repeat: int = 5) -> float:
+    """Runs the function a few times, and returns the fastest time in seconds. The garbage collector is disabled while
+    timing, as its (non-linear) pauses are the largest source of noise."""
+    best = float("inf")
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return best
+
+
+def _calibration_workload():
+    values = dict()
+    for i in range(_CALIBRATION_OPERATIONS):
+        values[f"{i} {i * 0.5:.2f}"] = _CalibrationObject(i, i * 0.5)
+
+
+@pytest.fixture(scope="module")
+def calibration_throughput() -> float:
+    """Operations per second of the calibration workload on this machine."""
+    return _CALIBRATION_OPERATIONS / _best_time(_calibration_workload)
+
+
+def _settings(position_count: int) -> Dict[str, Any]:
+    time_point_count = 20
+    return {"time_point_count": time_point_count, "cell_count": position_count // time_point_count,
+            "division_rate": 0.02, "disappearance_rate": 0.02, "metadata": {"volume": float, "cell_type": str},
+            "seed": 1}
+
+
+def _synthetic_experiment(position_count: int) -> Experiment:
+    return _parse_organoidtracker_data(generate_synthetic_data(**_settings(position_count)))
+
+
+@pytest.mark.parametrize("version,budget", [("v1", _BUDGET_PARSE_V1), ("v2", _BUDGET_PARSE_V2)])
+def test_parse_throughput(tmp_path, calibration_throughput, version, budget):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, version=version, **_settings(20_000))
+    position_count = len(_read_organoidtracker_file(file_path).positions)
+
+    throughput = position_count / _best_time(lambda: _read_organoidtracker_file(file_path))
+    assert throughput >= budget * calibration_throughput, \
+        f"Parsing {version} files is too slow: {throughput:.0f} positions/s"
+
+
+def test_get_track_throughput(calibration_throughput):
+    links = _synthetic_experiment(20_000).links
+    positions = list(links.find_all_positions())
+
+    def look_up_all():
+        for position in positions:
+            links.get_track(position)
+
+    throughput = len(positions) / _best_time(look_up_all)
+    assert throughput >= _BUDGET_GET_TRACK * calibration_throughput, \
+        f"Links.get_track is too slow: {throughput:.0f} lookups/s"
+
+
+def test_experiment_to_napari_throughput(calibration_throughput):
+    experiment = _synthetic_experiment(20_000)
+    row_count = len(_experiment_to_napari(experiment)[0][0])
+
+    throughput = row_count / _best_time(lambda: _experiment_to_napari(experiment))
+    assert throughput >= _BUDGET_EXPERIMENT_TO_NAPARI * calibration_throughput, \
+        f"Converting to napari is too slow: {throughput:.0f} rows/s"
+
+
+def test_read_peak_memory_per_position(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, version="v2", **_settings(20_000))
+
+    tracemalloc.start()
+    try:
+        experiment = _read_organoidtracker_file(file_path)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    bytes_per_position = peak_memory / len(experiment.positions)
+    assert bytes_per_position <= _BUDGET_BYTES_PER_POSITION, \
+        f"Reading uses too much memory: {bytes_per_position:.0f} bytes/position"
+
+
+@pytest.mark.parametrize("operation", ["parse", "experiment_to_napari", "links_copy", "position_data_copy"])
+def test_linear_scaling(operation):
+    def get_operation(position_count: int) -> Callable[[], Any]:
+        if operation == "parse":
+            data = generate_synthetic_data(**_settings(position_count))
+            return lambda: _parse_organoidtracker_data(data)
+        experiment = _synthetic_experiment(position_count)
+        if operation == "experiment_to_napari":
+            return lambda: _experiment_to_napari(experiment)
+        if operation == "links_copy":
+            return experiment.links.copy
+        return experiment.position_data.copy
+
+    small_time = _best_time(get_operation(10_000))
+    large_time = _best_time(get_operation(40_000))
+    assert large_time <= _MAX_SCALING_FACTOR * small_time, \
+        f"{operation} does not scale linearly: {small_time:.4f}s for 10000 positions, {large_time:.4f}s for 40000"
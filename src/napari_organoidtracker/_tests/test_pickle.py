@@ -0,0 +1,78 @@
+import os
+import pickle
+
+import numpy
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+from napari_organoidtracker._tests._utils import get_contents
+from napari_organoidtracker._track_table import TrackTable
+
+
+def _read_experiment(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=8, cell_count=10, division_rate=0.1,
+                             metadata={"volume": float, "cell_type": str, "is_dividing": bool, "count": int})
+    experiment = _read_organoidtracker_file(file_path)
+    experiment.positions.add(Position(1.234, 2, 3, time_point_number=4))  # A position without links
+    experiment.links.set_lineage_data(experiment.links._tracks[0], "name", "first lineage")
+    return experiment
+
+
+def test_experiment(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    copy = pickle.loads(pickle.dumps(experiment))
+
+    assert get_contents(copy) == get_contents(experiment)
+    assert copy.position_data.get_data_names_and_types() == experiment.position_data.get_data_names_and_types()
+    assert copy.positions.first_time_point_number() == experiment.positions.first_time_point_number()
+    assert copy.positions.last_time_point_number() == experiment.positions.last_time_point_number()
+    copy.links.debug_sanity_check()
+
+    # Coordinates, track order and metadata types are exactly the same
+    track_table = TrackTable.from_links(experiment.links)
+    copied_track_table = TrackTable.from_links(copy.links)
+    assert numpy.array_equal(copied_track_table.coords_xyz, track_table.coords_xyz)
+    assert numpy.array_equal(copied_track_table.previous_track_ids, track_table.previous_track_ids)
+    position = track_table.positions[3]
+    for data_name in ["volume", "cell_type", "is_dividing", "count"]:
+        value = experiment.position_data.get_position_data(position, data_name)
+        copied_value = copy.position_data.get_position_data(position, data_name)
+        assert copied_value == value and type(copied_value) == type(value)
+
+
+def test_position():
+    position = Position(1.5, 2.25, 3, time_point_number=7)
+    copy = pickle.loads(pickle.dumps(position))
+    assert (copy.x, copy.y, copy.z, copy.time_point_number()) == (1.5, 2.25, 3.0, 7)
+    assert pickle.loads(pickle.dumps(Position(1, 2, 3))).time_point_number() is None
+
+
+def test_track(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    track = next(track for track in experiment.links._tracks if track.will_divide())
+    copy = pickle.loads(pickle.dumps(track))
+    assert list(copy.positions()) == list(track.positions())
+    assert len(copy.get_next_tracks()) == len(track.get_next_tracks())
+
+
+def test_links_index_built_on_first_use(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    copy = pickle.loads(pickle.dumps(experiment.links))
+    assert copy._position_to_track is None
+
+    track = experiment.links._tracks[5]
+    assert copy.get_track(track.find_first_position()).find_first_position() == track.find_first_position()
+    assert len(copy._get_position_to_track()) == len(experiment.links._get_position_to_track())
+    assert copy.get_track(Position(1.234, 2, 3, time_point_number=4)) is None
+
+
+def test_size(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    position_count = len(list(experiment.positions))
+
+    # Close to the 24 bytes per position needed for the coordinates, plus some fixed overhead
+    assert len(pickle.dumps(experiment.positions)) < 30 * position_count + 2000
+    assert len(pickle.dumps(experiment.links)) < 30 * position_count + 2000
+
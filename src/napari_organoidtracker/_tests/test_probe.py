@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+from napari_organoidtracker import _probe, napari_get_reader
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._probe import probe_aut_file
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+
+
+def test_header_only():
+    my_test_file = os.path.join(os.path.dirname(__file__), "E482-AZ-pos3.aut")
+
+    summary = probe_aut_file(my_test_file, header_size=1024)
+    assert summary.version == "v1"
+    assert summary.is_supported()
+    assert not summary.complete
+    assert summary.position_count is None
+
+
+def test_counts_v1():
+    my_test_file = os.path.join(os.path.dirname(__file__), "E482-AZ-pos3.aut")
+    experiment = _read_organoidtracker_file(my_test_file)
+
+    summary = probe_aut_file(my_test_file, count=True)
+    assert summary.complete
+    assert "links" in summary.keys and "tracks" not in summary.keys
+    assert summary.time_point_count == experiment.positions.last_time_point_number() \
+           - experiment.positions.first_time_point_number() + 1
+    assert summary.position_count == len(experiment.positions)
+    assert summary.link_count == len(list(experiment.links.find_all_links()))
+
+
+@pytest.mark.parametrize("chunk_size", [7, 1024 * 1024])
+def test_counts_v2(tmp_path, monkeypatch, chunk_size):
+    # With a tiny chunk size, tokens and containers are cut in all possible places
+    monkeypatch.setattr(_probe, "_CHUNK_SIZE", chunk_size)
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=5, cell_count=10, division_rate=0.1,
+                             metadata={"cell_type": str}, version="v2")
+    experiment = _read_organoidtracker_file(file_path)
+
+    summary = probe_aut_file(file_path, count=True)
+    assert summary.keys == ["version", "positions", "tracks"]
+    assert summary.time_point_count == 5
+    assert summary.position_count == len(experiment.positions)
+    assert summary.track_count == len(experiment.links._tracks)
+
+
+def test_reject_unsupported(tmp_path):
+    newer_file = os.path.join(tmp_path, "newer.aut")
+    with open(newer_file, "w") as handle:
+        json.dump({"version": "v3", "positions": []}, handle)
+    assert napari_get_reader(newer_file) is None
+    with pytest.raises(ValueError):
+        _read_organoidtracker_file(newer_file)
+
+    # Specialized files, without a version tag, can only be recognized by scanning the whole file
+    specialized_file = os.path.join(tmp_path, "specialized.aut")
+    with open(specialized_file, "w") as handle:
+        json.dump({"positions": {"0": [[1, 2, 3]]}}, handle)
+    assert probe_aut_file(specialized_file, header_size=8).is_supported() is None
+    assert probe_aut_file(specialized_file).is_supported() is False
+    with pytest.raises(ValueError):
+        _read_organoidtracker_file(specialized_file)
+
+    not_json_file = os.path.join(tmp_path, "not_json.aut")
+    with open(not_json_file, "w") as handle:
+        handle.write("Hello world!")
+    assert napari_get_reader(not_json_file) is None
@@ -0,0 +1,36 @@
+import json
+import logging
+import os
+
+from napari_organoidtracker import _profiling
+from napari_organoidtracker._reader import reader_function
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+
+
+def test_profile_reader_stages(tmp_path, caplog):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=5, cell_count=10, metadata={"volume": float})
+
+    with caplog.at_level(logging.DEBUG, logger="napari_organoidtracker"):
+        reader_function(file_path, profile=True)
+
+    report = _profiling.get_last_report()
+    for stage_name in ["reader_function", "read_organoidtracker_file", "json_decode", "parse_positions",
+                       "parse_position_metadata", "parse_tracks", "experiment_to_napari"]:
+        stage = report.get_stage(stage_name)
+        assert stage is not None, stage_name
+        assert stage["wall_time_s"] >= 0 and stage["calls"] == 1
+    assert isinstance(report.get_stage("parse_positions")["allocated_blocks_delta"], int)
+    assert report.get_stage("reader_function")["tracemalloc_peak_bytes"] > 0
+
+    # Both the summary line and the JSON report are logged
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(message.startswith("Profile: reader_function") for message in messages)
+    assert json.loads(messages[-1])["stages"][0]["name"] == "reader_function"
+
+
+def test_no_profile_by_default(monkeypatch, tmp_path):
+    monkeypatch.delenv("NAPARI_ORGANOIDTRACKER_PROFILE", raising=False)
+    assert not _profiling.is_profiling_requested()
+    with _profiling.stage("some_stage"):
+        pass  # Does nothing, as no profiling is active
@@ -1,6 +1,9 @@
 import os
 
+import numpy
+
 from napari_organoidtracker import napari_get_reader
+from napari_organoidtracker._reader import napari_get_reader_with_events, reader_function
 
 
 def test_reader():
@@ -58,3 +61,34 @@ def test_metadata():
 def test_get_reader_pass():
     reader = napari_get_reader("fake.file")
     assert reader is None
+    assert napari_get_reader("missing.aut") is None
+    assert napari_get_reader("missing.autb") is None
+
+
+def test_event_layers():
+    my_test_file = os.path.join(os.path.dirname(__file__), "E482-AZ-pos3.aut")
+
+    reader = napari_get_reader_with_events(my_test_file)
+    layer_data_list = reader(my_test_file)
+    assert [layer_data_tuple[2] for layer_data_tuple in layer_data_list] == ["tracks", "points", "points", "points"]
+
+    # The file contains a single cell division, in 3D
+    divisions = layer_data_list[1]
+    assert divisions[1]["name"] == "Cell divisions"
+    assert divisions[0].shape == (1, 4)
+
+
+def test_overview_tracks():
+    my_test_file = os.path.join(os.path.dirname(__file__), "E482-AZ-pos3.aut")
+    full_layer = reader_function(my_test_file)[0]
+    overview_layer = reader_function(my_test_file, overview_step=5)[0]
+
+    # Every track is still present, with at most one in five positions (plus the last position)
+    assert len(overview_layer[0]) < len(full_layer[0]) / 2
+    assert set(overview_layer[0][:, 0]) == set(full_layer[0][:, 0])
+    assert overview_layer[1]["graph"] == full_layer[1]["graph"]
+    assert len(overview_layer[1]["features"]["intensity_cfp_volume"]) == len(overview_layer[0])
+
+    # The full-resolution layer can still be loaded on request
+    loaded_layer = overview_layer[1]["metadata"]["load_full_resolution"]()[0]
+    assert numpy.array_equal(loaded_layer[0], full_layer[0])
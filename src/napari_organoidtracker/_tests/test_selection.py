@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+from napari_organoidtracker import _json_backend
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._reader import reader_function
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+from napari_organoidtracker._tests._utils import get_contents
+
+
+@pytest.mark.parametrize("version", ["v1", "v2"])
+@pytest.mark.parametrize("backend_name", _json_backend.BACKEND_NAMES)
+def test_select_time_range_and_metadata(tmp_path, version, backend_name):
+    if not _json_backend.is_backend_available(backend_name):
+        pytest.skip(f"{backend_name} is not installed")
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, version=version, time_point_count=10, cell_count=10, division_rate=0.1,
+                             metadata={"volume": float, "cell_type": str, "is_dividing": bool})
+
+    # Select everything by hand from the full experiment
+    positions, links, position_data, _ = get_contents(_read_organoidtracker_file(file_path, json_backend="json"))
+    positions = {position for position in positions if 3 <= position.time_point_number() <= 6}
+    links = {(position1, position2) for position1, position2 in links
+             if position1 in positions and position2 in positions}
+    position_data = {"volume": {position: value for position, value in position_data["volume"].items()
+                                if position in positions}}
+
+    experiment = _read_organoidtracker_file(file_path, json_backend=backend_name, time_range=(3, 6),
+                                            metadata_keys=["volume"])
+    actual_positions, actual_links, actual_position_data, _ = get_contents(experiment)
+    assert actual_positions == positions
+    assert actual_links == links
+    assert actual_position_data == position_data
+
+    # Tracks are cut at the window edges
+    for track in experiment.links.find_all_tracks():
+        assert 3 <= track.first_time_point_number() and track.last_time_point_number() <= 6
+
+
+def test_reader_function(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=10, cell_count=10, first_time_point_number=5)
+
+    layer_data = reader_function(file_path, time_range=(8, 10))[0]
+    assert layer_data[1]["metadata"]["first_time_point_number"] == 8
+    assert len(layer_data[0]) == 30  # 10 cells in 3 time points, without divisions
+
+    with pytest.raises(ValueError):
+        reader_function(file_path, time_range=(10, 8))
@@ -0,0 +1,104 @@
+import json
+import os
+
+import pytest
+
+from napari_organoidtracker import napari_get_reader
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._links import Links
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._shards import find_shard_files, read_shard_directory
+from napari_organoidtracker._synthetic import generate_synthetic_data, write_synthetic_aut_file
+from napari_organoidtracker._tests._utils import get_contents
+
+
+def _write_shards(data, directory, time_point_blocks):
+    """Splits the v2 data into one file per block of time points, like a tracker that writes its results in parts."""
+    for first, last in time_point_blocks:
+        positions_json = [time_point_json for time_point_json in data["positions"]
+                          if first <= time_point_json["time_point"] <= last]
+        tracks_json = list()
+        for track_json in data["tracks"]:
+            start = track_json["time_point_start"]
+            coords = track_json["coords_xyz_px"]
+            if start > last or start + len(coords) - 1 < first:
+                continue
+            if start >= first:
+                tracks_json.append({**track_json, "coords_xyz_px": coords[:last - start + 1]})
+            else:
+                # Track continues from the previous shard
+                tracks_json.append({"time_point_start": first, "coords_xyz_px": coords[first - start:last - start + 1],
+                                    "coords_xyz_px_before": [coords[first - start - 1]]})
+        with open(os.path.join(directory, f"tracks_{first:04}.aut"), "w") as handle:
+            json.dump({"version": "v2", "positions": positions_json, "tracks": tracks_json}, handle)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_stitch_shards(tmp_path, max_workers):
+    data = generate_synthetic_data(time_point_count=12, cell_count=10, division_rate=0.1,
+                                   metadata={"volume": float})
+    full_file = os.path.join(tmp_path, "full.aut")
+    with open(full_file, "w") as handle:
+        json.dump(data, handle)
+    shard_directory = os.path.join(tmp_path, "shards")
+    os.mkdir(shard_directory)
+    _write_shards(data, shard_directory, [(8, 11), (0, 3), (4, 7)])
+
+    experiment = read_shard_directory(shard_directory, max_workers=max_workers)
+    assert get_contents(experiment) == get_contents(_read_organoidtracker_file(full_file))
+
+
+def test_napari_reader(tmp_path):
+    write_synthetic_aut_file(os.path.join(tmp_path, "part_1.aut"), time_point_count=2, cell_count=5)
+    write_synthetic_aut_file(os.path.join(tmp_path, "part_2.aut.gz"), time_point_count=2, cell_count=5,
+                             first_time_point_number=2)
+    with open(os.path.join(tmp_path, "notes.txt"), "w") as handle:
+        handle.write("Not a shard")
+    assert find_shard_files(str(tmp_path)) == [os.path.join(tmp_path, "part_1.aut"),
+                                               os.path.join(tmp_path, "part_2.aut.gz")]
+
+    reader = napari_get_reader(str(tmp_path))
+    assert callable(reader)
+    layer_data = reader(str(tmp_path))
+    assert len(layer_data) == 1
+    assert len(layer_data[0][0]) == 20
+
+    empty_directory = os.path.join(tmp_path, "empty_directory")
+    os.mkdir(empty_directory)
+    assert napari_get_reader(empty_directory) is None
+
+
+def test_shared_time_points(tmp_path):
+    write_synthetic_aut_file(os.path.join(tmp_path, "part_1.aut"), time_point_count=3, cell_count=5)
+    write_synthetic_aut_file(os.path.join(tmp_path, "part_2.aut"), time_point_count=3, cell_count=5,
+                             first_time_point_number=2)
+    with pytest.raises(ValueError):
+        read_shard_directory(str(tmp_path), max_workers=1)
+
+
+def test_shared_time_points_reports_right_file(tmp_path):
+    # File name order differs from time order
+    write_synthetic_aut_file(os.path.join(tmp_path, "block10.aut"), time_point_count=3, cell_count=5,
+                             first_time_point_number=10)
+    write_synthetic_aut_file(os.path.join(tmp_path, "block2.aut"), time_point_count=3, cell_count=5,
+                             first_time_point_number=2)
+    write_synthetic_aut_file(os.path.join(tmp_path, "block3.aut"), time_point_count=3, cell_count=5,
+                             first_time_point_number=3)
+    with pytest.raises(ValueError, match="block3.aut"):
+        read_shard_directory(str(tmp_path), max_workers=1)
+
+
+def test_add_disjoint_links():
+    links = Links()
+    links.add_link(Position(0, 0, 0, time_point_number=0), Position(0, 0, 0, time_point_number=1))
+    other_links = Links()
+    other_links.add_link(Position(5, 5, 5, time_point_number=2), Position(5, 5, 5, time_point_number=3))
+    links.add_disjoint_links(other_links)
+    assert len(links._tracks) == 2
+
+    # Shares a position, so the tracks must be connected
+    overlapping_links = Links()
+    overlapping_links.add_link(Position(0, 0, 0, time_point_number=1), Position(0, 0, 0, time_point_number=2))
+    links.add_disjoint_links(overlapping_links)
+    assert len(links._tracks) == 2
+    assert links.find_single_future(Position(0, 0, 0, time_point_number=1)) == Position(0, 0, 0, time_point_number=2)
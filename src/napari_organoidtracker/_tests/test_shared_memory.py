@@ -0,0 +1,93 @@
+import os
+import pickle
+
+import numpy
+import pytest
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._shared_memory import SharedExperiment, map_lineages, map_time_points
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+from napari_organoidtracker._track_table import TrackTable
+
+
+def _read_experiment(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=10, cell_count=8, division_rate=0.1,
+                             metadata={"volume": float, "cell_type": str}, first_time_point_number=3)
+    experiment = _read_organoidtracker_file(file_path)
+    experiment.positions.add(Position(1, 2, 3, time_point_number=5))  # A position without links
+    return experiment
+
+
+def _count_positions_in_lineage(experiment: SharedExperiment, track_ids: numpy.ndarray) -> int:
+    return int(numpy.diff(experiment.track_offsets)[track_ids].sum())
+
+
+def _mean_x_in_time_point(experiment: SharedExperiment, time_point_number: int) -> float:
+    return float(experiment.coords_xyz[experiment.get_time_point_rows(time_point_number), 0].mean())
+
+
+def test_arrays(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    track_table = TrackTable.from_links(experiment.links)
+    with SharedExperiment.create(experiment) as shared:
+        assert len(shared) == len(experiment.positions)
+        assert shared.track_ids[-1] == -1
+        assert numpy.array_equal(shared.coords_xyz[-1], [1, 2, 3])
+        shared_track_table = shared.to_track_table()
+        assert numpy.array_equal(shared_track_table.coords_xyz, track_table.coords_xyz)
+        assert numpy.array_equal(shared_track_table.next_counts, track_table.next_counts)
+        assert numpy.array_equal(shared_track_table.time_point_numbers, track_table.time_point_numbers)
+        with pytest.raises(ValueError):
+            shared.coords_xyz[0, 0] = 10  # Read-only
+
+        for track_id, track in enumerate(experiment.links._tracks):
+            assert shared.get_next_track_ids(track_id).tolist() == sorted(
+                experiment.links._tracks.index(next_track) for next_track in track.get_next_tracks())
+        for lineage_index in range(shared.lineage_count()):
+            track_ids = shared.get_lineage_track_ids(lineage_index)
+            assert len(shared.get_previous_track_ids(track_ids[0])) == 0
+            lineage = set(experiment.links._tracks[track_ids[0]].find_all_descending_tracks(include_self=True))
+            assert {experiment.links._tracks[track_id] for track_id in track_ids.tolist()} == lineage
+
+        assert shared.first_time_point_number == 3
+        assert shared.time_point_numbers_in_use().tolist() == list(range(3, 13))
+        rows = shared.get_time_point_rows(5)
+        assert len(rows) == len(experiment.positions.of_time_point(Position(0, 0, 0, time_point_number=5)
+                                                                   .time_point()))
+        assert len(shared.get_time_point_rows(100)) == 0
+
+        positions = track_table.positions
+        volumes = shared.get_metadata("volume")
+        cell_types = shared.get_metadata("cell_type")
+        categories = shared.get_metadata_categories("cell_type")
+        for row in [0, 5, len(positions) - 1]:
+            assert volumes[row] == experiment.position_data.get_position_data(positions[row], "volume")
+            assert categories[cell_types[row]] == experiment.position_data.get_position_data(positions[row],
+                                                                                             "cell_type")
+        assert numpy.isnan(volumes[-1])
+        assert cell_types[-1] == -1
+
+
+def test_pickle(tmp_path):
+    experiment = _read_experiment(tmp_path)
+    with SharedExperiment.create(experiment) as shared:
+        pickled = pickle.dumps(shared)
+        assert len(pickled) < 2000  # Only the name and the layout
+        assert numpy.array_equal(pickle.loads(pickled).coords_xyz, shared.coords_xyz)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_map(tmp_path, max_workers):
+    experiment = _read_experiment(tmp_path)
+    with SharedExperiment.create(experiment) as shared:
+        counts = map_lineages(_count_positions_in_lineage, shared, max_workers=max_workers)
+        assert len(counts) == shared.lineage_count()
+        assert sum(counts) == len(experiment.positions) - 1  # All except the position without links
+
+        mean_xs = map_time_points(_mean_x_in_time_point, shared, max_workers=max_workers)
+        assert list(mean_xs.keys()) == list(range(3, 13))
+        expected_mean_x = numpy.mean([position.x for position in experiment.positions
+                                      if position.time_point_number() == 7])
+        assert mean_xs[7] == pytest.approx(expected_mean_x)
@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+
+
+@pytest.mark.parametrize("version", ["v1", "v2"])
+def test_synthetic_file(tmp_path, version):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=10, cell_count=20, division_rate=0, version=version,
+                             metadata={"volume": float, "intensity": int, "is_stem": bool, "cell_type": str},
+                             first_time_point_number=5)
+
+    experiment = _read_organoidtracker_file(file_path)
+    experiment.links.debug_sanity_check()
+    assert len(experiment.positions) == 10 * 20
+    assert experiment.positions.first_time_point_number() == 5
+    assert len(list(experiment.links.find_all_tracks())) == 20
+    assert experiment.position_data.get_data_names_and_types() == {
+        "volume": float, "intensity": float, "is_stem": bool, "cell_type": str}
+
+
+def test_synthetic_file_divisions_2d(tmp_path):
+    file_path = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(file_path, time_point_count=20, cell_count=10, division_rate=0.1, is_2d=True)
+
+    experiment = _read_organoidtracker_file(file_path)
+    experiment.links.debug_sanity_check()
+    assert all(position.z == 0 for position in experiment.positions)
+    assert any(track.will_divide() for track in experiment.links.find_all_tracks())
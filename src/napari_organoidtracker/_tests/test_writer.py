@@ -0,0 +1,112 @@
+import os
+
+import numpy
+import pytest
+
+from napari_organoidtracker._aut_parser import _read_organoidtracker_file
+from napari_organoidtracker._experiment import _experiment_to_napari
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._reader import reader_function
+from napari_organoidtracker._synthetic import write_synthetic_aut_file
+from napari_organoidtracker._tests._utils import get_contents
+from napari_organoidtracker._writer import write_tracks
+
+
+def _assert_same_tracks_layer(layer_data, expected_layer_data):
+    data, kwargs, layer_type = layer_data
+    expected_data, expected_kwargs, expected_layer_type = expected_layer_data
+    assert layer_type == expected_layer_type == "tracks"
+    assert numpy.array_equal(data, expected_data)
+    assert kwargs["graph"] == expected_kwargs["graph"]
+    assert kwargs["features"].keys() == expected_kwargs["features"].keys()
+    for metadata_key, values in kwargs["features"].items():
+        assert numpy.array_equal(values, expected_kwargs["features"][metadata_key])
+    assert kwargs["metadata"] == expected_kwargs["metadata"]
+
+
+def test_round_trip(tmp_path):
+    my_test_file = os.path.join(os.path.dirname(__file__), "E482-AZ-pos3.aut")
+    written_file = os.path.join(tmp_path, "E482-AZ-pos3.aut")
+
+    layer_data = reader_function(my_test_file)[0]
+    assert write_tracks(written_file, layer_data[0], layer_data[1]) == [written_file]
+
+    _assert_same_tracks_layer(reader_function(written_file)[0], layer_data)
+
+
+@pytest.mark.parametrize("extension", [".aut", ".aut.gz"])
+def test_round_trip_experiment(tmp_path, extension):
+    # Time points don't start at 0, and there is lineage metadata
+    synthetic_file = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(synthetic_file, time_point_count=5, cell_count=4, division_rate=0.3,
+                             metadata={"intensity": float, "is_dead": bool}, first_time_point_number=3)
+    experiment = _read_organoidtracker_file(synthetic_file)
+    first_track = next(iter(experiment.links.find_starting_tracks()))
+    experiment.links.set_lineage_data(first_track, "lineage_name", "A")
+
+    layer_data = _experiment_to_napari(experiment)[0]
+    assert layer_data[1]["metadata"]["first_time_point_number"] == 3
+    written_file = os.path.join(tmp_path, "written" + extension)
+    write_tracks(written_file, layer_data[0], layer_data[1])
+
+    written_experiment = _read_organoidtracker_file(written_file)
+    assert get_contents(written_experiment) == get_contents(experiment)
+
+
+def test_split_at_gaps(tmp_path):
+    # Track 0 has a gap between time point 1 and 3, track 1 is the child of track 0. The data is 2D
+    data = numpy.array([[0, 0, 10, 10],
+                        [0, 1, 11, 11],
+                        [0, 3, 12, 12],
+                        [1, 4, 13, 13],
+                        [2, 0, 20, 20]], dtype=numpy.float32)
+    written_file = os.path.join(tmp_path, "gaps.aut")
+    write_tracks(written_file, data, {"graph": {1: [0]}, "features": {"size": [1.0, 2.0, numpy.nan, 4.0, 5.0]}})
+
+    experiment = _read_organoidtracker_file(written_file)
+    positions = [Position(10, 10, 0, time_point_number=0), Position(11, 11, 0, time_point_number=1),
+                 Position(12, 12, 0, time_point_number=3), Position(13, 13, 0, time_point_number=4),
+                 Position(20, 20, 0, time_point_number=0)]
+    assert experiment.links.contains_link(positions[0], positions[1])
+    assert experiment.links.contains_link(positions[2], positions[3])
+    assert experiment.links.get_track(positions[1]) != experiment.links.get_track(positions[2])
+
+    values = [experiment.position_data.get_position_data(position, "size") for position in positions]
+    assert values == [1.0, 2.0, None, 4.0, 5.0]
+
+
+def test_duplicate_time_points(tmp_path):
+    data = numpy.array([[0, 0, 10, 10], [0, 0, 11, 11]], dtype=numpy.float32)
+    with pytest.raises(ValueError):
+        write_tracks(os.path.join(tmp_path, "duplicate.aut"), data, {})
+
+
+def test_derived_features_not_saved(tmp_path):
+    synthetic_file = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(synthetic_file, time_point_count=5, cell_count=4, division_rate=0.3,
+                             metadata={"intensity": float})
+    experiment = _read_organoidtracker_file(synthetic_file)
+
+    layer_data = _experiment_to_napari(experiment, motion_features=True)[0]
+    assert "speed" in layer_data[1]["metadata"]["derived_features"]
+    written_file = os.path.join(tmp_path, "written.aut")
+    write_tracks(written_file, layer_data[0], layer_data[1])
+
+    written_experiment = _read_organoidtracker_file(written_file)
+    assert set(written_experiment.position_data.get_data_names_and_types()) == {"intensity"}
+    assert get_contents(written_experiment) == get_contents(experiment)
+
+
+def test_overview_layer_saves_full_resolution(tmp_path):
+    synthetic_file = os.path.join(tmp_path, "synthetic.aut")
+    write_synthetic_aut_file(synthetic_file, time_point_count=10, cell_count=4, division_rate=0.1,
+                             metadata={"intensity": float})
+    experiment = _read_organoidtracker_file(synthetic_file)
+
+    overview_layer_data = _experiment_to_napari(experiment, overview_step=3)[0]
+    assert "load_full_resolution" in overview_layer_data[1]["metadata"]
+    written_file = os.path.join(tmp_path, "written.aut")
+    write_tracks(written_file, overview_layer_data[0], overview_layer_data[1])
+
+    written_experiment = _read_organoidtracker_file(written_file)
+    assert get_contents(written_experiment) == get_contents(experiment)
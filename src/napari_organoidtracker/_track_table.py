@@ -0,0 +1,175 @@
+from itertools import chain
+from typing import List, Optional, Tuple
+
+import numpy
+
+from napari_organoidtracker._links import Links, LinkingTrack
+from napari_organoidtracker._position import Position
+from napari_organoidtracker._position_collection import PositionCollection
+
+
+class TrackTable:
+    """Flat, array-based snapshot of all tracks in a Links object. Every position in a track gets one row, and the rows
+    are ordered by track id and then by time. So the positions of track i are found in the rows
+    track_offsets[i]:track_offsets[i + 1].
+
+    The table is built in a single pass over the tracks, after which things like cell divisions or track ends can be
+    found using array operations, instead of walking over the linking network again."""
+
+    track_offsets: numpy.ndarray  # int64, length is number of tracks + 1
+    track_first_time_point_numbers: numpy.ndarray  # int64, one per track
+    previous_offsets: numpy.ndarray  # int64, length is number of tracks + 1. Index into previous_track_ids.
+    previous_track_ids: numpy.ndarray  # int64, the previous tracks of track i are at previous_offsets[i]:[i + 1]
+    next_counts: numpy.ndarray  # int64, number of next tracks of every track
+
+    time_point_numbers: numpy.ndarray  # int64, one per row
+    coords_xyz: numpy.ndarray  # float64, shape (rows, 3)
+    positions: Optional[List[Position]]  # One per row, or None if the table was not created from a Links object
+
+    def __init__(self, *, track_offsets: numpy.ndarray, track_first_time_point_numbers: numpy.ndarray,
+                 previous_offsets: numpy.ndarray, previous_track_ids: numpy.ndarray, next_counts: numpy.ndarray,
+                 coords_xyz: numpy.ndarray, positions: Optional[List[Position]]):
+        self.track_offsets = track_offsets
+        self.track_first_time_point_numbers = track_first_time_point_numbers
+        self.previous_offsets = previous_offsets
+        self.previous_track_ids = previous_track_ids
+        self.next_counts = next_counts
+        self.coords_xyz = coords_xyz
+        self.positions = positions
+
+        track_lengths = numpy.diff(track_offsets)
+        row_numbers = numpy.arange(track_offsets[-1], dtype=numpy.int64)
+        self.time_point_numbers = numpy.repeat(track_first_time_point_numbers, track_lengths) \
+            + (row_numbers - numpy.repeat(track_offsets[:-1], track_lengths))
+
+    @staticmethod
+    def from_links(links: Links) -> "TrackTable":
+        """Builds the table. Track ids are the same as in Links.find_all_tracks_and_ids()."""
+        return TrackTable.from_tracks(links._tracks)
+
+    @staticmethod
+    def from_tracks(tracks: List[LinkingTrack], *, first_time_point_number: Optional[int] = None,
+                    last_time_point_number: Optional[int] = None) -> "TrackTable":
+        """Builds the table from the given tracks, which get track ids 0, 1, 2, etc. in the given order. Links to tracks
+        that are not in the list are left out.
+
+        If a first and/or last time point number is given, the tracks are clipped to that time window. All tracks must
+        have at least one position within the window. Tracks that are clipped at the start or end lose their links to
+        the previous or next tracks, as those are outside the window."""
+        track_count = len(tracks)
+        track_ids = {id(track): track_id for track_id, track in enumerate(tracks)}
+
+        track_lengths = numpy.empty(track_count, dtype=numpy.int64)
+        track_first_time_point_numbers = numpy.empty(track_count, dtype=numpy.int64)
+        previous_counts = numpy.empty(track_count, dtype=numpy.int64)
+        next_counts = numpy.empty(track_count, dtype=numpy.int64)
+        previous_track_ids = list()
+        positions = list()
+        for track_id, track in enumerate(tracks):
+            track_positions = track._positions_by_time_point
+            min_time_point_number = track._min_time_point_number
+            if first_time_point_number is not None and min_time_point_number < first_time_point_number:
+                track_positions = track_positions[first_time_point_number - min_time_point_number:]
+                min_time_point_number = first_time_point_number
+            if last_time_point_number is not None \
+                    and min_time_point_number + len(track_positions) - 1 > last_time_point_number:
+                track_positions = track_positions[:last_time_point_number - min_time_point_number + 1]
+            positions += track_positions
+            track_lengths[track_id] = len(track_positions)
+            track_first_time_point_numbers[track_id] = min_time_point_number
+            previous_count = 0
+            for previous_track in track._previous_tracks:
+                previous_track_id = track_ids.get(id(previous_track))
+                if previous_track_id is not None:
+                    previous_track_ids.append(previous_track_id)
+                    previous_count += 1
+            previous_counts[track_id] = previous_count
+            next_counts[track_id] = sum(id(next_track) in track_ids for next_track in track._next_tracks)
+
+        coords_xyz = numpy.fromiter(chain.from_iterable((position.x, position.y, position.z) for position in positions),
+                                    dtype=numpy.float64, count=3 * len(positions)).reshape(-1, 3)
+
+        return TrackTable(
+            track_offsets=_to_offsets(track_lengths),
+            track_first_time_point_numbers=track_first_time_point_numbers,
+            previous_offsets=_to_offsets(previous_counts),
+            previous_track_ids=numpy.array(previous_track_ids, dtype=numpy.int64),
+            next_counts=next_counts,
+            coords_xyz=coords_xyz,
+            positions=positions)
+
+    def track_count(self) -> int:
+        """Gets the number of tracks in this table."""
+        return len(self.track_offsets) - 1
+
+    def __len__(self) -> int:
+        """Gets the number of rows (so the number of positions) in this table."""
+        return int(self.track_offsets[-1])
+
+    def track_ids(self) -> numpy.ndarray:
+        """Gets the track id of every row."""
+        return numpy.repeat(numpy.arange(self.track_count(), dtype=numpy.int64), numpy.diff(self.track_offsets))
+
+    def previous_counts(self) -> numpy.ndarray:
+        """Gets the number of previous tracks of every track."""
+        return numpy.diff(self.previous_offsets)
+
+    def get_previous_track_ids(self, track_id: int) -> numpy.ndarray:
+        """Gets the ids of the tracks directly before the given track."""
+        return self.previous_track_ids[self.previous_offsets[track_id]:self.previous_offsets[track_id + 1]]
+
+    def first_rows(self) -> numpy.ndarray:
+        """Gets the row of the first position of every track."""
+        return self.track_offsets[:-1]
+
+    def last_rows(self) -> numpy.ndarray:
+        """Gets the row of the last position of every track."""
+        return self.track_offsets[1:] - 1
+
+    def division_rows(self) -> numpy.ndarray:
+        """Gets the rows of all positions that are about to divide. Equivalent to the last position of every track for
+        which LinkingTrack.will_divide() returns True."""
+        return self.last_rows()[self.next_counts > 1]
+
+    def with_untracked_positions(self, all_positions: PositionCollection
+                                 ) -> Tuple[List[Position], numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+        """Adds the positions that are not in any track as extra rows after the rows of this table. Returns the
+        position, the coordinates, the time point number and the track id of every row. Positions that are not in any
+        track get a track id of -1."""
+        positions = self.positions
+        if len(all_positions) != len(positions):
+            positions_in_tracks = set(positions)
+            positions = positions + [position for position in all_positions if position not in positions_in_tracks]
+        untracked_positions = positions[len(self):]
+        coords_xyz = numpy.concatenate([self.coords_xyz, numpy.array(
+            [(position.x, position.y, position.z) for position in untracked_positions],
+            dtype=numpy.float64).reshape(-1, 3)])
+        time_point_numbers = numpy.concatenate([self.time_point_numbers, numpy.array(
+            [position.time_point_number() for position in untracked_positions], dtype=numpy.int64)])
+        track_ids = numpy.concatenate([self.track_ids(), numpy.full(len(untracked_positions), -1, dtype=numpy.int64)])
+        return positions, coords_xyz, time_point_numbers, track_ids
+
+    def track_start_rows(self, time_point_number_to_ignore: Optional[int] = None) -> numpy.ndarray:
+        """Gets the rows of all positions that have no links to the past. Equivalent to
+        Links.find_appeared_positions()."""
+        first_rows = self.first_rows()
+        is_start = self.previous_counts() == 0
+        if time_point_number_to_ignore is not None:
+            is_start &= self.track_first_time_point_numbers != time_point_number_to_ignore
+        return first_rows[is_start]
+
+    def track_end_rows(self, time_point_number_to_ignore: Optional[int] = None) -> numpy.ndarray:
+        """Gets the rows of all positions that have no links to the future. Equivalent to
+        Links.find_disappeared_positions()."""
+        last_rows = self.last_rows()
+        is_end = self.next_counts == 0
+        if time_point_number_to_ignore is not None:
+            is_end &= self.time_point_numbers[last_rows] != time_point_number_to_ignore
+        return last_rows[is_end]
+
+
+def _to_offsets(counts: numpy.ndarray) -> numpy.ndarray:
+    """Converts an array of counts to an array of offsets, starting at 0 and ending at the total count."""
+    offsets = numpy.zeros(len(counts) + 1, dtype=numpy.int64)
+    numpy.cumsum(counts, out=offsets[1:])
+    return offsets
@@ -0,0 +1,265 @@
+"""Writer for napari tracks layers. The layer is saved in the v2 format of OrganoidTracker, so that edits made in napari
+can be opened in OrganoidTracker again, or in this plugin.
+
+Experiments can be saved directly as well, using write_experiment. That is lossless, unlike saving a tracks layer.
+
+The file is written while it is being encoded: every time point and every track is encoded on its own, and the encoded
+pieces are written in chunks. So the JSON document as a whole is never held in memory. Files ending in for example
+.aut.gz are compressed, see the _compression module.
+
+The layer metadata written by our reader is used to restore the original time point numbers and the lineage metadata.
+Layers that did not come from our reader are written with the first time point at number 0.
+
+Some things cannot be represented in an .aut file, and are therefore changed on saving:
+
+* A track with a gap in time is split into multiple tracks, as OrganoidTracker only links consecutive time points.
+  Links to parent tracks that don't end directly before the child track starts are dropped for the same reason.
+* Features become position metadata. Missing values (NaN) are left out. String metadata was already converted to
+  numbers by the reader, so it is saved as such. Features that the reader computed itself (like the motion features)
+  are not saved, as they are not part of the original data.
+
+An overview layer (see _experiment._experiment_to_napari) only contains some of the positions. For those, the
+full-resolution layer is created and saved instead.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set, TYPE_CHECKING
+
+import numpy
+
+from napari_organoidtracker import _json_backend, _profiling
+from napari_organoidtracker._basics import TimePoint
+from napari_organoidtracker._compression import open_aut_file
+
+if TYPE_CHECKING:
+    from napari_organoidtracker._experiment import Experiment
+
+_logger = logging.getLogger("napari_organoidtracker")
+
+_CHUNK_SIZE = 1024 * 1024  # Bytes of encoded JSON that are collected before they are written
+
+
+class _ChunkedWriter:
+    """Collects encoded pieces of JSON, and writes them once there are enough of them."""
+
+    def __init__(self, handle):
+        self._handle = handle
+        self._pieces = list()
+        self._size = 0
+
+    def write(self, piece: bytes):
+        self._pieces.append(piece)
+        self._size += len(piece)
+        if self._size >= _CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        self._handle.write(b"".join(self._pieces))
+        self._pieces.clear()
+        self._size = 0
+
+
+def write_tracks(path: str, data: Any, meta: Dict[str, Any]) -> List[str]:
+    """Writes a napari tracks layer to an .aut file. Data is the layer data ([track_id, t, (z), y, x] for every row),
+    meta contains the layer attributes, of which "graph", "features" and "metadata" are used. Returns the list of
+    written files, as napari expects from a writer."""
+    load_full_resolution = (meta.get("metadata") or dict()).get("load_full_resolution")
+    if load_full_resolution is not None:
+        # Saving an overview layer would lose most positions and links
+        _logger.warning("Saving the full-resolution tracks instead of the overview layer. Changes made to the"
+                        " overview layer are not saved.")
+        tracks_layers = [layer for layer in load_full_resolution() if layer[2] == "tracks"]
+        if len(tracks_layers) == 0:
+            raise ValueError("Cannot save an overview layer: the full-resolution layer could not be created")
+        data, meta, _ = tracks_layers[0]
+
+    with _profiling.stage("prepare_tracks"):
+        table = _TracksToWrite(numpy.asarray(data, dtype=numpy.float64), meta)
+
+    _write_v2_file(path, table.positions_json(), table.tracks_json())
+    return [path]
+
+
+def write_experiment(path: str, experiment: "Experiment"):
+    """Writes an experiment to an .aut file. Unlike write_tracks, nothing is lost: positions without links, missing and
+    string metadata and the full coordinates are all kept."""
+    _write_v2_file(path, _experiment_positions_json(experiment), _experiment_tracks_json(experiment))
+
+
+def _write_v2_file(path: str, positions_json: Iterable[Dict[str, Any]], tracks_json: Iterable[Dict[str, Any]]):
+    """Encodes and writes the entries of the "positions" and "tracks" lists of a v2 file."""
+    backend = _json_backend.get_backend()
+    with _profiling.stage("write_json"), open_aut_file(path, "wb") as handle:
+        writer = _ChunkedWriter(handle)
+        writer.write(b'{"version":"v2","positions":[')
+        for i, time_point_json in enumerate(positions_json):
+            if i > 0:
+                writer.write(b",")
+            writer.write(backend.encode(time_point_json))
+        writer.write(b'],"tracks":[')
+        for i, track_json in enumerate(tracks_json):
+            if i > 0:
+                writer.write(b",")
+            writer.write(backend.encode(track_json))
+        writer.write(b"]}")
+        writer.flush()
+
+
+def _experiment_positions_json(experiment: "Experiment") -> Iterable[Dict[str, Any]]:
+    """Yields the entries of the "positions" list, one per time point of the experiment."""
+    first_time_point_number = experiment.positions.first_time_point_number()
+    last_time_point_number = experiment.positions.last_time_point_number()
+    if first_time_point_number is None or last_time_point_number is None:
+        return
+    for time_point_number in range(first_time_point_number, last_time_point_number + 1):
+        time_point = TimePoint(time_point_number)
+        positions = list(experiment.positions.of_time_point(time_point))
+        if len(positions) == 0:
+            continue
+        time_point_json = {"time_point": time_point_number,
+                           "coords_xyz_px": [[position.x, position.y, position.z] for position in positions]}
+        position_meta = experiment.position_data.create_time_point_dict(time_point, positions)
+        if len(position_meta) > 0:
+            time_point_json["position_meta"] = position_meta
+        yield time_point_json
+
+
+def _experiment_tracks_json(experiment: "Experiment") -> Iterable[Dict[str, Any]]:
+    """Yields the entries of the "tracks" list, one for every track of the experiment."""
+    for track in experiment.links.find_all_tracks():
+        track_json = {"time_point_start": track.first_time_point_number(),
+                      "coords_xyz_px": [[position.x, position.y, position.z] for position in track.positions()]}
+        if len(track._previous_tracks) > 0:
+            coords_xyz_px_before = list()
+            for previous_track in track._previous_tracks:
+                position = previous_track.find_last_position()
+                coords_xyz_px_before.append([position.x, position.y, position.z])
+            track_json["coords_xyz_px_before"] = coords_xyz_px_before
+        elif len(track._lineage_data) > 0:
+            track_json["lineage_meta"] = dict(track._lineage_data)
+        yield track_json
+
+
+class _TracksToWrite:
+    """The rows of a tracks layer, sorted by track and time, and split into tracks without gaps in time."""
+
+    time_point_numbers: numpy.ndarray  # int64, one per row
+    coords_xyz: List[List[float]]  # One per row
+    segment_starts: numpy.ndarray  # int64, the first row of every track in the file, plus the total row count
+    position_meta: Dict[str, List[Optional[Any]]]  # Metadata key to the values for every row
+
+    def __init__(self, data: numpy.ndarray, meta: Dict[str, Any]):
+        if data.ndim != 2 or data.shape[1] not in (4, 5):
+            raise ValueError(f"Expected tracks data with 4 or 5 columns, got an array of shape {data.shape}")
+        layer_metadata = meta.get("metadata") or dict()
+        first_time_point_number = int(layer_metadata.get("first_time_point_number", 0))
+
+        track_ids = data[:, 0].astype(numpy.int64)
+        time_point_numbers = numpy.rint(data[:, 1]).astype(numpy.int64) + first_time_point_number
+        order = numpy.lexsort((time_point_numbers, track_ids))
+        track_ids = track_ids[order]
+        time_point_numbers = time_point_numbers[order]
+
+        same_track = track_ids[1:] == track_ids[:-1]
+        duplicates = same_track & (time_point_numbers[1:] == time_point_numbers[:-1])
+        if numpy.any(duplicates):
+            row = int(numpy.flatnonzero(duplicates)[0])
+            raise ValueError(f"Track {track_ids[row]} has multiple positions at time point {time_point_numbers[row]}")
+
+        coords_xyz = numpy.zeros((len(data), 3), dtype=numpy.float64)
+        coords_xyz[:, 0:data.shape[1] - 2] = data[order, :1:-1]  # From [(z), y, x] to [x, y, (z)], 2D data gets z = 0
+
+        is_segment_start = numpy.ones(len(data), dtype=bool)
+        is_segment_start[1:] = ~same_track | (time_point_numbers[1:] != time_point_numbers[:-1] + 1)
+
+        self.time_point_numbers = time_point_numbers
+        self.coords_xyz = coords_xyz.tolist()
+        self.segment_starts = numpy.append(numpy.flatnonzero(is_segment_start), len(data))
+        self.position_meta = _features_to_position_meta(meta.get("features"), order,
+                                                        set(layer_metadata.get("derived_features") or ()))
+        self._track_ids = track_ids
+        self._graph = meta.get("graph") or dict()
+        self._lineage_meta = layer_metadata.get("lineage_meta") or dict()
+
+    def positions_json(self):
+        """Yields the entries of the "positions" list, one per time point."""
+        order = numpy.argsort(self.time_point_numbers, kind="stable")
+        time_point_numbers, starts = numpy.unique(self.time_point_numbers[order], return_index=True)
+        ends = numpy.append(starts[1:], len(order))
+        for time_point_number, start, end in zip(time_point_numbers.tolist(), starts.tolist(), ends.tolist()):
+            rows = order[start:end].tolist()
+            time_point_json = {"time_point": time_point_number,
+                               "coords_xyz_px": [self.coords_xyz[row] for row in rows]}
+            if len(self.position_meta) > 0:
+                time_point_json["position_meta"] = {metadata_key: [values[row] for row in rows]
+                                                    for metadata_key, values in self.position_meta.items()}
+            yield time_point_json
+
+    def tracks_json(self):
+        """Yields the entries of the "tracks" list, one for every track without gaps."""
+        track_ids = self._track_ids.tolist()
+        time_point_numbers = self.time_point_numbers.tolist()
+
+        # Rows of the first and last position of every napari track
+        unique_track_ids, first_rows = numpy.unique(self._track_ids, return_index=True)
+        last_rows = numpy.append(first_rows[1:], len(track_ids)) - 1
+        first_row_by_track_id = dict(zip(unique_track_ids.tolist(), first_rows.tolist()))
+        last_row_by_track_id = dict(zip(unique_track_ids.tolist(), last_rows.tolist()))
+
+        segment_starts = self.segment_starts.tolist()
+        for start, end in zip(segment_starts[:-1], segment_starts[1:]):
+            track_id = track_ids[start]
+            time_point_start = time_point_numbers[start]
+            track_json = {"time_point_start": time_point_start, "coords_xyz_px": self.coords_xyz[start:end]}
+
+            if first_row_by_track_id[track_id] == start:
+                # First part of the napari track, so add the links to the parent tracks
+                coords_xyz_px_before = list()
+                for parent_track_id in _get_parent_track_ids(self._graph, track_id):
+                    parent_row = last_row_by_track_id.get(parent_track_id)
+                    if parent_row is not None and time_point_numbers[parent_row] == time_point_start - 1:
+                        coords_xyz_px_before.append(self.coords_xyz[parent_row])
+                if len(coords_xyz_px_before) > 0:
+                    track_json["coords_xyz_px_before"] = coords_xyz_px_before
+                else:
+                    # OrganoidTracker only stores lineage metadata on tracks without parents
+                    lineage_meta = self._lineage_meta.get(track_id)
+                    if lineage_meta is not None and len(lineage_meta) > 0:
+                        track_json["lineage_meta"] = lineage_meta
+            yield track_json
+
+
+def _get_parent_track_ids(graph: Dict[Any, Any], track_id: int) -> List[int]:
+    """Gets the parents of a track from a napari graph, which maps a track id to a parent id or a list of parent ids."""
+    parents = graph.get(track_id)
+    if parents is None:
+        return []
+    if numpy.ndim(parents) == 0:
+        return [int(parents)]
+    return [int(parent) for parent in parents]
+
+
+def _features_to_position_meta(features: Any, order: numpy.ndarray,
+                               derived_feature_names: Set[str]) -> Dict[str, List[Optional[Any]]]:
+    """Converts the features of a layer (a DataFrame or a dict of columns) to lists of metadata values, in the given
+    row order. NaN values become None, so that they are left out. Derived features are skipped."""
+    if features is None:
+        return dict()
+
+    position_meta = dict()
+    for metadata_key, column in features.items():
+        if metadata_key in derived_feature_names:
+            continue
+        values = numpy.asarray(column)[order]
+        if values.dtype.kind == "b":
+            position_meta[str(metadata_key)] = values.tolist()
+        elif values.dtype.kind in "iuf":
+            values = values.astype(numpy.float64)
+            values_list = values.tolist()
+            for row in numpy.flatnonzero(numpy.isnan(values)).tolist():
+                values_list[row] = None
+            position_meta[str(metadata_key)] = values_list
+        else:
+            position_meta[str(metadata_key)] = [None if isinstance(value, float) and value != value else value
+                                                for value in values.tolist()]
+    return position_meta